@@ -23,12 +23,27 @@ def create_app(config_class=Config):
     db.init_app(app)
     
     # 注册蓝图
-    from app.routes import health_bp, datafile_bp, model_bp, client_bp, agent_bp
+    from app.routes import health_bp, metrics_bp, datafile_bp, model_bp, client_bp, agent_bp, job_bp
     app.register_blueprint(health_bp)
+    app.register_blueprint(metrics_bp)
     app.register_blueprint(datafile_bp)
     app.register_blueprint(model_bp)
     app.register_blueprint(client_bp)
     app.register_blueprint(agent_bp)
+    app.register_blueprint(job_bp)
+
+    # 请求耗时指标（/metrics）
+    from app.utils import metrics
+    metrics.init_app(app)
+
+    # 按需的单请求性能分析（配置了 PROFILE_TOKEN 时启用）
+    from app.utils import profiling
+    profiling.init_app(app)
+
+    # 回收上次运行遗留、已经没有进程负责的任务
+    if app.config.get('JOB_REAP_ON_STARTUP'):
+        from app.jobs.runner import reap_stale_jobs_on_startup
+        reap_stale_jobs_on_startup(app)
     
     return app
 
@@ -1,4 +1,6 @@
+import json
 import os
+import time
 import requests
 from dotenv import load_dotenv
 
@@ -19,12 +21,7 @@ class QwenClient:
         if not self.api_key:
             raise ValueError("缺少 QWEN_API_KEY，请在 .env 中配置")
 
-    def chat(self, messages: list[dict], tools: list[dict] | None = None, tool_choice: str | dict | None = None):
-        """
-        messages: [{"role": "user"|"assistant"|"system", "content": "..."}]
-        tools: 工具列表（函数描述），用来做 function calling
-        tool_choice: 可以是 "auto" / "none" / {"type": "function", "function": {"name": "..."}}
-        """
+    def _request(self, messages: list[dict], tools: list[dict] | None, tool_choice: str | dict | None, **extra):
         url = f"{self.base_url}/chat/completions"
         headers = {
             "Authorization": f"Bearer {self.api_key}",
@@ -38,12 +35,119 @@ class QwenClient:
             payload["tools"] = tools
         if tool_choice:
             payload["tool_choice"] = tool_choice
+        payload.update(extra)
+        return url, headers, payload
 
-        resp = requests.post(url, headers=headers, json=payload, timeout=60)
-        resp.raise_for_status()
-        data = resp.json()
+    def chat(self, messages: list[dict], tools: list[dict] | None = None, tool_choice: str | dict | None = None):
+        """
+        messages: [{"role": "user"|"assistant"|"system", "content": "..."}]
+        tools: 工具列表（函数描述），用来做 function calling
+        tool_choice: 可以是 "auto" / "none" / {"type": "function", "function": {"name": "..."}}
+        """
+        url, headers, payload = self._request(messages, tools, tool_choice)
+
+        from app.utils.metrics import LLM_REQUEST_SECONDS
+
+        start = time.perf_counter()
+        status = 'error'
+        try:
+            resp = requests.post(url, headers=headers, json=payload, timeout=60)
+            status = str(resp.status_code)
+            resp.raise_for_status()
+            data = resp.json()
+        finally:
+            LLM_REQUEST_SECONDS.labels(model=self.model, status=status).observe(time.perf_counter() - start)
         return data
 
+    def chat_stream(self, messages: list[dict], tools: list[dict] | None = None, tool_choice: str | dict | None = None):
+        """
+        流式调用（OpenAI 兼容的 stream=True，服务端以 SSE 逐块返回增量）
+
+        生成器：文本增量到达一段就产出一段 str；生成器的返回值是拼装好的完整 message，
+        结构与 chat() 返回的 choices[0]["message"] 相同（tool_calls 增量已按 index 合并）。
+
+        用法:
+            message = yield from client.chat_stream(messages, tools=tools, tool_choice="auto")
+        """
+        url, headers, payload = self._request(messages, tools, tool_choice, stream=True)
+
+        from app.utils.metrics import LLM_FIRST_TOKEN_SECONDS, LLM_REQUEST_SECONDS
+
+        start = time.perf_counter()
+        status = 'error'
+        content, tool_calls, first = [], [], True
+        try:
+            # timeout 是两次读到数据之间的最长间隔，生成过程再长也不会被截断
+            with requests.post(url, headers=headers, json=payload, timeout=60, stream=True) as resp:
+                status = str(resp.status_code)
+                resp.raise_for_status()
+                for chunk in iter_sse_data(resp):
+                    choices = chunk.get("choices") or []
+                    delta = (choices[0].get("delta") or {}) if choices else {}
+                    if first and (delta.get("content") or delta.get("tool_calls")):
+                        first = False
+                        LLM_FIRST_TOKEN_SECONDS.labels(model=self.model).observe(time.perf_counter() - start)
+                    if delta.get("tool_calls"):
+                        merge_tool_call_deltas(tool_calls, delta["tool_calls"])
+                    if delta.get("content"):
+                        content.append(delta["content"])
+                        yield delta["content"]
+        finally:
+            LLM_REQUEST_SECONDS.labels(model=self.model, status=status).observe(time.perf_counter() - start)
+
+        message = {"role": "assistant", "content": "".join(content)}
+        if tool_calls:
+            message["tool_calls"] = tool_calls
+        return message
+
+
+def iter_sse_data(resp):
+    """
+    SSE 响应 -> 逐个产出 data 行解析出的 JSON，遇到 data: [DONE] 结束
+
+    按字节切行后再用 UTF-8 解码：text/event-stream 通常不带 charset，
+    requests 会按 ISO-8859-1 解码导致中文乱码。chunk_size=None 表示收到一块处理一块，不攒满缓冲区。
+    """
+    for line in resp.iter_lines(chunk_size=None):
+        if not line.startswith(b"data:"):
+            continue  # 空行（事件分隔）、注释（: keep-alive）、event: / id: 字段
+        data = line[5:].strip()
+        if data == b"[DONE]":
+            return
+        if data:
+            chunk = json.loads(data.decode("utf-8"))
+            if chunk.get("error"):
+                raise RuntimeError(f"大模型流式响应出错: {chunk['error']}")
+            yield chunk
+
+
+def merge_tool_call_deltas(tool_calls: list[dict], deltas: list[dict]):
+    """
+    把一块流式增量里的 tool_calls 合并进 tool_calls（原地修改）
+
+    同一个工具调用的增量带相同的 index：首块带 id / type / function.name，
+    之后的块只带 function.arguments 的片段，按到达顺序拼接。
+    个别兼容实现不给 index 时，带新 id 的增量视为新调用，否则并入最后一个。
+    """
+    for delta in deltas:
+        index = delta.get("index")
+        if index is None:
+            new_call = not tool_calls or (delta.get("id") and delta["id"] != tool_calls[-1]["id"])
+            index = len(tool_calls) if new_call else len(tool_calls) - 1
+        while len(tool_calls) <= index:
+            tool_calls.append({"id": "", "type": "function", "function": {"name": "", "arguments": ""}})
+        call = tool_calls[index]
+        if delta.get("id"):
+            call["id"] = delta["id"]
+        if delta.get("type"):
+            call["type"] = delta["type"]
+        function = delta.get("function") or {}
+        if function.get("name"):
+            call["function"]["name"] = function["name"]
+        if function.get("arguments"):
+            call["function"]["arguments"] += function["arguments"]
+    return tool_calls
+
 def simple_chat():
     client = QwenClient()
 
@@ -88,23 +192,21 @@ def get_current_time(city: str | None = None) -> str:
         return f"当前时间（本地时间）是 {now.strftime('%Y-%m-%d %H:%M:%S')}"
 
 
-def predict_house_price(house_info: dict | str, model_ids: list | str) -> str:
+def predict_house_price(house_info: dict | str, model_ids: list | str, include_timings: bool = False) -> str:
     """
     预测房价的工具函数
     
     参数:
         house_info: 房屋信息字典（或JSON字符串），包含小区、成交时间、建筑面积等特征
         model_ids: 要使用的模型ID列表（或JSON字符串），会从数据库加载这些模型进行预测并加权平均
+        include_timings: 是否在结果中附带各阶段耗时（timings 字段）
     
     返回:
         预测结果的JSON字符串
     """
-    from app.models.model import MLModel
+    from app.utils.model_cache import get_model_cache
     from app.train.eval import federated_predict_house
     from app.train.train_dp import eval_house_by_dict
-    print("大模型工具调用")
-    print(house_info)
-    print(model_ids)
     try:
         # 处理参数类型（可能是字符串或字典/列表）
         if isinstance(house_info, str):
@@ -125,60 +227,78 @@ def predict_house_price(house_info: dict | str, model_ids: list | str) -> str:
                 "status": "failed"
             }, ensure_ascii=False)
         
-        # 收集所有模型的预测结果
-        results = []
-        
-        for model_id in model_ids:
-            try:
-                # 确保 model_id 是整数
+        from app.utils.timing import collect_timings, span
+
+        with collect_timings(include_timings) as timings:
+            from app.utils.inference_pool import SUCCESS, TIMEOUT, get_inference_pool
+            from app.utils.prediction_cache import get_prediction_cache
+            model_cache = get_model_cache()
+
+            def predict_one(model_id):
+                # 在推理线程中执行：加载模型（进程内缓存，版本未变时不再读取和反序列化模型文件）+ 预测
                 model_id = int(model_id)
-                
-                # 从数据库加载模型
-                ml_model = MLModel.query.get(model_id)
-                
-                if ml_model is None:
+                cached = model_cache.get(model_id)
+                if cached is None:
+                    raise LookupError(f"模型ID {model_id} 不存在")
+                model, model_info = cached
+                unit_price, total_price = eval_house_by_dict(house_info, model)
+                return {
+                    "model_name": model_info["model_name"],
+                    "data_count": model_info["data_count"],
+                    "model_type": model_info["model_type"],
+                    "unit_price": unit_price,
+                    "total_price": total_price
+                }
+
+            # 与 /api/clients/evaluate 共用预测缓存：相同房屋 + 相同模型集合直接返回
+            prediction_cache = get_prediction_cache()
+            with span('prediction_cache'):
+                try:
+                    cache_key = prediction_cache.make_key(house_info, model_ids)
+                except (TypeError, ValueError):
+                    cache_key = None  # model_ids 中有非法ID，逐个预测时报错
+                cached_predictions = prediction_cache.get(cache_key)
+            if cached_predictions is not None:
+                outcomes = [(SUCCESS, cached_predictions[int(model_id)]) for model_id in model_ids]
+            else:
+                # 各模型并发预测，超过截止时间的记为超时，融合只使用已完成的结果
+                outcomes = get_inference_pool().map(predict_one, model_ids)
+                if all(status == SUCCESS for status, _ in outcomes):
+                    prediction_cache.put(cache_key, {
+                        int(model_id): value for model_id, (_, value) in zip(model_ids, outcomes)
+                    })
+
+            # 收集所有模型的预测结果
+            results = []
+            for model_id, (status, value) in zip(model_ids, outcomes):
+                if status == SUCCESS:
                     results.append({
-                        "status": "failed",
+                        "status": "success",
+                        "client_id": int(model_id),
+                        "client_name": value["model_name"],
+                        "prediction": {
+                            "data_count": value["data_count"],
+                            "total_price": value["total_price"] if value["total_price"] else 0,
+                            "unit_price": value["unit_price"]
+                        }
+                    })
+                else:
+                    results.append({
+                        "status": "timeout" if status == TIMEOUT else "failed",
                         "client_id": model_id,
                         "client_name": f"Model_{model_id}",
-                        "error": f"模型ID {model_id} 不存在"
+                        "error": "预测超时" if status == TIMEOUT else str(value)
                     })
-                    continue
-                
-                # 反序列化模型
-                model_bytes = ml_model.get_model_content()
-                model = joblib.load(io.BytesIO(model_bytes))
-                
-                # 进行预测
-                print("开始预测",len(house_info))
-                unit_price, total_price = eval_house_by_dict(house_info, model)
-                
-                # 添加预测结果
-                results.append({
-                    "status": "success",
-                    "client_id": model_id,
-                    "client_name": ml_model.model_name,
-                    "prediction": {
-                        "data_count": ml_model.data_count,
-                        "total_price": total_price if total_price else 0,
-                        "unit_price": unit_price
-                    }
-                })
-                
-            except Exception as e:
-                results.append({
-                    "status": "failed",
-                    "client_id": model_id,
-                    "client_name": f"Model_{model_id}",
-                    "error": str(e)
-                })
-        
-        # 使用联邦学习方式融合多个模型的预测结果
-        final_result = federated_predict_house(results)
+
+            # 使用联邦学习方式融合多个模型的预测结果
+            with span('fuse'):
+                final_result = federated_predict_house(results)
         
         # 添加详细的预测信息
         final_result["individual_predictions"] = results
         final_result["status"] = "success"
+        if timings is not None:
+            final_result["timings"] = timings.to_dict()
         
         return json.dumps(final_result, ensure_ascii=False, indent=2)
         
@@ -189,6 +309,42 @@ def predict_house_price(house_info: dict | str, model_ids: list | str) -> str:
         }, ensure_ascii=False)
 
 
+def find_comparable_sales(lng: float | None = None, lat: float | None = None, city: str | None = None,
+                          k: int | None = None, area_min: float | None = None, area_max: float | None = None,
+                          room_type: str | None = None, max_distance_km: float | None = None,
+                          **kwargs) -> str:
+    """
+    查询附近的可比成交的工具函数
+
+    参数:
+        lng / lat: 百度坐标（也可以通过 百度经纬 "lng,lat" 传入）
+        city: 城市；k: 返回条数；area_min / area_max: 建筑面积范围；
+        room_type: 户型前缀（如 "3室"）；max_distance_km: 最大距离
+
+    返回:
+        可比成交列表的JSON字符串
+    """
+    from app.utils.comparables import get_comparables_index, parse_query_params
+
+    params = {
+        'lng': lng, 'lat': lat, 'city': city, 'k': k, 'area_min': area_min, 'area_max': area_max,
+        'room_type': room_type, 'max_distance_km': max_distance_km, '百度经纬': kwargs.get('百度经纬'),
+    }
+    try:
+        query = parse_query_params(params)
+        comparables = get_comparables_index().query(**query)
+        return json.dumps({
+            "status": "success",
+            "count": len(comparables),
+            "comparables": comparables
+        }, ensure_ascii=False, indent=2)
+    except Exception as e:
+        return json.dumps({
+            "error": f"查询可比成交出错: {str(e)}",
+            "status": "failed"
+        }, ensure_ascii=False)
+
+
 # 给大模型看的"工具 schema"
 TIME_TOOL_SPEC = {
     "type": "function",
@@ -235,10 +391,35 @@ PREDICT_HOUSE_PRICE_TOOL_SPEC = {
 }
 
 
+# 可比成交查询工具的 schema
+FIND_COMPARABLE_SALES_TOOL_SPEC = {
+    "type": "function",
+    "function": {
+        "name": "find_comparable_sales",
+        "description": "查询某个位置附近的历史成交（可比成交），可以按建筑面积范围和户型过滤，按距离由近到远返回。适合回答“附近类似的房子卖了多少钱”这类问题。",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "lng": {"type": "number", "description": "百度坐标经度，例如 121.80577"},
+                "lat": {"type": "number", "description": "百度坐标纬度，例如 39.02988"},
+                "city": {"type": "string", "description": "城市名称，例如 大连、南京"},
+                "k": {"type": "integer", "description": "返回的成交条数，默认 10"},
+                "area_min": {"type": "number", "description": "最小建筑面积（㎡）"},
+                "area_max": {"type": "number", "description": "最大建筑面积（㎡）"},
+                "room_type": {"type": "string", "description": "户型前缀，例如 \"3室\" 或 \"3室2厅\""},
+                "max_distance_km": {"type": "number", "description": "最大距离（公里）"},
+            },
+            "required": ["lng", "lat"],
+        },
+    },
+}
+
+
 # 工具名字到真实 Python 函数的映射
 TOOL_NAME_TO_FUNC = {
     "get_current_time": get_current_time,
     "predict_house_price": predict_house_price,
+    "find_comparable_sales": find_comparable_sales,
 }
 
 
@@ -264,7 +445,7 @@ def call_tool(name: str, arguments_json: str) -> str:
 def run_agent():
     client = QwenClient()
 
-    tools = [TIME_TOOL_SPEC, PREDICT_HOUSE_PRICE_TOOL_SPEC]
+    tools = [TIME_TOOL_SPEC, PREDICT_HOUSE_PRICE_TOOL_SPEC, FIND_COMPARABLE_SALES_TOOL_SPEC]
 
     messages: list[dict] = [
         {
@@ -273,6 +454,7 @@ def run_agent():
                 "你是一个智能房地产估价助手，可以与用户对话并帮助预测房价。\n"
                 "当用户询问与当前时间、现在几点等问题相关时，请使用工具 get_current_time。\n"
                 "当用户想要预测房价时，请使用工具 predict_house_price。用户需要提供房屋信息和模型ID列表。\n"
+                "当用户想了解附近类似房子的成交情况时，请使用工具 find_comparable_sales，坐标取自房屋的百度经纬。\n"
                 "房屋信息应包含：小区、成交时间、建筑面积、房屋户型、所在楼层、建成年代、装修情况、房屋朝向、区域、街道、城市等字段。\n"
                 "如果用户没有提供完整的房屋信息，请礼貌地询问缺失的信息。\n"
                 "预测结果会包含加权平均的单价和总价，以及各个模型的详细预测信息。\n"
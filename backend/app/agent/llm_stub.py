@@ -0,0 +1,186 @@
+"""
+本地的大模型桩服务（OpenAI 兼容的 /chat/completions），用于离线联调和测试流式对话
+
+不需要 API Key，也不访问外网。回复是按规则生成的固定文本，按 --chunk-chars 个字一块、
+每块间隔 --token-delay-ms 毫秒吐出（首块前额外等待 --first-token-delay-ms），
+非流式请求等同样的总时长后一次性返回，便于对比首字延迟。
+
+规则:
+    - 请求带了 tools、最后一条是用户消息且提到 时间 / 几点：先流式输出一句话，再调用 get_current_time，
+      arguments 拆成多块下发（用于验证 tool_calls 增量的拼接）
+    - 最后一条是 tool 消息：复述工具结果
+    - 其他情况：复述用户消息
+
+用法（在 backend 目录下）:
+    python -m app.agent.llm_stub --port 8010
+    QWEN_API_BASE=http://127.0.0.1:8010/v1 QWEN_API_KEY=stub python run.py
+"""
+import argparse
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TIME_KEYWORDS = ('时间', '几点')
+
+
+def _split(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def _text(content):
+    """message.content 可能是字符串，也可能是多段 [{"type": "text", "text": ...}]"""
+    if isinstance(content, list):
+        return ''.join(part.get('text', '') for part in content if isinstance(part, dict))
+    return content or ''
+
+
+def plan_reply(payload):
+    """
+    请求 -> (回复文本, 工具调用列表)
+
+    工具调用为 [{"id", "name", "arguments"}]，arguments 是 JSON 字符串
+    """
+    messages = payload.get('messages') or []
+    last = messages[-1] if messages else {}
+    tool_names = {tool.get('function', {}).get('name') for tool in payload.get('tools') or []}
+
+    if last.get('role') == 'tool':
+        return f"根据工具 {last.get('name') or ''} 的结果：{_text(last.get('content'))}。以上是本地桩服务的回复。", []
+
+    text = _text(last.get('content'))
+    if 'get_current_time' in tool_names and any(k in text for k in TIME_KEYWORDS):
+        arguments = json.dumps({'city': '北京'}, ensure_ascii=False)
+        return '好的，我先查一下当前时间。', [{'id': f'call_{uuid.uuid4().hex[:12]}', 'name': 'get_current_time',
+                                        'arguments': arguments}]
+    return f"你说的是：{text}。这是本地桩服务的回复，用于测试流式输出。", []
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    # 由 make_server 设置
+    chunk_chars = 2
+    token_delay = 0.02
+    first_token_delay = 0.2
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body):
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json(404, {'error': {'message': f'未知路径 {self.path}'}})
+            return
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            self._send_json(400, {'error': {'message': '请求体不是合法的 JSON'}})
+            return
+
+        content, tool_calls = plan_reply(payload)
+        completion_id = f'chatcmpl-{uuid.uuid4().hex[:16]}'
+        model = payload.get('model') or 'stub'
+        if payload.get('stream'):
+            self._stream(completion_id, model, content, tool_calls)
+        else:
+            pieces = len(_split(content, self.chunk_chars)) + sum(
+                len(_split(call['arguments'], self.chunk_chars)) for call in tool_calls)
+            time.sleep(self.first_token_delay + self.token_delay * pieces)
+            message = {'role': 'assistant', 'content': content}
+            if tool_calls:
+                message['tool_calls'] = [
+                    {'id': call['id'], 'type': 'function',
+                     'function': {'name': call['name'], 'arguments': call['arguments']}}
+                    for call in tool_calls
+                ]
+            self._send_json(200, {
+                'id': completion_id, 'object': 'chat.completion', 'created': int(time.time()), 'model': model,
+                'choices': [{'index': 0, 'message': message,
+                             'finish_reason': 'tool_calls' if tool_calls else 'stop'}],
+            })
+
+    def _stream(self, completion_id, model, content, tool_calls):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        def send(data):
+            body = f'data: {data}\n\n'.encode('utf-8')
+            self.wfile.write(f'{len(body):x}\r\n'.encode('ascii') + body + b'\r\n')
+            self.wfile.flush()
+
+        def chunk(delta, finish_reason=None):
+            send(json.dumps({
+                'id': completion_id, 'object': 'chat.completion.chunk', 'created': int(time.time()), 'model': model,
+                'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}],
+            }, ensure_ascii=False))
+
+        time.sleep(self.first_token_delay)
+        chunk({'role': 'assistant', 'content': ''})
+        for piece in _split(content, self.chunk_chars):
+            chunk({'content': piece})
+            time.sleep(self.token_delay)
+        for index, call in enumerate(tool_calls):
+            # 首块带 id / name，之后只带 arguments 片段
+            chunk({'tool_calls': [{'index': index, 'id': call['id'], 'type': 'function',
+                                   'function': {'name': call['name'], 'arguments': ''}}]})
+            for piece in _split(call['arguments'], self.chunk_chars):
+                chunk({'tool_calls': [{'index': index, 'function': {'arguments': piece}}]})
+                time.sleep(self.token_delay)
+        chunk({}, 'tool_calls' if tool_calls else 'stop')
+        send('[DONE]')
+        self.wfile.write(b'0\r\n\r\n')
+        self.wfile.flush()
+
+
+def make_server(host='127.0.0.1', port=0, chunk_chars=2, token_delay_ms=20, first_token_delay_ms=200):
+    """创建桩服务（port=0 时随机端口），base_url 为 http://host:port/v1"""
+    handler = type('ConfiguredStubHandler', (StubHandler,), {
+        'chunk_chars': max(1, chunk_chars),
+        'token_delay': token_delay_ms / 1000.0,
+        'first_token_delay': first_token_delay_ms / 1000.0,
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.base_url = f'http://{server.server_address[0]}:{server.server_address[1]}/v1'
+    return server
+
+
+def start_in_thread(**kwargs):
+    """在后台线程启动桩服务，返回 server（用完调用 server.shutdown()）"""
+    server = make_server(**kwargs)
+    threading.Thread(target=server.serve_forever, name='llm-stub', daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8010)
+    parser.add_argument('--chunk-chars', type=int, default=2, help='每块的字数')
+    parser.add_argument('--token-delay-ms', type=float, default=20, help='块之间的间隔（毫秒）')
+    parser.add_argument('--first-token-delay-ms', type=float, default=200, help='首块前的等待（毫秒）')
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.chunk_chars, args.token_delay_ms, args.first_token_delay_ms)
+    print(f"大模型桩服务: {server.base_url}（QWEN_API_BASE={server.base_url} QWEN_API_KEY=stub）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -10,6 +10,12 @@ class Config:
     
     # Flask 基础配置
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
+
+    # 按需性能分析的管理员口令（X-Profile 请求头），未设置时不启用
+    PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN')
+    
+    # 启动时把提交/执行进程已退出的遗留任务标记为失败（任务进程内关闭）
+    JOB_REAP_ON_STARTUP = True
     
     # JSON 配置
     JSON_AS_ASCII = False  # 支持中文
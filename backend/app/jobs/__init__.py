@@ -0,0 +1,6 @@
+"""
+后台任务模块
+"""
+from app.jobs.runner import JobRunner, get_job_runner
+
+__all__ = ['JobRunner', 'get_job_runner']
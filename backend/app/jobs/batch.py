@@ -0,0 +1,93 @@
+"""
+批量训练：一次提交多个客户端的训练任务，由进程池并行执行
+"""
+import time
+import uuid
+
+from app.extensions import db
+from app.models.client import Client
+from app.models.job import Job
+
+
+def submit_training_batch(runner, client_ids, options=None):
+    """
+    为一组客户端各提交一个 train_client 任务，共享同一个 batch_id
+
+    Args:
+        runner: JobRunner
+        client_ids: 客户端ID列表
+        options: model_type / description 等公共训练参数
+
+    Returns:
+        (batch_id, jobs, skipped)，skipped 为 [{'client_id', 'error'}]
+    """
+    options = options or {}
+    batch_id = uuid.uuid4().hex
+    clients = {c.id: c for c in Client.query.filter(Client.id.in_(client_ids)).all()}
+
+    jobs, skipped = [], []
+    for client_id in client_ids:
+        client = clients.get(client_id)
+        if client is None:
+            skipped.append({'client_id': client_id, 'error': '客户端不存在'})
+            continue
+        if not client.datafile_id:
+            skipped.append({'client_id': client_id, 'error': '该客户端未绑定数据文件，无法训练'})
+            continue
+        jobs.append(runner.submit('train_client', {
+            'client_id': client.id,
+            'model_name': f'{client.name}_trained_model',
+            'model_type': options.get('model_type', 'lightgbm'),
+            'description': options.get('description', f'由客户端 {client.name} 批量训练生成')
+        }, batch_id=batch_id))
+    return batch_id, jobs, skipped
+
+
+def get_batch_jobs(batch_id):
+    return Job.query.filter(Job.batch_id == batch_id).order_by(Job.created_time).all()
+
+
+def wait_for_batch(batch_id, interval=1.0, on_update=None):
+    """
+    轮询直到批次内任务全部结束
+
+    Args:
+        on_update: 可选回调，参数为当前的任务列表
+
+    Returns:
+        任务列表
+    """
+    while True:
+        # 任务由其他进程更新，每次都从数据库重新读取
+        db.session.expire_all()
+        jobs = get_batch_jobs(batch_id)
+        if on_update is not None:
+            on_update(jobs)
+        if all(job.is_finished for job in jobs):
+            return jobs
+        time.sleep(interval)
+
+
+def batch_summary(jobs):
+    """
+    批次统计：各状态数量、墙钟耗时，以及相对逐个顺序执行的加速比
+
+    sequential_seconds 是各任务执行耗时之和（即顺序执行时的估计耗时）；
+    并行时每个进程只分到部分 CPU 线程，单任务会比独占全部核时慢，
+    因此这是对加速比的乐观估计，精确对比请用 train_bulk.py --baseline 实测。
+    """
+    counts = {state: 0 for state in (Job.PENDING, Job.RUNNING, Job.SUCCEEDED, Job.FAILED)}
+    for job in jobs:
+        counts[job.status] = counts.get(job.status, 0) + 1
+
+    summary = {'total': len(jobs), **counts}
+    finished = [job for job in jobs if job.started_time and job.finished_time]
+    if jobs and len(finished) == len(jobs):
+        wall = (max(j.finished_time for j in jobs) - min(j.created_time for j in jobs)).total_seconds()
+        sequential = sum((j.finished_time - j.started_time).total_seconds() for j in finished)
+        summary.update({
+            'wall_seconds': round(wall, 3),
+            'sequential_seconds': round(sequential, 3),
+            'speedup': round(sequential / wall, 2) if wall > 0 else None,
+        })
+    return summary
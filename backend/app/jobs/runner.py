@@ -0,0 +1,317 @@
+"""
+后台任务执行器
+
+web 进程只负责写入 Job 记录并把任务 ID 投递到本地进程池，训练等耗时操作在
+独立的任务进程里执行，不占用 gunicorn worker，也不受 --timeout 限制。
+任务状态全部写回数据库，任意 worker 都能查询。
+
+任务进程用 spawn 方式启动（不继承 web 进程的数据库连接和 torch 线程状态），
+启动时按 web 进程的数据库配置自己 create_app。
+
+CPU 划分：每个 gunicorn worker 各有一个 JOB_WORKERS 个进程的任务池，但任务要先拿到整机共用的
+槽位（app.jobs.slots，最多 JOB_SLOTS 个）才开始计算。计算线程数按整机实际在算的任务数均分 CPU 核数，
+任务开始时和每次上报进度时重新计算：只有一个任务时独占全部核，任务变多时各自让出线程。
+任务进程内 FedAvg / 跨客户端评估再开的进程池只均分本任务当时分到的线程数（JOB_CPU_BUDGET，由 pin_threads 写入）。
+"""
+import multiprocessing
+import os
+import socket
+import threading
+import time
+import traceback
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+
+from flask import current_app
+
+from app.extensions import db
+from app.jobs.slots import JobSlot, total_slots
+from app.models.job import Job
+
+# 每个 web 进程的任务进程数
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))
+# 每个任务进程的计算线程数（torch / OpenMP / LightGBM），0 表示按整机在算的任务数均分 CPU 核数
+JOB_THREADS_PER_WORKER = int(os.getenv('JOB_THREADS_PER_WORKER', '0'))
+
+# running 的任务超过这么久（秒）没有更新视为失联，用于无法检查进程是否存活的其他主机上的任务，0 表示不检查
+JOB_STALE_SECONDS = int(os.getenv('JOB_STALE_SECONDS', '3600'))
+
+# 转发给任务进程的配置项前缀
+_FORWARDED_CONFIG_PREFIXES = ('SQLALCHEMY_',)
+
+# 任务进程内的 Flask 应用
+_worker_app = None
+
+
+def cpu_budget():
+    """当前进程可分配的 CPU 核数：任务进程内为 pin_threads 分给它的线程数，否则为整机核数"""
+    budget = os.getenv('JOB_CPU_BUDGET')
+    return int(budget) if budget else (os.cpu_count() or 1)
+
+
+def threads_per_worker(max_workers):
+    """当前进程的 CPU 由 max_workers 个进程均分时每个进程可用的线程数"""
+    if JOB_THREADS_PER_WORKER > 0:
+        return JOB_THREADS_PER_WORKER
+    return max(1, cpu_budget() // max_workers)
+
+
+def job_threads(running):
+    """整机有 running 个任务在计算时每个任务可用的线程数"""
+    if JOB_THREADS_PER_WORKER > 0:
+        return JOB_THREADS_PER_WORKER
+    return max(1, (os.cpu_count() or 1) // max(1, running))
+
+
+def balance_threads(slot):
+    """按整机当前占用的槽位数调整本任务进程的线程数，返回调整后的线程数"""
+    import torch
+
+    num_threads = job_threads(slot.busy())
+    if num_threads != torch.get_num_threads():
+        pin_threads(num_threads)
+    return num_threads
+
+
+def pin_threads(num_threads):
+    """
+    限制当前进程的计算线程数，让并行的任务进程均分 CPU 而不是互相抢占。
+
+    OpenMP 线程池（LightGBM 默认 num_threads=0 时使用）在首次初始化时读取 OMP_NUM_THREADS，
+    要限制它必须在 import torch / lightgbm 之前调用；torch 的线程数之后可以随时再调整。
+    """
+    for var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'NUMEXPR_NUM_THREADS'):
+        os.environ[var] = str(num_threads)
+    # 本进程再开进程池时（spawn 的子进程继承环境变量）只均分这些线程
+    os.environ['JOB_CPU_BUDGET'] = str(num_threads)
+    import torch
+    torch.set_num_threads(num_threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # 已经有并行任务跑过时不能再设置
+        pass
+
+
+def _process_id():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def _process_alive(worker):
+    """worker（主机名:pid）对应的进程是否还在；不在本机或无法判断时返回 None"""
+    host, _, pid = (worker or '').rpartition(':')
+    if host != socket.gethostname() or not pid.isdigit():
+        return None
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # 进程存在但属于其他用户
+        pass
+    return True
+
+
+def reap_stale_jobs():
+    """
+    把已经没有进程负责的未完成任务标记为失败
+
+    排队中的任务只存在于提交它的 web 进程的内存进程池里，web 进程被 gunicorn 回收或被 kill 后，
+    它排队和执行中的任务都不会再有人写回状态。判断依据：
+        - 本机的任务：Job.worker（pending 时为提交的 web 进程，running 时为任务进程）已退出
+        - 其他主机上 running 的任务、没有记录提交进程的旧任务：超过 JOB_STALE_SECONDS 秒没有更新
+          （进度上报会刷新 updated_time）
+
+    只在状态和 worker 都没变时才更新，不会覆盖期间刚开始执行或已结束的任务。
+
+    Returns:
+        标记为失败的任务数
+    """
+    now = datetime.now()
+    reaped = 0
+    for job in Job.query.filter(Job.status.in_((Job.PENDING, Job.RUNNING))).all():
+        alive = _process_alive(job.worker)
+        if alive is False:
+            error = '提交任务的进程已退出，任务未执行' if job.status == Job.PENDING else '执行任务的进程已退出'
+        elif (alive is None and (job.status == Job.RUNNING or job.worker is None) and JOB_STALE_SECONDS > 0
+              and job.updated_time and (now - job.updated_time).total_seconds() > JOB_STALE_SECONDS):
+            error = f'任务超过 {JOB_STALE_SECONDS} 秒没有更新，执行进程可能已退出'
+        else:
+            continue
+        reaped += Job.query.filter(
+            Job.id == job.id, Job.status == job.status, Job.worker == job.worker
+        ).update({
+            'status': Job.FAILED, 'message': '失败', 'error': error, 'finished_time': now
+        }, synchronize_session=False)
+    db.session.commit()
+    return reaped
+
+
+def reap_stale_jobs_on_startup(app):
+    """应用启动时回收遗留任务；数据库不可用或表还没建时只打印提示，不影响启动"""
+    from sqlalchemy import inspect
+    from sqlalchemy.exc import SQLAlchemyError
+
+    with app.app_context():
+        try:
+            if not inspect(db.engine).has_table(Job.__tablename__):
+                return
+            reaped = reap_stale_jobs()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            print(f"回收遗留任务失败: {e}")
+            return
+        if reaped:
+            print(f"已将 {reaped} 个遗留任务标记为失败")
+
+
+def _init_worker(config_overrides, initializer=None):
+    """任务进程初始化：按 web 进程的配置创建应用"""
+    global _worker_app
+    from app import create_app
+    from app.config import Config
+
+    if initializer is not None:
+        initializer()
+    # 回收遗留任务由 web 进程负责
+    config_class = type('JobWorkerConfig', (Config,), {**config_overrides, 'JOB_REAP_ON_STARTUP': False})
+    _worker_app = create_app(config_class)
+
+    # 预先导入训练模块、加载特征产物，避免第一个任务的耗时里混入冷启动
+    from app.jobs.tasks import warm_up
+    warm_up()
+
+
+def run_job(job_id):
+    """
+    在任务进程中执行一个任务：pending -> running -> succeeded / failed
+
+    Returns:
+        任务最终状态
+    """
+    from app.jobs.tasks import TASKS
+    from app.utils.metrics import JOB_SECONDS
+
+    # 等到整机有空闲槽位再开始，等待期间任务保持 pending
+    with JobSlot() as slot, _worker_app.app_context():
+        job = db.session.get(Job, job_id)
+        if job is None or job.status != Job.PENDING:
+            return job.status if job else None
+        job.mark_running(worker=_process_id())
+        balance_threads(slot)
+
+        def report(progress, message=None):
+            job.update_progress(progress, message)
+            balance_threads(slot)
+
+        start = time.perf_counter()
+        try:
+            result = TASKS[job.job_type](job.get_params(), report)
+        except Exception as e:
+            traceback.print_exc()
+            JOB_SECONDS.labels(job_type=job.job_type, status=Job.FAILED).observe(time.perf_counter() - start)
+            db.session.rollback()
+            job = db.session.get(Job, job_id)
+            job.mark_failed(str(e))
+            return job.status
+
+        JOB_SECONDS.labels(job_type=job.job_type, status=Job.SUCCEEDED).observe(time.perf_counter() - start)
+        job.mark_succeeded(result)
+        return job.status
+
+
+class JobRunner:
+    """
+    每个 web 进程一个，懒创建进程池（gunicorn --preload 时在 fork 之后才创建）
+
+    Args:
+        app: Flask 应用
+        max_workers: 本 web 进程的任务进程数
+        initializer: 任务进程启动时执行的无参函数（需可 pickle），默认先限制为 1 个线程，
+                     任务开始时再按整机在算的任务数调整
+    """
+
+    def __init__(self, app, max_workers=JOB_WORKERS, initializer=None):
+        self.app = app
+        self.max_workers = max_workers
+        self.slots = total_slots()
+        self.initializer = initializer or partial(pin_threads, 1)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _worker_config(self):
+        return {
+            key: value for key, value in self.app.config.items()
+            if key.startswith(_FORWARDED_CONFIG_PREFIXES)
+        }
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker,
+                    initargs=(self._worker_config(), self.initializer),
+                )
+            return self._executor
+
+    def submit(self, job_type, params=None, batch_id=None):
+        """
+        创建任务记录并投递到进程池
+
+        Returns:
+            Job对象（状态为 pending；投递失败时为 failed）
+        """
+        from app.jobs.tasks import TASKS
+
+        if job_type not in TASKS:
+            raise ValueError(f'未知的任务类型: {job_type}')
+        job = Job.create_job(job_type, params, batch_id=batch_id, worker=_process_id())
+        try:
+            future = self._get_executor().submit(run_job, job.id)
+        except Exception as e:
+            # 任务记录已提交，投递失败时必须写回状态，否则会一直 pending
+            if isinstance(e, BrokenProcessPool):
+                # 进程池已不可用，下次提交时重建
+                with self._lock:
+                    self._executor = None
+            job.mark_failed(f'投递任务失败: {e!r}')
+            return job
+        future.add_done_callback(partial(self._on_done, job.id))
+        return job
+
+    def _on_done(self, job_id, future):
+        """任务进程异常退出（如被 OOM kill）时任务不会自己写回状态，这里兜底标记失败"""
+        if future.cancelled():
+            error = '任务已取消'
+        elif future.exception() is not None:
+            error = f'任务进程异常退出: {future.exception()!r}'
+            if isinstance(future.exception(), BrokenProcessPool):
+                # 进程池已不可用，下次提交时重建
+                with self._lock:
+                    self._executor = None
+        else:
+            return
+
+        with self.app.app_context():
+            job = db.session.get(Job, job_id)
+            if job is not None and not job.is_finished:
+                job.mark_failed(error)
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+
+def get_job_runner(app=None):
+    """当前应用的 JobRunner（保存在 app.extensions 中）"""
+    app = app or current_app._get_current_object()
+    runner = app.extensions.get('job_runner')
+    if runner is None:
+        runner = app.extensions.setdefault('job_runner', JobRunner(app))
+    return runner
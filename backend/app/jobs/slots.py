@@ -0,0 +1,90 @@
+"""
+整机任务槽位：用文件锁实现的跨进程信号量
+
+同一台机器上所有 web 进程的任务进程共用 JOB_SLOTS 个槽位（JOB_SLOTS_DIR 下的 slot-<i>.lock），
+任务拿到一个槽位才开始计算，拿不到就保持 pending 排队。flock 在持有进程退出（包括被 kill）时
+由内核自动释放，不会遗留占用。
+
+被占用的槽位数就是整机正在计算的任务数，任务进程据此决定自己的计算线程数。
+"""
+import fcntl
+import os
+import time
+
+# 整机同时计算的任务数上限，0 表示等于 CPU 核数
+JOB_SLOTS = int(os.getenv('JOB_SLOTS', '0'))
+JOB_SLOTS_DIR = os.getenv('JOB_SLOTS_DIR', '/tmp/job_slots')
+
+
+def total_slots():
+    return JOB_SLOTS or os.cpu_count() or 1
+
+
+class JobSlot:
+    """
+    一个任务占用的槽位（上下文管理器）
+
+    Args:
+        slots: 槽位总数，默认 total_slots()
+        directory: 锁文件目录，同一台机器上的进程必须一致
+        poll_interval: 没有空闲槽位时的重试间隔（秒）
+    """
+
+    def __init__(self, slots=None, directory=JOB_SLOTS_DIR, poll_interval=0.2):
+        self.slots = slots or total_slots()
+        self.directory = directory
+        self.poll_interval = poll_interval
+        self.index = None
+        self._fd = None
+
+    def _open(self, index):
+        os.makedirs(self.directory, exist_ok=True)
+        return os.open(os.path.join(self.directory, f'slot-{index}.lock'), os.O_RDWR | os.O_CREAT, 0o666)
+
+    def try_acquire(self):
+        """尝试占用一个空闲槽位，成功返回 True"""
+        for index in range(self.slots):
+            fd = self._open(index)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                continue
+            self.index, self._fd = index, fd
+            return True
+        return False
+
+    def acquire(self):
+        """阻塞直到占用一个槽位"""
+        while not self.try_acquire():
+            time.sleep(self.poll_interval)
+        return self
+
+    def release(self):
+        if self._fd is not None:
+            # 关闭文件即释放 flock
+            os.close(self._fd)
+            self.index, self._fd = None, None
+
+    def busy(self):
+        """整机被占用的槽位数（包括自己占用的）"""
+        count = 0
+        for index in range(self.slots):
+            if index == self.index:
+                count += 1
+                continue
+            fd = self._open(index)
+            try:
+                # 共享锁只用于探测，不影响其他探测者；持有者是排他锁，探测失败即为占用
+                fcntl.flock(fd, fcntl.LOCK_SH | fcntl.LOCK_NB)
+            except BlockingIOError:
+                count += 1
+            finally:
+                os.close(fd)
+        return count
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *exc):
+        self.release()
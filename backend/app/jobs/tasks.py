@@ -0,0 +1,346 @@
+"""
+后台任务实现
+
+每个任务是一个函数 task(params, report) -> result：
+    params: 提交任务时的参数 dict
+    report: report(progress, message=None)，上报 0~1 的进度
+    result: 可 JSON 序列化的结果，写入 Job.result
+抛出的异常会被记录为任务失败原因。
+"""
+import pickle
+import time
+
+import numpy as np
+
+from app.models.client import Client
+from app.models.datafile import DataFile
+from app.models.model import MLModel
+
+
+def warm_up():
+    """任务进程启动时调用：导入训练依赖并加载特征产物"""
+    import app.train.train_dp  # noqa: F401
+    from app.train.artifacts import get_feature_artifacts
+    get_feature_artifacts().version
+
+
+def prepare_training_arrays(datafile):
+    """
+    数据文件 -> 训练矩阵，优先读取预处理缓存
+
+    Returns:
+        (X_num, X_cat, y, info)，info 含 data_rows / processed_rows / matrix_cache
+    """
+    from app.train.matrix_cache import get_matrix_cache, matrix_cache_key
+    from app.train.streaming import STREAMING_THRESHOLD_BYTES
+
+    # 1. 按文件内容哈希查找预处理缓存，命中时直接使用上次的训练矩阵
+    matrix_cache = get_matrix_cache()
+    cache_key = matrix_cache_key(datafile.content_hash())
+    cached = matrix_cache.get(cache_key)
+
+    if cached is not None:
+        arrays, meta = cached
+        print(f"命中预处理缓存: {datafile.filename}, 行数: {meta['data_rows']}")
+    elif datafile.file_size >= STREAMING_THRESHOLD_BYTES:
+        # 2'. 大文件：分块预处理，矩阵直接写入缓存，不在内存中构造完整 DataFrame
+        try:
+            from app.train.streaming import build_training_arrays_streaming
+            arrays, meta = build_training_arrays_streaming(
+                datafile.iter_chunks, matrix_cache, cache_key, {'datafile_id': datafile.id}
+            )
+            print(f"分块预处理完成: {datafile.filename}, 行数: {meta['data_rows']}")
+        except Exception as e:
+            raise RuntimeError(f'数据预处理失败: {str(e)}') from e
+    else:
+        # 2. 从数据库读取 CSV 并转换为 DataFrame
+        try:
+            df = datafile.to_dataframe()
+            print(f"成功读取数据文件: {datafile.filename}, 行数: {len(df)}")
+        except Exception as e:
+            raise RuntimeError(f'读取CSV文件失败: {str(e)}') from e
+
+        # 3. 数据预处理
+        try:
+            from app.train.data_load import preprocess_df
+            from app.train.train_dp import build_training_arrays
+            processed_df = preprocess_df(df, is_train=True)
+            X_num, X_cat, y = build_training_arrays(processed_df)
+            print(f"数据预处理完成，处理后行数: {len(processed_df)}")
+        except Exception as e:
+            raise RuntimeError(f'数据预处理失败: {str(e)}') from e
+
+        arrays = {'X_num': X_num, 'X_cat': X_cat, 'y': y}
+        meta = {
+            'datafile_id': datafile.id,
+            'data_rows': len(df),
+            'processed_rows': len(processed_df),
+        }
+        try:
+            matrix_cache.put(cache_key, arrays, meta)
+        except OSError as e:
+            print(f"写入预处理缓存失败: {e}")
+
+    info = {
+        'data_rows': meta['data_rows'],
+        'processed_rows': meta['processed_rows'],
+        'matrix_cache': 'hit' if cached is not None else 'miss',
+    }
+    return arrays['X_num'], arrays['X_cat'], arrays['y'], info
+
+
+def train_client(params, report):
+    """
+    训练客户端（使用绑定的数据文件），保存模型并自动绑定
+
+    params:
+        - client_id: 客户端ID
+        - model_name / model_type / description: 保存模型时使用
+    """
+    import torch
+    from app.train.train_dp import train_model_from_arrays
+
+    timings = {}
+    client = Client.query.get(params['client_id'])
+    if not client:
+        raise ValueError('客户端不存在')
+    if not client.datafile_id:
+        raise ValueError('该客户端未绑定数据文件，无法训练')
+    datafile = DataFile.query.get(client.datafile_id)
+    if not datafile:
+        raise ValueError('关联的数据文件不存在')
+
+    # 1~3. 读取 + 预处理（或命中缓存）
+    report(0.05, '数据预处理')
+    start = time.perf_counter()
+    X_num, X_cat, y, training_info = prepare_training_arrays(datafile)
+    timings['preprocess_seconds'] = round(time.perf_counter() - start, 3)
+
+    # 4. 训练模型，每轮结束上报进度（训练占 0.3 ~ 0.9）
+    report(0.3, '模型训练')
+
+    def on_epoch_end(epoch, epochs, rmse):
+        report(0.3 + 0.6 * (epoch + 1) / epochs, f'第 {epoch + 1}/{epochs} 轮，验证 RMSE: {rmse:.2f}')
+
+    start = time.perf_counter()
+    try:
+        model = train_model_from_arrays(X_num, X_cat, y, on_epoch_end=on_epoch_end)
+        print(f"模型训练完成")
+    except Exception as e:
+        raise RuntimeError(f'模型训练失败: {str(e)}') from e
+    timings['train_seconds'] = round(time.perf_counter() - start, 3)
+
+    # 5. 保存模型到数据库
+    report(0.95, '保存模型')
+    start = time.perf_counter()
+    try:
+        ml_model = MLModel.save_model(
+            model_name=params.get('model_name') or f'client_{client.id}_model',
+            model_content=pickle.dumps(model),
+            data_count=training_info['data_rows'],
+            description=params.get('description') or f'由客户端 {client.name} 训练生成',
+            model_type=params.get('model_type') or 'lightgbm'
+        )
+        # 自动绑定模型到客户端
+        client.bind_model(ml_model.id)
+        print(f"模型保存成功，ID: {ml_model.id}")
+    except Exception as e:
+        raise RuntimeError(f'保存模型失败: {str(e)}') from e
+    timings['save_seconds'] = round(time.perf_counter() - start, 3)
+
+    training_info['num_threads'] = torch.get_num_threads()
+    training_info['timings'] = timings
+    return {
+        'client': client.to_dict(),
+        'model': ml_model.to_dict(),
+        'training_info': training_info
+    }
+
+
+def fedavg_train(params, report):
+    """
+    FedAvg 联邦训练多个客户端，产出一个全局模型并保存为 MLModel
+
+    params:
+        - client_ids: 参与训练的客户端ID列表
+        - rounds / local_epochs / lr / batch_size: 训练参数
+        - model_name / description: 保存模型时使用
+    """
+    from app.train.fedavg import prepare_client_arrays, run_fedavg
+
+    timings = {}
+    clients = Client.query.filter(Client.id.in_(params['client_ids'])).order_by(Client.id).all()
+    clients = [c for c in clients if c.datafile_id]
+    if not clients:
+        raise ValueError('没有绑定数据文件的客户端，无法训练')
+
+    # 1. 各客户端数据 -> 全局特征空间下的训练矩阵（缓存）
+    start = time.perf_counter()
+    client_keys, participants = [], []
+    for i, client in enumerate(clients):
+        report(0.2 * i / len(clients), f'准备客户端 {client.name} 的数据')
+        datafile = DataFile.query.get(client.datafile_id)
+        try:
+            key, n_samples = prepare_client_arrays(datafile)
+        except Exception as e:
+            raise RuntimeError(f'客户端 {client.name} 数据预处理失败: {str(e)}') from e
+        client_keys.append((client.id, key))
+        participants.append({'client_id': client.id, 'client_name': client.name, 'data_count': n_samples})
+    timings['preprocess_seconds'] = round(time.perf_counter() - start, 3)
+
+    # 2. FedAvg 多轮训练（占 0.2 ~ 0.95）
+    def on_round_end(round_index, rounds, round_info):
+        rmse = round_info['val_rmse_before']
+        report(0.2 + 0.75 * (round_index + 1) / rounds,
+               f"第 {round_index + 1}/{rounds} 轮" + (f"，验证 RMSE: {rmse:.2f}" if rmse is not None else ''))
+
+    report(0.2, 'FedAvg 训练')
+    start = time.perf_counter()
+    rounds = int(params.get('rounds', 5))
+    try:
+        model, history = run_fedavg(
+            client_keys,
+            rounds=rounds,
+            local_epochs=int(params.get('local_epochs', 1)),
+            lr=float(params.get('lr', 1e-3)),
+            batch_size=int(params.get('batch_size', 1024)),
+            on_round_end=on_round_end
+        )
+    except Exception as e:
+        raise RuntimeError(f'联邦训练失败: {str(e)}') from e
+    timings['train_seconds'] = round(time.perf_counter() - start, 3)
+
+    # 3. 保存全局模型
+    report(0.97, '保存模型')
+    total_count = sum(p['data_count'] for p in participants)
+    ml_model = MLModel.save_model(
+        model_name=params.get('model_name') or 'fedavg_global_model',
+        model_content=pickle.dumps(model),
+        data_count=total_count,
+        description=params.get('description') or
+                    f'FedAvg 全局模型（{len(participants)} 个客户端，{rounds} 轮）',
+        model_type='fedavg'
+    )
+    print(f"FedAvg 全局模型保存成功，ID: {ml_model.id}")
+
+    return {
+        'model': ml_model.to_dict(),
+        'participants': participants,
+        'history': history,
+        'timings': timings
+    }
+
+
+def cross_client_eval(params, report):
+    """
+    跨客户端评估矩阵：每个客户端的模型（行）在每个客户端的数据（列）上的 RMSE
+
+    params:
+        - client_ids: 参与评估的客户端ID列表（可选，默认全部客户端）
+        - max_workers: 评估进程数（可选，默认 CROSS_EVAL_WORKERS / CPU 核数）
+    """
+    import torch
+
+    from app.train.cross_eval import compute_rmse_matrix
+    from app.train.fedavg import prepare_client_arrays
+    from app.utils.model_cache import get_model_cache
+
+    timings = {}
+    query = Client.query
+    if params.get('client_ids'):
+        query = query.filter(Client.id.in_(params['client_ids']))
+    clients = query.order_by(Client.id).all()
+
+    # 1. 每个数据文件只预处理一次（全局特征空间，写入 MatrixCache，与 FedAvg 共用）
+    start = time.perf_counter()
+    data_clients = [c for c in clients if c.datafile_id]
+    datasets, dataset_keys, prepared = [], [], {}
+    for i, client in enumerate(data_clients):
+        report(0.3 * i / max(len(data_clients), 1), f'准备客户端 {client.name} 的数据')
+        if client.datafile_id not in prepared:
+            datafile = DataFile.query.get(client.datafile_id)
+            try:
+                prepared[client.datafile_id] = prepare_client_arrays(datafile)
+            except Exception as e:
+                raise RuntimeError(f'客户端 {client.name} 数据预处理失败: {str(e)}') from e
+        key, n_samples = prepared[client.datafile_id]
+        datasets.append({
+            'client_id': client.id,
+            'client_name': client.name,
+            'datafile_id': client.datafile_id,
+            'rows': n_samples,
+        })
+        dataset_keys.append(key)
+    timings['preprocess_seconds'] = round(time.perf_counter() - start, 3)
+    if not datasets:
+        raise ValueError('没有绑定数据文件的客户端，无法评估')
+
+    # 2. 加载各客户端模型
+    report(0.3, '加载模型')
+    start = time.perf_counter()
+    model_cache = get_model_cache()
+    models, loaded = [], []
+    for client in clients:
+        if not client.model_id:
+            continue
+        entry = {
+            'client_id': client.id,
+            'client_name': client.name,
+            'model_id': client.model_id,
+            'model_name': None,
+            'model_type': None,
+            'error': None,
+        }
+        try:
+            cached = model_cache.get(client.model_id)
+        except Exception as e:
+            cached, entry['error'] = None, f'加载模型失败: {str(e)}'
+        if cached is None:
+            entry['error'] = entry['error'] or '关联的模型不存在'
+        else:
+            model, model_info = cached
+            entry['model_name'] = model_info['model_name']
+            entry['model_type'] = model_info['model_type']
+            if isinstance(model, torch.nn.Module):
+                loaded.append((len(models), model))
+            else:
+                # 评估矩阵复用的是 MatrixCache 里缩放后的数组，只有 HousePriceModel 等 torch 模型能直接使用
+                entry['error'] = f'暂不支持评估该类型的模型: {type(model).__name__}'
+        models.append(entry)
+    timings['load_seconds'] = round(time.perf_counter() - start, 3)
+    if not loaded:
+        raise ValueError('没有可用的客户端模型，无法评估')
+
+    # 3. 所有模型 × 所有数据集（占 0.35 ~ 0.95）
+    def on_dataset_done(done, total):
+        report(0.35 + 0.6 * done / total, f'已评估 {done}/{total} 个数据集')
+
+    report(0.35, f'评估 {len(loaded)} 个模型 × {len(datasets)} 个数据集')
+    start = time.perf_counter()
+    max_workers = params.get('max_workers')
+    rmse, n = compute_rmse_matrix(
+        [model for _, model in loaded], dataset_keys,
+        max_workers=int(max_workers) if max_workers else None,
+        on_dataset_done=on_dataset_done
+    )
+    timings['evaluate_seconds'] = round(time.perf_counter() - start, 3)
+
+    # 未能加载 / 不支持的模型整行为 None，预测出错的单元格为 None
+    matrix = [[None] * len(datasets) for _ in models]
+    for row, (index, _) in enumerate(loaded):
+        matrix[index] = [None if np.isnan(v) else round(float(v), 4) for v in rmse[row]]
+
+    return {
+        'models': models,
+        'datasets': datasets,
+        'rmse': matrix,
+        'timings': timings
+    }
+
+
+# 任务类型 -> 任务函数
+TASKS = {
+    'train_client': train_client,
+    'fedavg_train': fedavg_train,
+    'cross_client_eval': cross_client_eval,
+}
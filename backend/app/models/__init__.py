@@ -4,6 +4,7 @@
 from app.models.datafile import DataFile
 from app.models.model import MLModel
 from app.models.client import Client
+from app.models.job import Job
 
-__all__ = ['DataFile', 'MLModel', 'Client']
+__all__ = ['DataFile', 'MLModel', 'Client', 'Job']
 
@@ -61,6 +61,21 @@ class Client(db.Model):
         
         return result
     
+    @staticmethod
+    def query_with_relations():
+        """
+        一次 JOIN 查询出客户端及其数据文件/模型的元数据（to_dict 需要的列），
+        避免逐个客户端懒加载关联对象（N+1），也不读取文件/模型二进制内容
+        """
+        from app.models.datafile import DataFile
+        from app.models.model import MLModel
+        return Client.query.options(
+            db.joinedload(Client.datafile).load_only(DataFile.id, DataFile.filename, DataFile.file_size),
+            db.joinedload(Client.model).load_only(
+                MLModel.id, MLModel.model_name, MLModel.data_count, MLModel.model_type
+            )
+        )
+    
     @staticmethod
     def create_client(name, description=None):
         """
@@ -3,6 +3,7 @@
 """
 from datetime import datetime
 from app.extensions import db
+import hashlib
 import io
 import pandas as pd
 
@@ -14,7 +15,8 @@ class DataFile(db.Model):
     
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     filename = db.Column(db.String(255), nullable=False, comment='文件名')
-    file_content = db.Column(db.LargeBinary, nullable=False, comment='文件内容（二进制）')
+    # 大字段延迟加载：列表/元数据查询不读取文件内容，首次访问 file_content 时才单独查询
+    file_content = db.deferred(db.Column(db.LargeBinary, nullable=False, comment='文件内容（二进制）'))
     file_size = db.Column(db.Integer, nullable=False, comment='文件大小（字节）')
     upload_time = db.Column(db.DateTime, default=datetime.now, comment='上传时间')
     description = db.Column(db.Text, comment='文件描述')
@@ -77,6 +79,28 @@ class DataFile(db.Model):
             except:
                 raise Exception(f"无法解析CSV文件: {str(e)}")
     
+    def iter_chunks(self, chunksize=None):
+        """
+        按块读取CSV文件，不一次性生成完整的 DataFrame
+
+        Args:
+            chunksize: 每块行数（默认见 app.train.streaming.DEFAULT_CHUNKSIZE）
+
+        Returns:
+            pandas.DataFrame 的迭代器
+        """
+        from app.train.streaming import iter_csv_chunks
+        return iter_csv_chunks(self.file_content, chunksize)
+
+    def content_hash(self):
+        """
+        文件内容的 sha256，用作预处理结果缓存的键
+
+        Returns:
+            str: 十六进制哈希
+        """
+        return hashlib.sha256(self.file_content).hexdigest()
+
     def get_csv_content(self):
         """
         获取CSV文件的原始内容
@@ -0,0 +1,137 @@
+"""
+后台任务模型 - 记录异步任务（如客户端训练）的状态、进度和耗时
+"""
+import json
+import uuid
+from datetime import datetime
+from app.extensions import db
+
+
+class Job(db.Model):
+    """后台任务表，由 web 进程创建、任务进程更新，任意 worker 都可以查询"""
+
+    __tablename__ = 'jobs'
+
+    # 任务状态
+    PENDING = 'pending'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    FINISHED_STATES = (SUCCEEDED, FAILED)
+
+    id = db.Column(db.String(32), primary_key=True, default=lambda: uuid.uuid4().hex, comment='任务ID')
+    job_type = db.Column(db.String(50), nullable=False, comment='任务类型（如 train_client）')
+    status = db.Column(db.String(20), nullable=False, default=PENDING, index=True, comment='任务状态')
+    progress = db.Column(db.Float, nullable=False, default=0.0, comment='进度（0~1）')
+    message = db.Column(db.String(255), comment='当前阶段说明')
+    params = db.Column(db.Text, comment='任务参数（JSON）')
+    result = db.Column(db.Text, comment='任务结果（JSON）')
+    error = db.Column(db.Text, comment='失败原因')
+    worker = db.Column(db.String(100), comment='负责任务的进程（主机名:pid），pending 时为提交任务的 web 进程，running 后为任务进程')
+    batch_id = db.Column(db.String(32), index=True, comment='批量提交时的批次ID')
+    created_time = db.Column(db.DateTime, default=datetime.now, comment='提交时间')
+    started_time = db.Column(db.DateTime, comment='开始执行时间')
+    updated_time = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now, comment='最近更新时间')
+    finished_time = db.Column(db.DateTime, comment='结束时间')
+
+    def __repr__(self):
+        return f'<Job {self.id} {self.job_type} {self.status}>'
+
+    @property
+    def is_finished(self):
+        return self.status in self.FINISHED_STATES
+
+    def get_params(self):
+        return json.loads(self.params) if self.params else {}
+
+    def get_result(self):
+        return json.loads(self.result) if self.result else None
+
+    def timings(self):
+        """排队 / 执行 / 总耗时（秒），未发生的阶段为 None"""
+        now = datetime.now()
+        queued_end = self.started_time or (None if self.is_finished else now)
+        run_end = self.finished_time or now
+        return {
+            'queued_seconds': round((queued_end - self.created_time).total_seconds(), 3)
+            if queued_end and self.created_time else None,
+            'run_seconds': round((run_end - self.started_time).total_seconds(), 3)
+            if self.started_time else None,
+            'total_seconds': round(((self.finished_time or now) - self.created_time).total_seconds(), 3)
+            if self.created_time else None,
+        }
+
+    def to_dict(self):
+        """转换为字典格式"""
+        fmt = lambda t: t.strftime('%Y-%m-%d %H:%M:%S') if t else None
+        return {
+            'id': self.id,
+            'job_type': self.job_type,
+            'status': self.status,
+            'progress': round(self.progress or 0.0, 4),
+            'message': self.message,
+            'params': self.get_params(),
+            'result': self.get_result(),
+            'error': self.error,
+            'worker': self.worker,
+            'batch_id': self.batch_id,
+            'created_time': fmt(self.created_time),
+            'started_time': fmt(self.started_time),
+            'finished_time': fmt(self.finished_time),
+            'timings': self.timings()
+        }
+
+    @staticmethod
+    def create_job(job_type, params=None, batch_id=None, worker=None):
+        """
+        创建一个待执行的任务
+
+        Args:
+            job_type: 任务类型
+            params: 任务参数（可 JSON 序列化的 dict）
+            batch_id: 批次ID（批量提交时）
+            worker: 提交任务的进程（主机名:pid），用于回收提交进程已退出的排队任务
+
+        Returns:
+            Job对象
+        """
+        job = Job(
+            job_type=job_type,
+            status=Job.PENDING,
+            params=json.dumps(params or {}, ensure_ascii=False),
+            message='等待执行',
+            batch_id=batch_id,
+            worker=worker
+        )
+        db.session.add(job)
+        db.session.commit()
+        return job
+
+    def mark_running(self, worker=None):
+        self.status = Job.RUNNING
+        self.started_time = datetime.now()
+        self.worker = worker
+        self.message = '执行中'
+        db.session.commit()
+
+    def update_progress(self, progress, message=None):
+        """更新进度（0~1）和阶段说明"""
+        self.progress = min(max(float(progress), 0.0), 1.0)
+        if message is not None:
+            self.message = message[:255]
+        db.session.commit()
+
+    def mark_succeeded(self, result=None):
+        self.status = Job.SUCCEEDED
+        self.progress = 1.0
+        self.message = '完成'
+        self.result = json.dumps(result, ensure_ascii=False) if result is not None else None
+        self.finished_time = datetime.now()
+        db.session.commit()
+
+    def mark_failed(self, error):
+        self.status = Job.FAILED
+        self.message = '失败'
+        self.error = str(error)
+        self.finished_time = datetime.now()
+        db.session.commit()
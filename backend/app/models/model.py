@@ -12,7 +12,8 @@ class MLModel(db.Model):
     
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     model_name = db.Column(db.String(255), nullable=False, comment='模型名称')
-    model_content = db.Column(db.LargeBinary, nullable=False, comment='模型文件内容（二进制）')
+    # 大字段延迟加载：列表/元数据查询不读取模型内容，首次访问 model_content 时才单独查询
+    model_content = db.deferred(db.Column(db.LargeBinary, nullable=False, comment='模型文件内容（二进制）'))
     model_size = db.Column(db.Integer, nullable=False, comment='模型文件大小（字节）')
     data_count = db.Column(db.Integer, nullable=False, comment='训练数据量')
     upload_time = db.Column(db.DateTime, default=datetime.now, comment='上传时间')
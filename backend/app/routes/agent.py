@@ -7,6 +7,7 @@ from app.agent.llm_agent import (
     QwenClient, 
     PREDICT_HOUSE_PRICE_TOOL_SPEC, 
     TIME_TOOL_SPEC,
+    FIND_COMPARABLE_SALES_TOOL_SPEC,
     call_tool
 )
 import json
@@ -62,6 +63,7 @@ def chat():
                             "你是一个智能房地产估价助手，可以与用户对话并帮助预测房价。\n"
                             "当用户询问与当前时间、现在几点等问题相关时，请使用工具 get_current_time。\n"
                             "当用户想要预测房价时，请使用工具 predict_house_price。用户需要提供房屋信息和模型ID列表。\n"
+                            "当用户想了解附近类似房子的成交情况时，请使用工具 find_comparable_sales，坐标取自房屋的百度经纬。\n"
                             "房屋信息应包含：小区、成交时间、建筑面积、房屋户型、所在楼层、建成年代、装修情况、房屋朝向、区域、街道、城市等字段。\n"
                             "如果用户没有提供完整的房屋信息或模型ID，请礼貌地询问缺失的信息。\n"
                             "预测结果会包含加权平均的单价和总价，以及各个模型的详细预测信息。\n"
@@ -82,7 +84,7 @@ def chat():
         
         # 初始化客户端
         client = QwenClient()
-        tools = [TIME_TOOL_SPEC, PREDICT_HOUSE_PRICE_TOOL_SPEC]
+        tools = [TIME_TOOL_SPEC, PREDICT_HOUSE_PRICE_TOOL_SPEC, FIND_COMPARABLE_SALES_TOOL_SPEC]
         
         # 调用大模型
         resp = client.chat(session['messages'], tools=tools, tool_choice="auto")
@@ -165,10 +167,28 @@ def chat():
         }), 500
 
 
+def _relay_content(stream):
+    """
+    把 QwenClient.chat_stream 的文本增量转成 SSE content 事件产出，返回拼装好的完整 message
+
+    用法: msg = yield from _relay_content(client.chat_stream(...))
+    """
+    try:
+        while True:
+            try:
+                text = next(stream)
+            except StopIteration as stop:
+                return stop.value
+            yield f"data: {json.dumps({'type': 'content', 'content': text})}\n\n"
+    finally:
+        # 浏览器断开时立即关闭到大模型的连接，不再继续生成
+        stream.close()
+
+
 @agent_bp.route('/chat-stream', methods=['POST'])
 def chat_stream():
     """
-    流式对话接口（不支持工具调用时的流式）
+    流式对话接口：大模型以 stream=True 调用，生成的文本逐段转发给浏览器（工具调用前后都是）
     
     请求体:
     {
@@ -200,6 +220,7 @@ def chat_stream():
                             "你是一个智能房地产估价助手，可以与用户对话并帮助预测房价。\n"
                             "当用户询问与当前时间、现在几点等问题相关时，请使用工具 get_current_time。\n"
                             "当用户想要预测房价时，请使用工具 predict_house_price。用户需要提供房屋信息和模型ID列表。\n"
+                            "当用户想了解附近类似房子的成交情况时，请使用工具 find_comparable_sales，坐标取自房屋的百度经纬。\n"
                             "房屋信息应包含用户提供的所有房屋信息，将其作为dict传入函数。\n"
                             "预测结果会包含加权平均的单价和总价，以及各个模型的详细预测信息。\n"
                             "请用友好、专业的语气回答用户问题。"
@@ -222,18 +243,18 @@ def chat_stream():
                 
                 # 初始化客户端
                 client = QwenClient()
-                tools = [TIME_TOOL_SPEC, PREDICT_HOUSE_PRICE_TOOL_SPEC]
+                tools = [TIME_TOOL_SPEC, PREDICT_HOUSE_PRICE_TOOL_SPEC, FIND_COMPARABLE_SALES_TOOL_SPEC]
                 
                 # 发送session_id
                 yield f"data: {json.dumps({'type': 'session', 'session_id': session_id})}\n\n"
                 
-                # 调用大模型
-                resp = client.chat(session['messages'], tools=tools, tool_choice="auto")
-                msg = resp["choices"][0]["message"]
+                # 调用大模型（流式）：文本增量到达即转发，工具调用的增量在 chat_stream 内拼装
+                msg = yield from _relay_content(
+                    client.chat_stream(session['messages'], tools=tools, tool_choice="auto")
+                )
                 
                 # 检查是否需要调用工具
-                if "tool_calls" in msg:
-                    # 有工具调用，无法流式输出
+                if msg.get("tool_calls"):
                     yield f"data: {json.dumps({'type': 'tool_call', 'message': '正在调用工具...'})}\n\n"
                     
                     tool_calls = msg["tool_calls"]
@@ -254,8 +275,6 @@ def chat_stream():
                         
                         # 调用工具
                         result_str = call_tool(func_name, arguments)
-                        print("arguments")
-                        print(arguments)
                         
                         tool_results_messages.append({
                             "role": "tool",
@@ -266,35 +285,13 @@ def chat_stream():
                     
                     session['messages'].extend(tool_results_messages)
                     
-                    # 获取最终回复
-                    resp2 = client.chat(session['messages'])
-                    final_msg = resp2["choices"][0]["message"]
-                    final_answer = final_msg.get("content", "")
-                    
-                    session['messages'].append({
-                        "role": "assistant",
-                        "content": final_answer
-                    })
-                    
-                    # 分块发送最终回复（模拟流式）
-                    chunk_size = 20
-                    for i in range(0, len(final_answer), chunk_size):
-                        chunk = final_answer[i:i+chunk_size]
-                        yield f"data: {json.dumps({'type': 'content', 'content': chunk})}\n\n"
-                    
-                else:
-                    # 没有工具调用，直接输出
-                    answer = msg.get("content", "")
-                    session['messages'].append({
-                        "role": "assistant",
-                        "content": answer
-                    })
-                    
-                    # 分块发送（模拟流式）
-                    chunk_size = 20
-                    for i in range(0, len(answer), chunk_size):
-                        chunk = answer[i:i+chunk_size]
-                        yield f"data: {json.dumps({'type': 'content', 'content': chunk})}\n\n"
+                    # 获取最终回复（流式）
+                    msg = yield from _relay_content(client.chat_stream(session['messages']))
+                
+                session['messages'].append({
+                    "role": "assistant",
+                    "content": msg.get("content", "")
+                })
                 
                 # 发送结束信号
                 yield f"data: {json.dumps({'type': 'done'})}\n\n"
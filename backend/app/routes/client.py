@@ -6,8 +6,8 @@ from app.models.client import Client
 from app.models.datafile import DataFile
 from app.models.model import MLModel
 from app.extensions import db
-import pickle
 import io
+import math
 
 client_bp = Blueprint('client', __name__, url_prefix='/api/clients')
 
@@ -47,7 +47,7 @@ def create_client():
 def get_clients():
     """获取所有客户端列表"""
     try:
-        clients = Client.query.order_by(Client.created_time.desc()).all()
+        clients = Client.query_with_relations().order_by(Client.created_time.desc()).all()
         return jsonify({
             'message': '获取成功',
             'data': [c.to_dict() for c in clients],
@@ -61,7 +61,7 @@ def get_clients():
 def get_client(client_id):
     """获取指定ID的客户端信息"""
     try:
-        client = Client.query.get(client_id)
+        client = Client.query_with_relations().filter(Client.id == client_id).first()
         if not client:
             return jsonify({'error': '客户端不存在'}), 404
         
@@ -216,7 +216,10 @@ def unbind_model(client_id):
 @client_bp.route('/<int:client_id>/train', methods=['POST'])
 def train_client(client_id):
     """
-    训练客户端（使用绑定的数据文件进行训练）
+    提交客户端训练任务（使用绑定的数据文件进行训练）
+
+    训练在后台任务进程中执行，接口立即返回 202 和任务信息，
+    通过 GET /api/jobs/<job_id> 查询状态、进度和结果。
     
     请求参数 (JSON):
         - model_name: 训练后保存的模型名称（可选，默认为 "client_{id}_model"）
@@ -237,72 +240,162 @@ def train_client(client_id):
         if not datafile:
             return jsonify({'error': '关联的数据文件不存在'}), 404
         
-        # 1. 从数据库读取 CSV 并转换为 DataFrame
-        try:
-            df = datafile.to_dataframe()
-            print(f"成功读取数据文件: {datafile.filename}, 行数: {len(df)}")
-        except Exception as e:
-            return jsonify({'error': f'读取CSV文件失败: {str(e)}'}), 500
+        # 获取请求参数
+        data = request.get_json(silent=True) or {}
         
-        # 2. 数据预处理
-        try:
-            from app.train.data_load import preprocess_df
-            processed_df = preprocess_df(df, is_train=True)
-            print(f"数据预处理完成，处理后行数: {len(processed_df)}")
-        except Exception as e:
-            return jsonify({'error': f'数据预处理失败: {str(e)}'}), 500
+        from app.jobs import get_job_runner
+        job = get_job_runner().submit('train_client', {
+            'client_id': client_id,
+            'model_name': data.get('model_name', f'client_{client_id}_model'),
+            'model_type': data.get('model_type', 'lightgbm'),
+            'description': data.get('description', f'由客户端 {client.name} 训练生成')
+        })
         
-        # 3. 训练模型
-        try:
-            from app.train.train_dp import train_model
-            model = train_model(processed_df)
-            print(f"模型训练完成")
-        except Exception as e:
-            return jsonify({'error': f'模型训练失败: {str(e)}'}), 500
+        return jsonify({
+            'message': '训练任务已提交',
+            'data': job.to_dict()
+        }), 202, {'Location': f'/api/jobs/{job.id}'}
         
-        # 4. 保存模型到数据库
-        try:
-            # 序列化模型
-            model_bytes = pickle.dumps(model)
-            
-            # 获取请求参数
-            data = request.get_json() or {}
-            model_name = data.get('model_name', f'client_{client_id}_model')
-            model_type = data.get('model_type', 'lightgbm')
-            description = data.get('description', f'由客户端 {client.name} 训练生成')
-            
-            # 保存模型
-            ml_model = MLModel.save_model(
-                model_name=model_name,
-                model_content=model_bytes,
-                data_count=len(df),
-                description=description,
-                model_type=model_type
-            )
-            
-            # 自动绑定模型到客户端
-            client.bind_model(ml_model.id)
-            
-            print(f"模型保存成功，ID: {ml_model.id}")
-            
-        except Exception as e:
-            return jsonify({'error': f'保存模型失败: {str(e)}'}), 500
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'训练失败: {str(e)}'}), 500
+
+
+@client_bp.route('/train-bulk', methods=['POST'])
+def train_clients_bulk():
+    """
+    批量提交训练任务：每个客户端一个后台任务，由任务进程池并行执行
+    
+    请求参数 (JSON):
+        - client_ids: 客户端ID列表（必需）
+        - model_type: 模型类型（可选）
+        - description: 模型描述（可选）
+    
+    返回 202 和 batch_id，通过 GET /api/jobs/batches/<batch_id> 查询整体进度和加速比
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        client_ids = data.get('client_ids')
+        if not isinstance(client_ids, list) or len(client_ids) == 0:
+            return jsonify({'error': 'client_ids 必须是非空列表'}), 400
+        
+        from app.jobs import get_job_runner
+        from app.jobs.batch import submit_training_batch
+        runner = get_job_runner()
+        batch_id, jobs, skipped = submit_training_batch(runner, client_ids, data)
         
         return jsonify({
-            'message': '训练完成并保存成功',
+            'message': f'已提交 {len(jobs)} 个训练任务',
             'data': {
-                'client': client.to_dict(),
-                'model': ml_model.to_dict(),
-                'training_info': {
-                    'data_rows': len(df),
-                    'processed_rows': len(processed_df)
-                }
+                'batch_id': batch_id,
+                'max_workers': runner.max_workers,
+                'job_slots': runner.slots,
+                'jobs': [job.to_dict() for job in jobs],
+                'skipped': skipped
             }
-        }), 200
+        }), 202, {'Location': f'/api/jobs/batches/{batch_id}'}
         
     except Exception as e:
         db.session.rollback()
-        return jsonify({'error': f'训练失败: {str(e)}'}), 500
+        return jsonify({'error': f'批量训练失败: {str(e)}'}), 500
+
+
+@client_bp.route('/fedavg', methods=['POST'])
+def train_fedavg():
+    """
+    提交 FedAvg 联邦训练任务：多个客户端协同训练一个全局模型
+    
+    请求参数 (JSON):
+        - client_ids: 参与训练的客户端ID列表（必需）
+        - rounds: 通信轮数（可选，默认 5）
+        - local_epochs: 每轮本地训练轮数（可选，默认 1）
+        - lr: 学习率（可选，默认 0.001）
+        - model_name: 全局模型名称（可选，默认 "fedavg_global_model"）
+        - description: 模型描述（可选）
+    
+    训练完成后全局模型保存为 model_type="fedavg" 的模型，可像普通模型一样绑定到客户端。
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        client_ids = data.get('client_ids')
+        if not isinstance(client_ids, list) or len(client_ids) == 0:
+            return jsonify({'error': 'client_ids 必须是非空列表'}), 400
+        
+        clients = Client.query.filter(Client.id.in_(client_ids)).all()
+        trainable = [c.id for c in clients if c.datafile_id]
+        if not trainable:
+            return jsonify({'error': '指定的客户端都未绑定数据文件，无法训练'}), 400
+        
+        params = {key: data[key] for key in ('rounds', 'local_epochs', 'lr', 'batch_size', 'model_name', 'description')
+                  if key in data}
+        params['client_ids'] = trainable
+        
+        from app.jobs import get_job_runner
+        job = get_job_runner().submit('fedavg_train', params)
+        
+        return jsonify({
+            'message': 'FedAvg 训练任务已提交',
+            'data': job.to_dict()
+        }), 202, {'Location': f'/api/jobs/{job.id}'}
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'联邦训练失败: {str(e)}'}), 500
+
+
+@client_bp.route('/eval-matrix', methods=['POST'])
+def submit_eval_matrix():
+    """
+    提交跨客户端评估任务：每个客户端模型在每个客户端数据上的 RMSE 矩阵
+
+    请求参数 (JSON，可选):
+        - client_ids: 参与评估的客户端ID列表（默认全部客户端）
+        - max_workers: 评估进程数
+
+    结果（行：模型，列：数据集）写入任务结果，可通过 GET /api/clients/eval-matrix 获取最近一次结果。
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        client_ids = data.get('client_ids')
+        if client_ids is not None and (not isinstance(client_ids, list) or len(client_ids) == 0):
+            return jsonify({'error': 'client_ids 必须是非空列表'}), 400
+
+        params = {key: data[key] for key in ('client_ids', 'max_workers') if key in data}
+
+        from app.jobs import get_job_runner
+        job = get_job_runner().submit('cross_client_eval', params)
+
+        return jsonify({
+            'message': '跨客户端评估任务已提交',
+            'data': job.to_dict()
+        }), 202, {'Location': f'/api/jobs/{job.id}'}
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'提交评估任务失败: {str(e)}'}), 500
+
+
+@client_bp.route('/eval-matrix', methods=['GET'])
+def get_eval_matrix():
+    """获取最近一次成功完成的跨客户端评估矩阵"""
+    try:
+        from app.models.job import Job
+        job = Job.query.filter_by(job_type='cross_client_eval', status=Job.SUCCEEDED) \
+            .order_by(Job.finished_time.desc()).first()
+        if not job:
+            return jsonify({'error': '暂无评估结果，请先提交评估任务'}), 404
+
+        return jsonify({
+            'message': '获取评估矩阵成功',
+            'data': {
+                'job_id': job.id,
+                'finished_time': job.finished_time.strftime('%Y-%m-%d %H:%M:%S') if job.finished_time else None,
+                **job.get_result()
+            }
+        }), 200
+
+    except Exception as e:
+        return jsonify({'error': f'获取评估矩阵失败: {str(e)}'}), 500
 
 
 @client_bp.route('/evaluate', methods=['POST'])
@@ -315,6 +408,8 @@ def evaluate_clients():
     请求参数 (JSON):
         - client_ids: 客户端ID列表（必需）
         - house_data: 房屋数据（dict格式，必需）
+        - timeout: 等待各模型预测的截止时间（秒，可选），超时的模型不参与融合
+        - timings: 为 true 时（或查询参数 ?timings=1）在返回中附带各阶段耗时
         
     示例:
     {
@@ -350,84 +445,289 @@ def evaluate_clients():
         if not isinstance(house_data, dict):
             return jsonify({'error': 'house_data 必须是字典格式'}), 400
         
+        timeout = data.get('timeout')
+        if timeout is not None:
+            try:
+                timeout = None if isinstance(timeout, bool) else float(timeout)
+            except (TypeError, ValueError):
+                timeout = None
+            if timeout is None or not math.isfinite(timeout) or timeout <= 0:
+                return jsonify({'error': 'timeout 必须是大于 0 的秒数'}), 400
+        
         # 获取所有指定的客户端
         clients = Client.query.filter(Client.id.in_(client_ids)).all()
         
         if len(clients) == 0:
             return jsonify({'error': '未找到指定的客户端'}), 404
         
-        results = []
-        
-        for client in clients:
-            result = {
-                'client_id': client.id,
-                'client_name': client.name,
-                'status': None,
-                'prediction': None,
-                'error': None
-            }
-            
-            # 检查是否绑定了模型
-            if not client.model_id:
-                result['status'] = 'skipped'
-                result['error'] = '该客户端未绑定模型'
-                results.append(result)
-                continue
-            
-            # 获取模型
-            model_obj = MLModel.query.get(client.model_id)
-            if not model_obj:
-                result['status'] = 'error'
-                result['error'] = '关联的模型不存在'
-                results.append(result)
-                continue
-            
-            try:
-                # 1. 加载模型
-                model_bytes = model_obj.get_model_content()
-                model = pickle.loads(model_bytes)
+        from app.utils.timing import collect_timings, span, wants_timings
 
+        with collect_timings(wants_timings(request, data)) as timings:
+            from app.utils.inference_pool import TIMEOUT, SUCCESS, get_inference_pool
+            from app.utils.model_cache import get_model_cache
+            from app.utils.prediction_cache import get_prediction_cache
+            model_cache = get_model_cache()
 
-                # 2. 构建特征（这里简化处理，实际可能需要调用 build_house_features）
-                # 暂时返回一个占位符结果
-                # TODO: 集成 others.py 的 build_house_features 函数
+            def predict_one(model_id):
+                # 在推理线程中执行：加载模型（进程内缓存）+ 预测
+                cached = model_cache.get(model_id)
+                if cached is None:
+                    raise LookupError('关联的模型不存在')
+                model, model_info = cached
                 unit_price, total_price = eval_house_by_dict(house_data, model)
-
-                # 临时方案：返回模型信息和数据信息
-                result['status'] = 'success'
-                result['prediction'] = {
-                    'model_name': model_obj.model_name,
-                    'data_count': model_obj.data_count,
-                    'model_type': model_obj.model_type,
+                return {
+                    'model_name': model_info['model_name'],
+                    'data_count': model_info['data_count'],
+                    'model_type': model_info['model_type'],
                     "unit_price": unit_price,
                     "total_price": total_price
-
                 }
-                
-            except Exception as e:
-                result['status'] = 'error'
-                result['error'] = f'预测失败: {str(e)}'
-            
-            results.append(result)
-        
-        # 统计结果
-        success_count = sum(1 for r in results if r['status'] == 'success')
-        error_count = sum(1 for r in results if r['status'] == 'error')
-        skipped_count = sum(1 for r in results if r['status'] == 'skipped')
-        federated_results = federated_predict_house(results)
 
-        return jsonify({
+            results = []
+            for client in clients:
+                results.append({
+                    'client_id': client.id,
+                    'client_name': client.name,
+                    'status': None,
+                    'prediction': None,
+                    'error': None
+                })
+                # 检查是否绑定了模型
+                if not client.model_id:
+                    results[-1]['status'] = 'skipped'
+                    results[-1]['error'] = '该客户端未绑定模型'
+
+            pending = [(result, client.model_id) for result, client in zip(results, clients) if client.model_id]
+            model_ids = [model_id for _, model_id in pending]
+
+            # 相同房屋 + 相同模型集合（含版本）命中预测缓存时不再加载模型和预测
+            prediction_cache = get_prediction_cache()
+            with span('prediction_cache'):
+                cache_key = prediction_cache.make_key(house_data, model_ids) if model_ids else None
+                cached_predictions = prediction_cache.get(cache_key)
+            if cached_predictions is not None:
+                outcomes = [(SUCCESS, dict(cached_predictions[model_id])) for model_id in model_ids]
+            else:
+                # 各模型并发预测，超过截止时间的记为超时，融合只使用已完成的结果
+                outcomes = get_inference_pool().map(
+                    predict_one, model_ids,
+                    timeout=timeout
+                )
+                # 只缓存全部模型都成功的结果，超时 / 失败不缓存
+                if all(status == SUCCESS for status, _ in outcomes):
+                    prediction_cache.put(cache_key, {
+                        model_id: value for model_id, (_, value) in zip(model_ids, outcomes)
+                    })
+
+            for (result, _), (status, value) in zip(pending, outcomes):
+                if status == SUCCESS:
+                    result['status'] = 'success'
+                    result['prediction'] = value
+                elif status == TIMEOUT:
+                    result['status'] = 'timeout'
+                    result['error'] = '预测超时'
+                elif isinstance(value, LookupError):
+                    result['status'] = 'error'
+                    result['error'] = str(value)
+                else:
+                    result['status'] = 'error'
+                    result['error'] = f'预测失败: {str(value)}'
+
+            # 统计结果
+            success_count = sum(1 for r in results if r['status'] == 'success')
+            error_count = sum(1 for r in results if r['status'] == 'error')
+            skipped_count = sum(1 for r in results if r['status'] == 'skipped')
+            timeout_count = sum(1 for r in results if r['status'] == 'timeout')
+            with span('fuse'):
+                federated_results = federated_predict_house(results)
+
+        response = {
             'message': '评测完成',
             'summary': {
                 'total': len(results),
                 'success': success_count,
                 'error': error_count,
-                'skipped': skipped_count
+                'skipped': skipped_count,
+                'timeout': timeout_count
             },
             'results': results,
             'federated_results': federated_results
-        }), 200
+        }
+        if timings is not None:
+            response['timings'] = timings.to_dict()
+        return jsonify(response), 200
         
     except Exception as e:
         return jsonify({'error': f'评测失败: {str(e)}'}), 500
 
+
+
+def _parse_id_list(value):
+    """'1,2,3' -> [1, 2, 3]"""
+    return [int(v) for v in str(value).split(',') if v.strip()]
+
+
+@client_bp.route('/evaluate-batch', methods=['POST'])
+def evaluate_clients_batch():
+    """
+    批量评测接口 - 一次请求评估多套房屋，每个模型只做一次批量前向
+
+    请求体二选一:
+        1. JSON: {"client_ids": [1, 2], "houses": [{...}, {...}]}
+        2. NDJSON（Content-Type: application/x-ndjson）：每行一套房屋，
+           客户端ID通过查询参数 ?client_ids=1,2 传入
+
+    查询参数:
+        - include_models: 为 true 时在每条结果中附带各模型的单价
+
+    返回:
+        - summary: 房屋数 / 模型成功失败统计
+        - models: 各客户端模型的状态
+        - predictions: 按输入顺序的融合结果 [{index, unit_price, total_price}]，
+          无法预测的房屋（如面积无法解析）对应字段为 null
+    """
+    import json
+    from app.train.batch_predict import BATCH_PREDICT_MAX_HOUSES, predict_clients_batch
+    try:
+        if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+            try:
+                houses = [json.loads(line) for line in request.get_data(as_text=True).splitlines() if line.strip()]
+                client_ids = _parse_id_list(request.args.get('client_ids', ''))
+            except ValueError as e:
+                return jsonify({'error': f'请求体解析失败: {str(e)}'}), 400
+        else:
+            data = request.get_json(silent=True)
+            if not data:
+                return jsonify({'error': '请求体不能为空'}), 400
+            houses = data.get('houses')
+            client_ids = data.get('client_ids')
+
+        if not isinstance(client_ids, list) or len(client_ids) == 0:
+            return jsonify({'error': 'client_ids 必须是非空列表'}), 400
+        if not isinstance(houses, list) or len(houses) == 0:
+            return jsonify({'error': 'houses 必须是非空列表'}), 400
+        if not all(isinstance(h, dict) for h in houses):
+            return jsonify({'error': 'houses 中的每一项必须是字典格式'}), 400
+        if len(houses) > BATCH_PREDICT_MAX_HOUSES:
+            return jsonify({'error': f'单次最多评测 {BATCH_PREDICT_MAX_HOUSES} 套房屋'}), 400
+
+        clients = Client.query.filter(Client.id.in_(client_ids)).all()
+        if len(clients) == 0:
+            return jsonify({'error': '未找到指定的客户端'}), 404
+
+        include_models = request.args.get('include_models', 'false').lower() == 'true'
+        result = predict_clients_batch(clients, houses, include_models=include_models)
+
+        return jsonify({
+            'message': '评测完成',
+            **result
+        }), 200
+
+    except Exception as e:
+        return jsonify({'error': f'评测失败: {str(e)}'}), 500
+
+
+@client_bp.route('/score-csv', methods=['POST'])
+def score_csv():
+    """
+    批量打分接口 - 对整份 CSV 逐块预测，边算边以流的形式返回结果
+
+    数据来源二选一:
+        - 上传文件: multipart/form-data 的 file 字段
+        - 已上传的数据文件: 查询参数 datafile_id
+
+    查询参数:
+        - client_ids: 参与预测的客户端ID，逗号分隔（必需）
+        - format: csv（默认）或 ndjson
+        - include_models: 为 true 时每个模型额外输出一列单价 model_<client_id>
+        - keep: 原样带出的输入列，逗号分隔（如 小区,建筑面积），便于与原文件对应
+        - chunksize: 每块行数（正整数），默认 SCORING_CHUNKSIZE
+
+    返回:
+        逐块写出的 CSV / NDJSON，列为 row、keep 列、unit_price、total_price；
+        无法预测的行价格为空。CSV 无法解析或缺少 SCORING_REQUIRED_COLS 时返回 400；
+        开始输出后处理出错时在末尾追加一行错误信息。
+    """
+    import itertools
+    import json
+    from flask import Response, stream_with_context
+    from app.train.batch_predict import SCORING_CHUNKSIZE, SCORING_REQUIRED_COLS, BatchPredictor, iter_scored_chunks
+    from app.train.streaming import iter_csv_chunks
+    try:
+        try:
+            client_ids = _parse_id_list(request.args.get('client_ids', ''))
+        except ValueError:
+            return jsonify({'error': 'client_ids 格式错误'}), 400
+        if not client_ids:
+            return jsonify({'error': '必须提供客户端ID列表(client_ids)'}), 400
+
+        fmt = request.args.get('format', 'csv').lower()
+        if fmt not in ('csv', 'ndjson'):
+            return jsonify({'error': 'format 只能是 csv 或 ndjson'}), 400
+        include_models = request.args.get('include_models', 'false').lower() == 'true'
+        keep_cols = [c for c in request.args.get('keep', '').split(',') if c.strip()]
+        try:
+            chunksize = int(request.args.get('chunksize', SCORING_CHUNKSIZE))
+        except ValueError:
+            chunksize = 0
+        if chunksize <= 0:
+            return jsonify({'error': 'chunksize 必须是正整数'}), 400
+
+        # 数据来源：上传文件按流读取，不整体载入内存
+        datafile_id = request.args.get('datafile_id', type=int)
+        if 'file' in request.files:
+            source = request.files['file'].stream
+        elif datafile_id:
+            datafile = DataFile.query.get(datafile_id)
+            if not datafile:
+                return jsonify({'error': '数据文件不存在'}), 404
+            source = datafile.get_csv_content()
+        else:
+            return jsonify({'error': '必须上传文件(file)或提供数据文件ID(datafile_id)'}), 400
+
+        clients = Client.query.filter(Client.id.in_(client_ids)).all()
+        if len(clients) == 0:
+            return jsonify({'error': '未找到指定的客户端'}), 404
+
+        # 开始输出前读出第一块并检查列，文件格式问题返回 400 而不是在流里写错误
+        chunks = iter_csv_chunks(source, chunksize)
+        try:
+            first_chunk = next(chunks, None)
+        except (ValueError, UnicodeDecodeError) as e:  # pandas 的 ParserError / EmptyDataError 都是 ValueError
+            return jsonify({'error': f'无法解析 CSV: {str(e)}'}), 400
+        if first_chunk is None:
+            return jsonify({'error': 'CSV 中没有数据行'}), 400
+        missing = [c for c in SCORING_REQUIRED_COLS if c not in first_chunk.columns]
+        if missing:
+            return jsonify({'error': f'CSV 缺少必需的列: {", ".join(missing)}'}), 400
+
+        # 开始输出前加载好模型，流式阶段只做编码和前向
+        predictor = BatchPredictor(clients, include_models=include_models)
+        if not any(m['status'] is None for m in predictor.models):
+            return jsonify({'error': '指定的客户端没有可用的模型', 'models': predictor.models}), 400
+
+        def generate():
+            first = True
+            try:
+                for out in iter_scored_chunks(predictor, itertools.chain([first_chunk], chunks), keep_cols):
+                    if fmt == 'csv':
+                        yield out.to_csv(index=False, header=first)
+                    else:
+                        lines = out.to_json(orient='records', lines=True, force_ascii=False)
+                        yield lines if lines.endswith('\n') else lines + '\n'
+                    first = False
+            except Exception as e:
+                if fmt == 'csv':
+                    yield f'# 打分失败: {str(e)}\n'
+                else:
+                    yield json.dumps({'error': f'打分失败: {str(e)}'}, ensure_ascii=False) + '\n'
+
+        mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+        return Response(
+            stream_with_context(generate()),
+            mimetype=mimetype,
+            headers={'Content-Disposition': f'attachment; filename=scores.{fmt}'}
+        )
+
+    except Exception as e:
+        return jsonify({'error': f'打分失败: {str(e)}'}), 500
@@ -43,6 +43,13 @@ def upload_datafile():
             csv_content=file_content,
             description=description
         )
+
+        # 增量并入可比成交索引（只解析这一个文件）；失败不影响上传，查询时会再次同步
+        try:
+            from app.utils.comparables import get_comparables_index
+            get_comparables_index().add_datafile(datafile)
+        except Exception as e:
+            print(f"可比成交索引更新失败: {e}")
         
         return jsonify({
             'message': '文件上传成功',
@@ -68,6 +75,41 @@ def get_datafiles():
         return jsonify({'error': f'获取失败: {str(e)}'}), 500
 
 
+@datafile_bp.route('/comparables', methods=['GET', 'POST'])
+def find_comparables():
+    """
+    查询附近的可比成交（已上传数据文件中的历史成交）
+
+    请求参数（GET 查询参数或 POST JSON）:
+        - lng / lat: 百度坐标（必需，也可以用 百度经纬 "lng,lat" 代替）
+        - city: 城市（可选，不填时在所有城市中查找）
+        - k: 返回条数（可选，默认 10）
+        - area_min / area_max: 建筑面积范围（可选，㎡）
+        - room_type: 户型前缀（可选，如 "3室" 或 "3室2厅"）
+        - max_distance_km: 最大距离（可选）
+    """
+    try:
+        from app.utils.comparables import get_comparables_index, parse_query_params
+
+        params = request.args.to_dict() if request.method == 'GET' else (request.get_json(silent=True) or {})
+        try:
+            query = parse_query_params(params)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        comparables = get_comparables_index().query(**query)
+        return jsonify({
+            'message': '查询可比成交成功',
+            'data': {
+                'query': query,
+                'count': len(comparables),
+                'comparables': comparables
+            }
+        }), 200
+    except Exception as e:
+        return jsonify({'error': f'查询可比成交失败: {str(e)}'}), 500
+
+
 @datafile_bp.route('/<int:file_id>', methods=['GET'])
 def get_datafile(file_id):
     """获取指定ID的数据文件信息"""
@@ -154,6 +196,9 @@ def delete_datafile(file_id):
         filename = datafile.filename
         db.session.delete(datafile)
         db.session.commit()
+
+        from app.utils.comparables import get_comparables_index
+        get_comparables_index().remove_datafile(file_id)
         
         return jsonify({
             'message': f'文件 {filename} 删除成功'
@@ -10,9 +10,25 @@ health_bp = Blueprint('health', __name__)
 @health_bp.route('/health', methods=['GET'])
 def health_check():
     """健康检查接口 - 返回系统运行状态"""
+    from app.train.artifacts import get_feature_artifacts
+    from app.train.matrix_cache import get_matrix_cache
+    from app.train.micro_batch import micro_batch_stats
+    from app.utils.comparables import get_comparables_index
+    from app.utils.inference_pool import get_inference_pool
+    from app.utils.model_cache import get_model_cache
+    from app.utils.prediction_cache import get_prediction_cache
+    from app.utils.timing import get_stage_histograms
     return jsonify({
         'status': 'healthy',
         'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-        'message': '服务运行正常'
+        'message': '服务运行正常',
+        'feature_artifacts': get_feature_artifacts().stats(),
+        'matrix_cache': get_matrix_cache().stats(),
+        'model_cache': get_model_cache().stats(),
+        'inference_pool': get_inference_pool().stats(),
+        'prediction_cache': get_prediction_cache().stats(),
+        'micro_batch': micro_batch_stats(),
+        'comparables_index': get_comparables_index().stats(),
+        'stage_timings': get_stage_histograms().stats()
     }), 200
 
@@ -0,0 +1,80 @@
+"""
+后台任务查询路由
+"""
+from flask import Blueprint, request, jsonify
+from app.jobs.runner import reap_stale_jobs
+from app.models.job import Job
+
+job_bp = Blueprint('job', __name__, url_prefix='/api/jobs')
+
+
+@job_bp.route('/', methods=['GET'])
+def get_jobs():
+    """
+    获取任务列表（按提交时间倒序）
+
+    查询参数:
+        - status: 按状态过滤（pending / running / succeeded / failed）
+        - job_type: 按任务类型过滤
+        - limit: 返回条数，默认 50
+
+    查询前先把已经没有进程负责的未完成任务标记为失败（见 reap_stale_jobs）
+    """
+    try:
+        reap_stale_jobs()
+        query = Job.query
+        status = request.args.get('status')
+        job_type = request.args.get('job_type')
+        if status:
+            query = query.filter(Job.status == status)
+        if job_type:
+            query = query.filter(Job.job_type == job_type)
+        limit = min(request.args.get('limit', 50, type=int), 500)
+
+        jobs = query.order_by(Job.created_time.desc()).limit(limit).all()
+        return jsonify({
+            'message': '获取成功',
+            'data': [j.to_dict() for j in jobs],
+            'total': len(jobs)
+        }), 200
+    except Exception as e:
+        return jsonify({'error': f'获取失败: {str(e)}'}), 500
+
+
+@job_bp.route('/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """获取指定任务的状态、进度、耗时和结果"""
+    try:
+        reap_stale_jobs()
+        job = Job.query.get(job_id)
+        if not job:
+            return jsonify({'error': '任务不存在'}), 404
+
+        return jsonify({
+            'message': '获取成功',
+            'data': job.to_dict()
+        }), 200
+    except Exception as e:
+        return jsonify({'error': f'获取失败: {str(e)}'}), 500
+
+
+@job_bp.route('/batches/<batch_id>', methods=['GET'])
+def get_batch(batch_id):
+    """获取批量任务的整体状态、墙钟耗时和相对顺序执行的加速比"""
+    try:
+        from app.jobs.batch import get_batch_jobs, batch_summary
+        reap_stale_jobs()
+        jobs = get_batch_jobs(batch_id)
+        if not jobs:
+            return jsonify({'error': '批次不存在'}), 404
+
+        return jsonify({
+            'message': '获取成功',
+            'data': {
+                'batch_id': batch_id,
+                'summary': batch_summary(jobs),
+                'jobs': [j.to_dict() for j in jobs]
+            }
+        }), 200
+    except Exception as e:
+        return jsonify({'error': f'获取失败: {str(e)}'}), 500
@@ -0,0 +1,14 @@
+"""
+Prometheus 指标路由
+"""
+from flask import Blueprint, Response
+
+metrics_bp = Blueprint('metrics', __name__)
+
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus 文本格式的指标（多进程部署时汇总所有 worker）"""
+    from app.utils.metrics import render_latest
+    body, content_type = render_latest()
+    return Response(body, content_type=content_type)
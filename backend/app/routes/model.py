@@ -4,6 +4,8 @@
 from flask import Blueprint, request, jsonify, send_file
 from app.models.model import MLModel
 from app.extensions import db
+from app.utils.model_cache import get_model_cache
+from app.utils.prediction_cache import get_prediction_cache
 import io
 
 model_bp = Blueprint('model', __name__, url_prefix='/api/models')
@@ -118,6 +120,50 @@ def download_model(model_id):
         return jsonify({'error': f'下载失败: {str(e)}'}), 500
 
 
+@model_bp.route('/<int:model_id>/evaluate', methods=['GET', 'POST'])
+def evaluate_model(model_id):
+    """
+    在数据文件上评估模型（RMSE / MAE / R²，以 元/平 为目标）
+
+    查询参数:
+        - datafile_id: 数据文件ID（必需）
+        - refresh: 为 true 时忽略缓存重新计算
+
+    按块读取、批量预测，大文件用线程池并行；同一模型版本 + 同一文件内容的结果会被缓存。
+    """
+    try:
+        from app.models.datafile import DataFile
+        from app.train.holdout import evaluate_model_on_datafile
+
+        datafile_id = request.args.get('datafile_id', type=int)
+        if not datafile_id:
+            return jsonify({'error': '必须提供数据文件ID(datafile_id)'}), 400
+        refresh = request.args.get('refresh', 'false').lower() == 'true'
+
+        cached = get_model_cache().get(model_id)
+        if cached is None:
+            return jsonify({'error': '模型不存在'}), 404
+        datafile = DataFile.query.get(datafile_id)
+        if not datafile:
+            return jsonify({'error': '数据文件不存在'}), 404
+
+        model, model_info = cached
+        metrics = evaluate_model_on_datafile(model, model_info, datafile, refresh=refresh)
+
+        return jsonify({
+            'message': '评估完成',
+            'data': {
+                'model_id': model_id,
+                'model_name': model_info['model_name'],
+                'datafile_id': datafile.id,
+                'filename': datafile.filename,
+                **metrics
+            }
+        }), 200
+    except Exception as e:
+        return jsonify({'error': f'评估失败: {str(e)}'}), 500
+
+
 @model_bp.route('/<int:model_id>', methods=['PUT'])
 def update_model(model_id):
     """
@@ -149,6 +195,8 @@ def update_model(model_id):
             ml_model.model_type = data['model_type']
         
         db.session.commit()
+        get_model_cache().invalidate(model_id)
+        get_prediction_cache().invalidate_model(model_id)
         
         return jsonify({
             'message': '模型信息更新成功',
@@ -171,6 +219,8 @@ def delete_model(model_id):
         model_name = ml_model.model_name
         db.session.delete(ml_model)
         db.session.commit()
+        get_model_cache().invalidate(model_id)
+        get_prediction_cache().invalidate_model(model_id)
         
         return jsonify({
             'message': f'模型 {model_name} 删除成功'
@@ -0,0 +1,241 @@
+"""
+特征工程产物（编码器 / 统计特征 / scaler / 中位数）的进程级缓存
+
+推理时 preprocess_df(is_train=False) 和 train_dp 需要的 4 个 pkl 文件只在每个
+worker 里加载一次，之后所有路由共享同一份对象；文件被替换（mtime 变化且内容哈希
+变化）时自动重新加载。
+"""
+import hashlib
+import os
+import threading
+import time
+from datetime import datetime
+
+import joblib
+
+ARTIFACT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 产物名 -> 文件名
+ARTIFACT_FILES = {
+    'encoders_and_stats': 'encoders_and_stats.pkl',
+    'cat_dims': 'cat_dims.pkl',
+    'scaler': '1_scaler.pkl',
+    'num_median': 'num_median.pkl',
+}
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class FeatureArtifacts:
+    """
+    按需加载并缓存特征产物。
+
+    每个文件单独跟踪 (mtime, size, sha256)：访问时最多每 check_interval 秒 stat 一次，
+    mtime/size 变了再算哈希，哈希也变了才重新 joblib.load。
+    """
+
+    def __init__(self, directory=ARTIFACT_DIR, check_interval=1.0):
+        self.directory = directory
+        self.check_interval = check_interval
+        self._entries = {}
+        self._derived = {}
+        self._lock = threading.RLock()
+
+    def path(self, name):
+        return os.path.join(self.directory, ARTIFACT_FILES[name])
+
+    def get(self, name):
+        """获取指定产物（必要时加载 / 重新加载）"""
+        with self._lock:
+            entry = self._entries.get(name)
+            now = time.monotonic()
+            if entry is not None and now - entry['checked_at'] < self.check_interval:
+                return entry['value']
+
+            path = self.path(name)
+            st = os.stat(path)
+            if entry is not None:
+                entry['checked_at'] = now
+                if (st.st_mtime_ns, st.st_size) == (entry['mtime_ns'], entry['size']):
+                    return entry['value']
+                sha256 = _file_sha256(path)
+                if sha256 == entry['sha256']:
+                    # 只是 touch 了一下，内容没变
+                    entry['mtime_ns'], entry['size'] = st.st_mtime_ns, st.st_size
+                    return entry['value']
+            else:
+                sha256 = _file_sha256(path)
+
+            from app.utils.timing import span
+
+            start = time.perf_counter()
+            with span('artifact_load'):
+                value = joblib.load(path)
+            load_seconds = time.perf_counter() - start
+
+            self._entries[name] = {
+                'value': value,
+                'mtime_ns': st.st_mtime_ns,
+                'size': st.st_size,
+                'sha256': sha256,
+                'load_seconds': load_seconds,
+                'loaded_at': datetime.now(),
+                'checked_at': now,
+                'load_count': (entry['load_count'] + 1) if entry else 1,
+            }
+            return value
+
+    def derived(self, name, key, builder):
+        """
+        由产物 name 派生出的对象（如词表、查找表），随产物一起失效
+
+        builder 接收产物对象，只在产物内容（sha256）变化后重新调用。
+        """
+        value = self.get(name)
+        with self._lock:
+            sha256 = self._entries[name]['sha256']
+            cached = self._derived.get((name, key))
+            if cached is not None and cached[0] == sha256:
+                return cached[1]
+            result = builder(value)
+            self._derived[(name, key)] = (sha256, result)
+            return result
+
+    def invalidate(self, name=None):
+        """丢弃缓存，下次访问重新加载"""
+        with self._lock:
+            if name is None:
+                self._entries.clear()
+                self._derived.clear()
+            else:
+                self._entries.pop(name, None)
+                for derived_key in [k for k in self._derived if k[0] == name]:
+                    del self._derived[derived_key]
+
+    # ---------- 便捷属性 ----------
+    @property
+    def label_encoders(self):
+        return self.get('encoders_and_stats')['label_encoders']
+
+    @property
+    def stat_dict(self):
+        return self.get('encoders_and_stats')['stat_dict']
+
+    @property
+    def feature_cols(self):
+        return self.get('encoders_and_stats')['feature_cols']
+
+    @property
+    def vocabs(self):
+        """{类别列: CategoryVocab}，由 label_encoders 构建一次"""
+        from app.train.vocab import build_vocabs
+        return self.derived('encoders_and_stats', 'vocabs',
+                            lambda saved: build_vocabs(saved['label_encoders']))
+
+    @property
+    def cat_dims(self):
+        return self.get('cat_dims')
+
+    @property
+    def scaler(self):
+        return self.get('scaler')
+
+    @property
+    def num_median(self):
+        return self.get('num_median')
+
+    @property
+    def version(self):
+        """所有已加载产物内容哈希的组合，产物任一变化则版本变化"""
+        for name in ARTIFACT_FILES:
+            self.get(name)
+        with self._lock:
+            digest = hashlib.sha256()
+            for name in sorted(ARTIFACT_FILES):
+                digest.update(self._entries[name]['sha256'].encode())
+            return digest.hexdigest()[:16]
+
+    def stats(self):
+        """已加载产物的状态（不触发加载），用于健康检查"""
+        with self._lock:
+            return {
+                name: {
+                    'file': ARTIFACT_FILES[name],
+                    'sha256': entry['sha256'][:16],
+                    'load_seconds': round(entry['load_seconds'], 6),
+                    'loaded_at': entry['loaded_at'].strftime('%Y-%m-%d %H:%M:%S'),
+                    'load_count': entry['load_count'],
+                }
+                for name, entry in self._entries.items()
+            }
+
+
+_artifacts = None
+_artifacts_lock = threading.Lock()
+
+
+def get_feature_artifacts():
+    """当前进程共享的 FeatureArtifacts 实例"""
+    global _artifacts
+    if _artifacts is None:
+        with _artifacts_lock:
+            if _artifacts is None:
+                _artifacts = FeatureArtifacts()
+    return _artifacts
+
+
+def build_feature_artifacts(raw_df, directory=ARTIFACT_DIR):
+    """
+    用一份原始训练数据拟合并写出 4 个特征产物文件
+
+    Args:
+        raw_df: 原始 DataFrame（与上传的 CSV 同结构）
+        directory: 输出目录，默认 app/train
+
+    Returns:
+        dict: 产物名 -> 文件路径
+    """
+    from sklearn.preprocessing import StandardScaler
+    from app.train.data_load import preprocess_df
+    from app.train.train_dp import NUM_COLS, CAT_COLS, TARGET
+
+    processed, stat_dict, label_encoders = preprocess_df(raw_df, is_train=True, return_state=True)
+    processed = processed.dropna(subset=[TARGET])
+    feature_cols = [c for c in processed.columns if c != TARGET]
+
+    num_median = processed[NUM_COLS].median()
+    scaler = StandardScaler().fit(processed[NUM_COLS].fillna(num_median))
+    cat_dims = [len(label_encoders[c[:-len('_id')]].classes_) for c in CAT_COLS]
+
+    os.makedirs(directory, exist_ok=True)
+    paths = {name: os.path.join(directory, filename) for name, filename in ARTIFACT_FILES.items()}
+    joblib.dump({
+        'label_encoders': label_encoders,
+        'stat_dict': stat_dict,
+        'feature_cols': feature_cols,
+    }, paths['encoders_and_stats'])
+    joblib.dump(cat_dims, paths['cat_dims'])
+    joblib.dump(scaler, paths['scaler'])
+    joblib.dump(num_median, paths['num_median'])
+    return paths
+
+
+if __name__ == '__main__':
+    import argparse
+    import glob
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description='从原始 CSV 生成特征产物文件')
+    parser.add_argument('--data', required=True, help='CSV 文件 glob，例如 ../clients_random/*.csv')
+    parser.add_argument('--out', default=ARTIFACT_DIR, help='输出目录')
+    args = parser.parse_args()
+
+    df = pd.concat([pd.read_csv(p) for p in sorted(glob.glob(args.data))], ignore_index=True)
+    for name, path in build_feature_artifacts(df, args.out).items():
+        print(f"{name}: {path}")
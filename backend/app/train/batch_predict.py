@@ -0,0 +1,243 @@
+"""
+批量房价评估
+
+一批房屋只做一次特征编码（encode_houses）；同结构的 HousePriceModel 堆叠成
+一个融合模型（ensemble.StackedHousePriceEnsemble）一次前向，其余模型各做一次批量前向，
+多组结果的加权融合用 NumPy 在 (模型数, 房屋数) 矩阵上一次完成，
+取代对每套房屋逐条调用 eval_house_by_dict + federated_predict_house。
+"""
+import os
+
+import numpy as np
+
+# 单次请求允许的最大房屋数
+BATCH_PREDICT_MAX_HOUSES = int(os.getenv('BATCH_PREDICT_MAX_HOUSES', '10000'))
+
+
+def nan_to_none(values):
+    """float 数组 -> 列表，NaN 转为 None（可直接 JSON 序列化）"""
+    values = np.asarray(values, dtype=np.float64)
+    return [None if np.isnan(v) else float(v) for v in values.tolist()]
+
+
+class BatchPredictor:
+    """
+    一组客户端模型的批量预测器
+
+    构造时加载模型（需要在应用上下文中）并把同结构的 HousePriceModel 堆叠成融合模型，
+    之后可以对任意多批 encode_houses 的结果调用 predict，不再访问数据库。
+
+    models: 各客户端模型的状态列表（client_id / client_name / status / model_name / ...）
+    """
+
+    def __init__(self, clients, model_cache=None, include_models=False):
+        from app.train.ensemble import architecture_key, get_stacked_ensemble, is_stackable
+        from app.utils.model_cache import get_model_cache
+
+        model_cache = model_cache or get_model_cache()
+        self.include_models = include_models
+
+        # 1. 加载各客户端模型（进程内缓存）
+        self.models, loaded = [], []
+        for client in clients:
+            result = {
+                'client_id': client.id,
+                'client_name': client.name,
+                'status': None,
+                'model_name': None,
+                'data_count': None,
+                'model_type': None,
+                'error': None
+            }
+            self.models.append(result)
+
+            if not client.model_id:
+                result['status'] = 'skipped'
+                result['error'] = '该客户端未绑定模型'
+                continue
+
+            try:
+                cached = model_cache.get(client.model_id)
+            except Exception as e:
+                result['status'] = 'error'
+                result['error'] = f'加载模型失败: {str(e)}'
+                continue
+            if cached is None:
+                result['status'] = 'error'
+                result['error'] = '关联的模型不存在'
+                continue
+            model, model_info = cached
+            result.update({
+                'model_name': model_info['model_name'],
+                'data_count': model_info['data_count'],
+                'model_type': model_info['model_type'],
+            })
+            loaded.append((result, model, model_info))
+
+        # 2. 同结构的 HousePriceModel 堆叠成一个融合模型，其余模型逐个批量前向
+        groups, self._singles, self._stacks = {}, [], []
+        for item in loaded:
+            _, model, model_info = item
+            if is_stackable(model) and (model_info['data_count'] or 0) > 0:
+                groups.setdefault(architecture_key(model), []).append(item)
+            else:
+                self._singles.append(item)
+
+        for members in groups.values():
+            if len(members) < 2:
+                self._singles.extend(members)
+                continue
+            weights = [info['data_count'] for _, _, info in members]
+            key = tuple((info['id'], info['upload_time'], info['model_size'], info['data_count'])
+                        for _, _, info in members)
+            try:
+                ensemble = get_stacked_ensemble(key, [model for _, model, _ in members], weights)
+            except Exception as e:
+                for result, _, _ in members:
+                    result['status'] = 'error'
+                    result['error'] = f'预测失败: {str(e)}'
+                continue
+            self._stacks.append(([result for result, _, _ in members], ensemble, weights))
+
+    @property
+    def stacked(self):
+        return sum(len(results) for results, _, _ in self._stacks)
+
+    def predict(self, encoded):
+        """
+        EncodedHouses -> (融合单价, 融合总价, {client_id: 单价})
+
+        各数组长度为 len(encoded)，无有效预测的位置为 NaN；
+        单模型单价只在 include_models 时返回。出错的模型标记为 error，后续批次不再使用。
+        """
+        from app.train.eval import federated_fuse
+        from app.train.train_dp import predict_encoded
+
+        fuse_rows, fuse_weights, per_model = [], [], {}
+        for stack in list(self._stacks):
+            results, ensemble, weights = stack
+            try:
+                if self.include_models:
+                    rows = ensemble.predict(encoded.x_num, encoded.x_cat, per_model=True).astype(np.float64)
+                    fuse_rows.extend(rows)
+                    fuse_weights.extend(weights)
+                    for result, row in zip(results, rows):
+                        per_model[result['client_id']] = row
+                else:
+                    # 加权已在融合模型内完成，整组按权重之和参与后续融合
+                    fuse_rows.append(ensemble.predict(encoded.x_num, encoded.x_cat).astype(np.float64))
+                    fuse_weights.append(sum(weights))
+            except Exception as e:
+                self._stacks.remove(stack)
+                for result in results:
+                    result['status'] = 'error'
+                    result['error'] = f'预测失败: {str(e)}'
+                continue
+            for result in results:
+                result['status'] = 'success'
+
+        for item in list(self._singles):
+            result, model, model_info = item
+            try:
+                row = predict_encoded(encoded, model)
+            except Exception as e:
+                self._singles.remove(item)
+                result['status'] = 'error'
+                result['error'] = f'预测失败: {str(e)}'
+                continue
+            result['status'] = 'success'
+            fuse_rows.append(row)
+            fuse_weights.append(model_info['data_count'] or 0)
+            if self.include_models:
+                per_model[result['client_id']] = row
+
+        if fuse_rows:
+            fused_unit, fused_total = federated_fuse(np.vstack(fuse_rows), fuse_weights, encoded.area)
+        else:
+            fused_unit = fused_total = np.full(len(encoded), np.nan)
+        return fused_unit, fused_total, per_model
+
+    def summary(self):
+        return {
+            'total': len(self.models),
+            'success': sum(1 for m in self.models if m['status'] == 'success'),
+            'error': sum(1 for m in self.models if m['status'] == 'error'),
+            'skipped': sum(1 for m in self.models if m['status'] == 'skipped'),
+            'stacked': self.stacked,
+            'total_data_count': int(sum(m['data_count'] or 0 for m in self.models if m['status'] == 'success')),
+        }
+
+
+def predict_clients_batch(clients, houses, model_cache=None, include_models=False):
+    """
+    用多个客户端的模型评估一批房屋（需要在应用上下文中调用）
+
+    Args:
+        clients: Client 列表
+        houses: 房屋 dict 列表
+        include_models: 是否在每套房屋的结果里附带各模型的单价
+
+    Returns:
+        dict: summary / models / predictions
+    """
+    from app.train.house_encoder import encode_houses
+
+    encoded = encode_houses(houses)
+    predictor = BatchPredictor(clients, model_cache, include_models)
+    fused_unit, fused_total, per_model = predictor.predict(encoded)
+
+    n = len(encoded)
+    unit_list, total_list = nan_to_none(fused_unit), nan_to_none(fused_total)
+    predictions = [
+        {'index': i, 'unit_price': unit_list[i], 'total_price': total_list[i]}
+        for i in range(n)
+    ]
+    if include_models:
+        succeeded = [m['client_id'] for m in predictor.models if m['client_id'] in per_model]
+        columns = {cid: nan_to_none(per_model[cid]) for cid in succeeded}
+        for i, prediction in enumerate(predictions):
+            prediction['models'] = {str(cid): columns[cid][i] for cid in succeeded}
+
+    return {
+        'summary': {
+            'houses': n,
+            'predicted': int(np.count_nonzero(~np.isnan(fused_unit))),
+            **predictor.summary(),
+        },
+        'models': predictor.models,
+        'predictions': predictions,
+    }
+
+
+# 流式打分时每块的行数：块越小首批结果返回越快，块越大前向次数越少
+SCORING_CHUNKSIZE = int(os.getenv('SCORING_CHUNKSIZE', '5000'))
+# 打分 CSV 必须包含的列（位置决定统计特征和类别编码，建筑面积用于计算总价）；其余字段缺失时按中位数 / 未知处理
+SCORING_REQUIRED_COLS = ['城市', '区域', '街道', '小区', '建筑面积']
+
+
+def iter_scored_chunks(predictor, chunks, keep_cols=None):
+    """
+    原始房屋 DataFrame 的迭代器 -> 打分结果 DataFrame 的迭代器（内存占用与块大小相关，与总行数无关）
+
+    每块按 preprocess_df(is_train=False) 的口径编码（encode_houses），一次批量预测后输出：
+        row（从 0 开始的全局行号）、keep_cols 中要原样带出的输入列、unit_price、total_price，
+        include_models 时每个模型一列 model_<client_id>
+    """
+    import pandas as pd
+    from app.train.house_encoder import encode_houses
+
+    keep_cols = keep_cols or []
+    offset = 0
+    for chunk in chunks:
+        encoded = encode_houses(chunk)
+        fused_unit, fused_total, per_model = predictor.predict(encoded)
+
+        out = pd.DataFrame({'row': np.arange(offset, offset + len(chunk))})
+        for col in keep_cols:
+            out[col] = chunk[col].to_numpy() if col in chunk.columns else None
+        out['unit_price'] = fused_unit
+        out['total_price'] = fused_total
+        for client_id, row in per_model.items():
+            out[f'model_{client_id}'] = row
+        offset += len(chunk)
+        yield out
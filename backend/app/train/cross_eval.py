@@ -0,0 +1,170 @@
+"""
+跨客户端评估矩阵：每个客户端模型在每个客户端数据上的 RMSE
+
+朴素做法是 模型数 × 数据集数 次「读 CSV → 预处理 → 前向」，预处理重复了模型数遍。这里：
+    - 每个数据文件只预处理一次：复用 fedavg.prepare_client_arrays 写入 MatrixCache 的
+      全局特征矩阵（与 FedAvg 共用同一份缓存），worker 进程以只读 memmap 打开，
+      多个进程共享操作系统页缓存里的同一份数据，不经过 pickle 传输
+    - 同结构的 HousePriceModel 堆叠成一个融合模型（ensemble.StackedHousePriceEnsemble），
+      每个数据集每块只需一次 forward_all 得到所有模型的预测
+    - 任务按数据集划分给 spawn 进程池（与 FedAvg 相同），模型参数只在 worker 初始化时传一次
+每个 worker 只返回各模型的误差平方和与样本数，主进程汇总成矩阵。
+"""
+import multiprocessing
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+
+# 评估的 worker 进程数，0 表示 min(数据集数, 可用核数)（任务进程内为分给本任务的线程数）
+CROSS_EVAL_WORKERS = int(os.getenv('CROSS_EVAL_WORKERS', '0'))
+# 每次从 memmap 读入的行数，内存占用与它成正比
+CROSS_EVAL_BLOCK_ROWS = int(os.getenv('CROSS_EVAL_BLOCK_ROWS', '65536'))
+
+# worker 进程内的 [(模型下标列表, 融合模型或单个模型)]
+_scorers = None
+
+
+def build_scorers(models):
+    """
+    模型列表 -> [(模型下标列表, scorer)]
+
+    同结构的 HousePriceModel（至少两个）堆叠成一个融合模型，其余模型单独前向。
+    """
+    from app.train.ensemble import StackedHousePriceEnsemble, architecture_key, is_stackable
+
+    groups, scorers = {}, []
+    for index, model in enumerate(models):
+        if is_stackable(model):
+            groups.setdefault(architecture_key(model), []).append(index)
+        else:
+            scorers.append(([index], model))
+    for indices in groups.values():
+        if len(indices) < 2:
+            scorers.append((indices, models[indices[0]]))
+            continue
+        # forward_all 不使用融合权重，这里给等权
+        ensemble = StackedHousePriceEnsemble([models[i] for i in indices], [1.0] * len(indices))
+        scorers.append((indices, ensemble))
+    return scorers
+
+
+def _predict(scorer, x_num, x_cat, batch_size=4096):
+    """scorer 在一块数据上的预测 -> (模型数, 行数)"""
+    import torch
+    from app.train.ensemble import StackedHousePriceEnsemble
+
+    if isinstance(scorer, StackedHousePriceEnsemble):
+        return scorer.predict(x_num, x_cat, per_model=True)
+    scorer.eval()
+    outputs = []
+    with torch.no_grad():
+        for start in range(0, len(x_num), batch_size):
+            xn = torch.as_tensor(x_num[start:start + batch_size], dtype=torch.float32)
+            xc = torch.as_tensor(x_cat[start:start + batch_size], dtype=torch.long)
+            outputs.append(scorer(xn, xc).reshape(-1))
+    return torch.cat(outputs).numpy().reshape(1, -1)
+
+
+def _init_worker(num_threads, payload):
+    """worker 初始化：先限制线程数再反序列化模型（反序列化会 import torch）"""
+    from app.jobs.runner import pin_threads
+
+    global _scorers
+    pin_threads(num_threads)
+    _scorers = pickle.loads(payload)
+
+
+def score_dataset(key, num_models):
+    """
+    所有模型在一个数据集上的误差
+
+    Returns:
+        (sse, n)：sse 为 (模型数,) 的误差平方和，n 为 (模型数,) 的有效样本数
+        （预测为 NaN/inf 的行不计入；预测抛出异常的模型 n 为 0，RMSE 为 NaN）
+    """
+    from app.train.matrix_cache import get_matrix_cache
+
+    cached = get_matrix_cache().get(key)
+    if cached is None:
+        raise RuntimeError(f'预处理缓存不存在: {key}')
+    arrays, _ = cached
+    X_num, X_cat, y = arrays['X_num'], arrays['X_cat'], arrays['y']
+
+    sse = np.zeros(num_models)
+    n = np.zeros(num_models, dtype=np.int64)
+    failed = set()  # 预测出错的 scorer 下标
+    for start in range(0, len(y), CROSS_EVAL_BLOCK_ROWS):
+        stop = start + CROSS_EVAL_BLOCK_ROWS
+        # 把一块从 memmap 复制到内存（torch 不接受只读数组）
+        x_num, x_cat = np.array(X_num[start:stop]), np.array(X_cat[start:stop])
+        y_block = np.asarray(y[start:stop], dtype=np.float64)
+        for position, (indices, scorer) in enumerate(_scorers):
+            if position in failed:
+                continue
+            try:
+                err = _predict(scorer, x_num, x_cat).astype(np.float64) - y_block
+            except Exception as e:
+                # 一个模型出错只让它所在的行在这个数据集上记为无效，不影响其他模型
+                print(f"跨客户端评估：模型 {indices} 在数据集 {key} 上预测失败: {e}")
+                failed.add(position)
+                continue
+            valid = np.isfinite(err)
+            sse[indices] += (np.where(valid, err, 0.0) ** 2).sum(axis=1)
+            n[indices] += valid.sum(axis=1)
+    for position in failed:
+        n[_scorers[position][0]] = 0
+    return sse, n
+
+
+def compute_rmse_matrix(models, dataset_keys, max_workers=None, on_dataset_done=None):
+    """
+    Args:
+        models: 模型列表（行）
+        dataset_keys: MatrixCache 键列表（列），由 prepare_client_arrays 生成
+        max_workers: worker 进程数；为 1 时在当前进程内计算，省去启动进程的开销
+        on_dataset_done: 可选回调 (完成数, 总数)
+
+    Returns:
+        (rmse, n)：(模型数, 数据集数) 的 RMSE 矩阵（无有效样本处为 NaN）与有效样本数矩阵
+    """
+    global _scorers
+    from app.jobs.runner import cpu_budget, threads_per_worker
+
+    num_models, num_datasets = len(models), len(dataset_keys)
+    sse = np.full((num_models, num_datasets), np.nan)
+    n = np.zeros((num_models, num_datasets), dtype=np.int64)
+    if not num_models or not num_datasets:
+        return sse, n
+
+    max_workers = max_workers or CROSS_EVAL_WORKERS or min(num_datasets, cpu_budget())
+    scorers = build_scorers(models)
+
+    def collect(j, result):
+        sse[:, j], n[:, j] = result
+        if on_dataset_done is not None:
+            on_dataset_done(j + 1, num_datasets)
+
+    if max_workers == 1:
+        previous, _scorers = _scorers, scorers
+        try:
+            for j, key in enumerate(dataset_keys):
+                collect(j, score_dataset(key, num_models))
+        finally:
+            _scorers = previous
+    else:
+        with ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=partial(_init_worker, threads_per_worker(max_workers), pickle.dumps(scorers)),
+        ) as pool:
+            futures = [pool.submit(score_dataset, key, num_models) for key in dataset_keys]
+            for j, future in enumerate(futures):
+                collect(j, future.result())
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rmse = np.sqrt(sse / n)
+    rmse[n == 0] = np.nan
+    return rmse, n
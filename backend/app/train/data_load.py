@@ -1,38 +1,138 @@
 import glob
 import os
+import re
 import joblib
 import numpy as np
 import pandas as pd
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import LabelEncoder
 
-def preprocess_df(raw_df, is_train=True):
+# 特征流水线版本：preprocess_df / load_data 的输出口径变化时递增，使旧的矩阵缓存失效
+FEATURE_PIPELINE_VERSION = 1
+
+# 参与编码的类别列（输出为 <列名>_id）
+CATEGORY_COLS = [
+    "城市",
+    "区域",
+    "街道",
+    "小区",
+    "房屋户型",
+    "楼层类别",
+    "建筑类型",
+    "房屋朝向",
+    "装修情况",
+    "建筑结构",
+    "供暖方式",
+    "梯户比例",
+    "配备电梯",
+    "交易权属",
+    "房屋用途",
+    "房屋年限",
+]
+
+# 输出的数值特征列（类别 _id 列追加在后面）
+BASE_FEATURE_COLS = [
+    # "成交价格",
+    "建筑面积",
+    "成交周期（天）",
+    "调价（次）",
+    "带看（次）",
+    "关注（人）",
+    "浏览（次）",
+    "建成年代",
+    "总楼层",
+    "在市天数",
+    "lng",
+    "lat",
+    "community_cnt",
+    "community_mean_price",
+    "region_cnt",
+    "region_mean_price",
+    "street_cnt",
+    "street_mean_price",
+    "成交_年份",
+    "成交_月份",
+]
+
+_TOTAL_FLOOR_RE = re.compile(r"共(\d+)层")
+_AREA_UNIT_RE = re.compile(r"㎡|平米| ")
+
+
+def _safe_float(x):
+    try:
+        return float(x)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _to_float_series(strs):
     """
-    raw_df: 原始 DataFrame
-    is_train: True 表示训练集，会计算统计特征并 fit LabelEncoder；
-              False 表示测试集，会复用传入的 stat_dict 和 label_encoders。
-    stat_dict: 训练阶段计算好的统计特征字典：
-        {
-          "community": community_stat_df,
-          "region":    region_stat_df,
-          "street":    street_stat_df,
-        }
-    label_encoders: dict，保存每个类别列对应的 LabelEncoder（测试时复用）
+    字符串列 -> float 列，语义与逐行 float(x) 一致（失败为 NaN）。
+    先用 pd.to_numeric 批量解析，只对它解析不了的少量值回退到 float()，
+    保证 "1_000" 这类 float() 能接受的写法结果不变。
+    """
+    values = pd.to_numeric(strs, errors="coerce").astype(float)
+    fallback = values.isna() & strs.notna()
+    if fallback.any():
+        values[fallback] = strs[fallback].map(_safe_float)
+    return values
 
-    return:
-        df_processed: 处理完且只保留关键列的 DataFrame
-        stat_dict:    上述统计特征字典
-        label_encoders: 类别特征编码器字典
+
+def _map_uniques(s, transform, na_value=np.nan):
     """
-    if not is_train:
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        enc_stats_path = os.path.join(current_dir, 'encoders_and_stats.pkl')
+    按取值去重后再做字符串变换：先 factorize 成 (codes, uniques)，
+    只对 uniques 做一次 transform，再按 codes 取回整列。
+    建筑面积 / 所在楼层 / 百度经纬 的基数远小于行数，这比逐行处理快一个量级。
+    缺失值（code == -1）统一取 na_value。
+    """
+    codes, uniques = pd.factorize(s, use_na_sentinel=True)
+    values = transform(pd.Series(uniques, dtype=object)).to_numpy()
+    values = np.append(values, np.array([na_value], dtype=values.dtype))
+    return pd.Series(values[codes], index=s.index)
+
+
+def _clean_area_uniques(u):
+    strs = u.astype(str).str.replace(_AREA_UNIT_RE, "", regex=True)
+    return _to_float_series(strs.mask(strs.isin(["暂无数据", ""])))
+
+
+def _floor_level_uniques(u):
+    return u.astype(str).str.split(" ", n=1).str[0]
+
+
+def _total_floor_uniques(u):
+    return u.astype(str).str.extract(_TOTAL_FLOOR_RE, expand=False).astype(float)
+
 
-        saved = joblib.load(enc_stats_path)
-        label_encoders = saved["label_encoders"]
-        stat_dict = saved["stat_dict"]
-        feature_cols = saved["feature_cols"]
+def clean_area_series(s):
+    """建筑面积：去掉 "㎡"/"平米"/空格，"暂无数据" 和空串视为缺失"""
+    return _map_uniques(s, _clean_area_uniques)
 
+
+def parse_floor_level_series(s):
+    """所在楼层 "高楼层 (共7层)" -> "高楼层"，缺失记为 "未知" """
+    return _map_uniques(s, _floor_level_uniques, na_value="未知")
+
+
+def parse_total_floor_series(s):
+    """所在楼层 "高楼层 (共7层)" -> 7.0，解析不到为 NaN"""
+    return _map_uniques(s, _total_floor_uniques)
+
+
+def split_lnglat_series(s):
+    """百度经纬 "118.73926,32.07868" -> (lng, lat)"""
+    codes, uniques = pd.factorize(s, use_na_sentinel=True)
+    parts = pd.Series(uniques, dtype=object).astype(str).str.split(",")
+    lng = np.append(_to_float_series(parts.str[0]).to_numpy(), np.nan)
+    lat = np.append(_to_float_series(parts.str[1]).to_numpy(), np.nan)
+    return pd.Series(lng[codes], index=s.index), pd.Series(lat[codes], index=s.index)
+
+
+def extract_base_features(raw_df, is_train=True):
+    """
+    preprocess_df 的第 0~5 步：数值清洗、楼层/时间/经纬度解析、位置组合键。
+    逐行独立、不依赖统计量，分块处理时每块单独调用即可。
+    """
     df = raw_df.copy()
     # ---------- 0. 删除套内面积 ----------
     if "套内面积" in df.columns:
@@ -43,18 +143,7 @@ def preprocess_df(raw_df, is_train=True):
         df["成交价格"] = pd.to_numeric(df["成交价格"], errors="coerce")  # 通常是万
         df["price_per_m2"] = pd.to_numeric(df["元/平"], errors="coerce")  # 标签
 
-    def clean_area(x):
-        if pd.isna(x):
-            return np.nan
-        x = str(x).replace("㎡", "").replace("平米", "").replace(" ", "")
-        if x in ["暂无数据", ""]:
-            return np.nan
-        try:
-            return float(x)
-        except:
-            return np.nan
-
-    df["建筑面积"] = df["建筑面积"].apply(clean_area)
+    df["建筑面积"] = clean_area_series(df["建筑面积"])
 
     for col in ["成交周期（天）", "调价（次）", "带看（次）", "关注（人）", "浏览（次）"]:
         if col in df.columns:
@@ -64,23 +153,8 @@ def preprocess_df(raw_df, is_train=True):
         df["建成年代"] = pd.to_numeric(df["建成年代"], errors="coerce")
 
     # ---------- 2. 楼层解析 ----------
-    def parse_floor_level(s):
-        if pd.isna(s):
-            return "未知"
-        return str(s).split(" ")[0]  # "高楼层"
-
-    def parse_total_floor(s):
-        if pd.isna(s):
-            return np.nan
-        s = str(s)
-        import re
-        m = re.search(r"共(\d+)层", s)
-        if m:
-            return int(m.group(1))
-        return np.nan
-
-    df["楼层类别"] = df["所在楼层"].apply(parse_floor_level)
-    df["总楼层"] = df["所在楼层"].apply(parse_total_floor)
+    df["楼层类别"] = parse_floor_level_series(df["所在楼层"])
+    df["总楼层"] = parse_total_floor_series(df["所在楼层"])
 
     # ---------- 3. 时间 ----------
     df["成交时间_clean"] = df["成交时间"].astype(str).str.replace(" 成交", "", regex=False)
@@ -92,24 +166,7 @@ def preprocess_df(raw_df, is_train=True):
     df["在市天数"] = (df["成交时间_clean"] - df["挂牌时间"]).dt.days
 
     # ---------- 4. 经纬度 ----------
-    def split_lng(x):
-        if pd.isna(x):
-            return np.nan
-        try:
-            return float(str(x).split(",")[0])
-        except:
-            return np.nan
-
-    def split_lat(x):
-        if pd.isna(x):
-            return np.nan
-        try:
-            return float(str(x).split(",")[1])
-        except:
-            return np.nan
-
-    df["lng"] = df["百度经纬"].apply(split_lng)
-    df["lat"] = df["百度经纬"].apply(split_lat)
+    df["lng"], df["lat"] = split_lnglat_series(df["百度经纬"])
 
     # ---------- 5. 位置组合键，避免跨城重名 ----------
     # 确保这几列存在
@@ -120,6 +177,37 @@ def preprocess_df(raw_df, is_train=True):
     df["city_region"] = df["城市"] + "||" + df["区域"]
     df["city_region_street"] = df["城市"] + "||" + df["区域"] + "||" + df["街道"]
 
+    return df
+
+
+def preprocess_df(raw_df, is_train=True, return_state=False):
+    """
+    raw_df: 原始 DataFrame
+    is_train: True 表示训练集，会计算统计特征并 fit LabelEncoder；
+              False 表示测试集，会复用传入的 stat_dict 和 label_encoders。
+    stat_dict: 训练阶段计算好的统计特征字典：
+        {
+          "community": community_stat_df,
+          "region":    region_stat_df,
+          "street":    street_stat_df,
+        }
+    label_encoders: dict，保存每个类别列对应的 LabelEncoder（测试时复用）
+    测试时 stat_dict / label_encoders 取自进程共享的 FeatureArtifacts，不再每次读盘。
+    return_state: True 时额外返回 stat_dict 和 label_encoders
+
+    return:
+        df_processed: 处理完且只保留关键列的 DataFrame
+        stat_dict:    上述统计特征字典（仅 return_state=True）
+        label_encoders: 类别特征编码器字典（仅 return_state=True）
+    """
+    if not is_train:
+        from app.train.artifacts import get_feature_artifacts
+        artifacts = get_feature_artifacts()
+        label_encoders = artifacts.label_encoders
+        stat_dict = artifacts.stat_dict
+
+    df = extract_base_features(raw_df, is_train)
+
     # ---------- 6. 统计特征（按 城市+小区 / 城市+区域 / 城市+区域+街道） ----------
     if is_train:
         comm_stat = (
@@ -171,24 +259,7 @@ def preprocess_df(raw_df, is_train=True):
             df[ccol] = df[ccol].fillna(0)
 
     # ---------- 7. 类别特征编码 ----------
-    cat_cols = [
-        "城市",
-        "区域",
-        "街道",
-        "小区",
-        "房屋户型",
-        "楼层类别",
-        "建筑类型",
-        "房屋朝向",
-        "装修情况",
-        "建筑结构",
-        "供暖方式",
-        "梯户比例",
-        "配备电梯",
-        "交易权属",
-        "房屋用途",
-        "房屋年限",
-    ]
+    cat_cols = CATEGORY_COLS
 
     if is_train:
         label_encoders = {}
@@ -200,13 +271,13 @@ def preprocess_df(raw_df, is_train=True):
             df[col + "_id"] = le.fit_transform(df[col])
             label_encoders[col] = le
     else:
+        # 未见过的类别落到词表的 OOV 桶（classes_[0] 的编号）
+        vocabs = artifacts.vocabs
         for col in cat_cols:
             if col not in df.columns:
                 continue
-            le = label_encoders[col]
             df[col] = df[col].astype(str).fillna("缺失")
-            df[col] = df[col].map(lambda x: x if x in le.classes_ else le.classes_[0])
-            df[col + "_id"] = le.transform(df[col])
+            df[col + "_id"] = vocabs[col].encode(df[col])
 
     # ---------- 8. 数值缺失填充 ----------
     num_cols = [
@@ -235,28 +306,7 @@ def preprocess_df(raw_df, is_train=True):
             df[col] = df[col].fillna(df[col].median())
 
     # ---------- 9. 只保留关键特征 + 标签 ----------
-    feature_cols = [
-        # "成交价格",
-        "建筑面积",
-        "成交周期（天）",
-        "调价（次）",
-        "带看（次）",
-        "关注（人）",
-        "浏览（次）",
-        "建成年代",
-        "总楼层",
-        "在市天数",
-        "lng",
-        "lat",
-        "community_cnt",
-        "community_mean_price",
-        "region_cnt",
-        "region_mean_price",
-        "street_cnt",
-        "street_mean_price",
-        "成交_年份",
-        "成交_月份",
-    ]
+    feature_cols = list(BASE_FEATURE_COLS)
     cat_id_cols = [c for c in df.columns if c.endswith("_id")]
     feature_cols = feature_cols + cat_id_cols
     keep_cols = feature_cols
@@ -265,6 +315,8 @@ def preprocess_df(raw_df, is_train=True):
     # keep_cols = feature_cols
     df_processed = df[keep_cols].copy()
 
+    if return_state:
+        return df_processed, stat_dict, label_encoders
     return df_processed
 
 if __name__ == "__main__":
@@ -0,0 +1,160 @@
+"""
+堆叠多个客户端 HousePriceModel 的融合前向
+
+各客户端模型结构相同、只有参数不同。这里把 N 个模型的参数堆叠成批量张量：
+    - 16 张 Embedding 表按偏移拼成一张 (N, ΣV, E)，一次 gather 取出所有类别向量
+    - 每个 Linear 堆叠为 (N, in, out)，用一次 baddbmm 同时算 N 个模型
+    - 推理模式下 BatchNorm 是逐通道仿射变换，折叠进后面的 Linear（Dropout 为恒等）
+    - federated_predict_house 的 data_count 加权折叠进最后一层，输出直接是融合单价
+N 个模型的联邦预测因此接近一次大的前向，而不是 N 次小前向加 Python 循环。
+"""
+import os
+import threading
+from collections import OrderedDict
+
+import torch
+import torch.nn as nn
+
+from app.train.train_dp import HousePriceModel
+
+# 单次前向的 模型数 × 行数 上限。(N, B, 256) 的中间结果超出 CPU 缓存后反而比逐模型前向慢，
+# 大批量按此分段
+ENSEMBLE_MAX_ROWS = int(os.getenv('ENSEMBLE_MAX_ROWS', '2048'))
+ENSEMBLE_CACHE_MAX_ENTRIES = int(os.getenv('ENSEMBLE_CACHE_MAX_ENTRIES', '8'))
+
+
+def is_stackable(model):
+    return isinstance(model, HousePriceModel)
+
+
+def architecture_key(model):
+    """参数形状签名，相同签名的模型才能堆叠"""
+    return tuple((name, tuple(t.shape)) for name, t in model.state_dict().items())
+
+
+def _fold_batchnorm(bn, linear):
+    """
+    Linear(BN(h)) -> h @ W' + b'
+
+    BN(h) = h * s + t，s = gamma / sqrt(var + eps)，t = beta - mean * s
+    """
+    s = bn.weight / torch.sqrt(bn.running_var + bn.eps)
+    t = bn.bias - bn.running_mean * s
+    w = linear.weight.t()  # (in, out)
+    return s.unsqueeze(1) * w, t @ w + linear.bias
+
+
+def _layers(model):
+    """mlp -> (Linear1, BN1, Linear2, BN2, Linear3)"""
+    layers = [m for m in model.mlp if isinstance(m, (nn.Linear, nn.BatchNorm1d))]
+    if [type(m) for m in layers] != [nn.Linear, nn.BatchNorm1d, nn.Linear, nn.BatchNorm1d, nn.Linear]:
+        raise ValueError('不支持的 HousePriceModel 结构')
+    return layers
+
+
+class StackedHousePriceEnsemble(nn.Module):
+    """
+    N 个同结构 HousePriceModel 的融合模型（仅用于推理）
+
+    forward(x_num, x_cat) -> (B,) 按 weights 加权平均后的单价
+    forward_all(x_num, x_cat) -> (N, B) 各模型单价
+    """
+
+    def __init__(self, models, weights):
+        super().__init__()
+        if not models:
+            raise ValueError('至少需要一个模型')
+        if len({architecture_key(m) for m in models}) != 1:
+            raise ValueError('模型结构不一致，无法堆叠')
+        weights = torch.as_tensor(weights, dtype=torch.float32)
+        if weights.shape != (len(models),) or weights.sum() <= 0:
+            raise ValueError('weights 必须与模型一一对应且总和大于 0')
+
+        with torch.no_grad():
+            dims = [emb.num_embeddings for emb in models[0].embeddings]
+            offsets = torch.tensor([0] + dims[:-1]).cumsum(0)
+            self.register_buffer('offsets', offsets)
+            self.register_buffer('table', torch.stack([
+                torch.cat([emb.weight for emb in m.embeddings]) for m in models
+            ]))
+
+            w1, b1, w2, b2, w3, b3 = [], [], [], [], [], []
+            for m in models:
+                linear1, bn1, linear2, bn2, linear3 = _layers(m)
+                w1.append(linear1.weight.t())
+                b1.append(linear1.bias)
+                w, b = _fold_batchnorm(bn1, linear2)
+                w2.append(w)
+                b2.append(b)
+                w, b = _fold_batchnorm(bn2, linear3)
+                w3.append(w.squeeze(1))
+                b3.append(b.squeeze(0))
+
+            # 第一层拆成数值部分和 embedding 部分：数值输入各模型共享，
+            # 合成一次 (B, num) @ (num, N*H1)，省去把 x_num 复制 N 份再拼接
+            w1 = torch.stack(w1)                                      # (N, D, H1)
+            num_dim = w1.shape[1] - self.table.shape[2] * len(dims)
+            self.register_buffer('w1_num', w1[:, :num_dim].permute(1, 0, 2).reshape(num_dim, -1).contiguous())
+            self.register_buffer('w1_emb', w1[:, num_dim:].contiguous())     # (N, C*E, H1)
+            self.register_buffer('b1', torch.stack(b1).unsqueeze(1))  # (N, 1, H1)
+            self.register_buffer('w2', torch.stack(w2))               # (N, H1, H2)
+            self.register_buffer('b2', torch.stack(b2).unsqueeze(1))  # (N, 1, H2)
+            self.register_buffer('w3', torch.stack(w3))               # (N, H2)
+            self.register_buffer('b3', torch.stack(b3))               # (N,)
+
+            # 加权平均折叠进最后一层：Σ_n p_n (h_n · w3_n + b3_n)
+            p = weights / weights.sum()
+            self.register_buffer('w3_fused', self.w3 * p.unsqueeze(1))
+            self.register_buffer('b3_fused', (self.b3 * p).sum())
+
+        self.num_models = len(models)
+        self.eval()
+
+    def _hidden(self, x_num, x_cat):
+        n, batch = self.num_models, x_num.shape[0]
+        emb = self.table.index_select(1, (x_cat + self.offsets).reshape(-1)).reshape(n, batch, -1)
+        num = (x_num @ self.w1_num).reshape(batch, n, -1).transpose(0, 1)   # (N, B, H1)
+        h = torch.relu(torch.baddbmm(self.b1 + num, emb, self.w1_emb))
+        return torch.relu(torch.baddbmm(self.b2, h, self.w2))         # (N, B, H2)
+
+    def forward(self, x_num, x_cat):
+        return torch.einsum('nbk,nk->b', self._hidden(x_num, x_cat), self.w3_fused) + self.b3_fused
+
+    def forward_all(self, x_num, x_cat):
+        return torch.einsum('nbk,nk->nb', self._hidden(x_num, x_cat), self.w3) + self.b3.unsqueeze(1)
+
+    def predict(self, x_num, x_cat, per_model=False):
+        """numpy 输入，按 ENSEMBLE_MAX_ROWS 分段前向，返回 numpy"""
+        rows = max(1, ENSEMBLE_MAX_ROWS // self.num_models)
+        forward = self.forward_all if per_model else self.forward
+        outputs = []
+        with torch.no_grad():
+            for start in range(0, len(x_num), rows):
+                xn = torch.as_tensor(x_num[start:start + rows], dtype=torch.float32)
+                xc = torch.as_tensor(x_cat[start:start + rows], dtype=torch.long)
+                outputs.append(forward(xn, xc))
+        return torch.cat(outputs, dim=-1).numpy()
+
+
+_ensembles = OrderedDict()
+_ensembles_lock = threading.Lock()
+
+
+def get_stacked_ensemble(key, models, weights):
+    """
+    按 key（模型ID、版本、权重）复用已堆叠的融合模型，进程内 LRU
+
+    堆叠要复制所有参数，同一组模型反复预测时不必每次重建。
+    """
+    with _ensembles_lock:
+        ensemble = _ensembles.get(key)
+        if ensemble is not None:
+            _ensembles.move_to_end(key)
+            return ensemble
+
+    ensemble = StackedHousePriceEnsemble(models, weights)
+    with _ensembles_lock:
+        _ensembles[key] = ensemble
+        while len(_ensembles) > ENSEMBLE_CACHE_MAX_ENTRIES:
+            _ensembles.popitem(last=False)
+    return ensemble
@@ -1,4 +1,5 @@
 from app.train.data_load import preprocess_df
+import numpy as np
 import pandas as pd
 import joblib
 def predict_house_price_by_df(house_features: pd.DataFrame, model):
@@ -38,10 +39,9 @@ def predict_house_price_by_df(house_features: pd.DataFrame, model):
     return unit_price, total_price
 
 def eval_house_by_dict(house_info,model):
-    df = pd.DataFrame([house_info])
-
-
-    df_processed = preprocess_df(df, is_train=False)
+    # 单条预测直接由 dict 构造特征行，与 preprocess_df(is_train=False) 的输出一致
+    from app.train.house_encoder import house_feature_frame
+    df_processed = house_feature_frame(house_info)
     unit_price, total_price = predict_house_price_by_df(df_processed, model)
     return unit_price, total_price
 def federated_predict_house(results):
@@ -109,6 +109,33 @@ def federated_predict_house(results):
             "participating_clients": valid_clients
     }
 
+def federated_fuse(unit_prices, weights, area=None):
+    """
+    federated_predict_house 的批量版本：按数据量加权平均多个模型对一批房屋的预测
+
+    参数:
+        unit_prices: (模型数, 房屋数) 单价矩阵，预测失败的位置为 NaN
+        weights: (模型数,) 各模型的 data_count
+        area: (房屋数,) 建筑面积，可选；用于计算总价
+
+    返回:
+        (unit_price, total_price)：两个 (房屋数,) 数组。
+        某套房屋上没有任何有效预测时为 NaN；与单条接口一致，
+        总价为各模型 单价*面积 的加权平均，等于加权单价 * 面积。
+    """
+    unit_prices = np.asarray(unit_prices, dtype=np.float64)
+    weights = np.asarray(weights, dtype=np.float64).reshape(-1, 1)
+    valid = ~np.isnan(unit_prices) & (weights > 0)
+    w = np.where(valid, weights, 0.0)
+    total_weight = w.sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        unit = (np.where(valid, unit_prices, 0.0) * w).sum(axis=0) / total_weight
+    unit[total_weight == 0] = np.nan
+    if area is None:
+        return unit, np.full_like(unit, np.nan)
+    return unit, unit * np.asarray(area, dtype=np.float64)
+
+
 if __name__ == '__main__':
     dic={"小区": "民佳园小区","成交时间": "2021.01.01 成交","元/平": 87986,"挂牌价格（万）": 446,"成交周期（天）": 67,"调价（次）": 0,"带看（次）": 6,"关注（人）": 13,"浏览（次）": 2133,"房屋户型": "1 室 1 厅 1 厨 1 卫","所在楼层": "高楼层 (共 7 层)","建筑面积": "50.44㎡","户型结构": "平层","套内面积": "暂无数据","建筑类型": "板楼","房屋朝向": "南 北","建成年代": 2000,"装修情况": "精装","建筑结构": "混合结构","供暖方式": "暂无数据","梯户比例": "一梯两户","配备电梯": "无","交易权属": "商品房","挂牌时间": "2020/10/27","房屋用途": "普通住宅","房屋年限": "暂无数据","房权所属": "非共有","百度经纬": "118.73926,32.07868","区域": "鼓楼","街道": "定淮门大街","城市": "南京"}
     print("len(dic)=",len(dic))
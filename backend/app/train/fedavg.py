@@ -0,0 +1,279 @@
+"""
+FedAvg 联邦训练
+
+每一轮把全局模型参数下发给所有参与的客户端，各客户端在自己的数据上并行训练
+若干个本地 epoch（独立的 worker 进程），再按样本数加权平均各自的 state_dict
+得到新的全局模型。最终只产出一个 HousePriceModel，预测时一次前向即可，
+不再需要加载 N 个客户端模型再做 federated_predict_house 融合。
+
+与单客户端训练不同，FedAvg 要求所有客户端的特征在同一个空间里：类别编号、
+统计特征、中位数填充和标准化都使用全局特征产物（即推理时的口径），
+而不是每个客户端各自 fit 的 LabelEncoder / scaler。
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from app.train.train_dp import CAT_COLS, NUM_COLS, HousePriceModel
+
+# 本地训练的 worker 进程数，0 表示 min(客户端数, 可用核数)（任务进程内为分给本任务的线程数）
+FEDAVG_WORKERS = int(os.getenv('FEDAVG_WORKERS', '0'))
+
+
+# ---------- 客户端训练数据 ----------
+def build_global_training_arrays(raw_df):
+    """
+    原始 DataFrame -> 全局特征空间下的 (X_num, X_cat, y)
+
+    特征走 preprocess_df(is_train=False)，数值按全局 num_median 填充、全局 scaler
+    标准化，与 train_dp.predict 完全一致；丢弃没有标签的行。
+    """
+    from app.train.artifacts import get_feature_artifacts
+    from app.train.data_load import preprocess_df
+    from app.train.house_encoder import scale_numeric
+
+    artifacts = get_feature_artifacts()
+    y = pd.to_numeric(raw_df['元/平'], errors='coerce').to_numpy(dtype=np.float64)
+    processed = preprocess_df(raw_df, is_train=False)
+    has_target = ~np.isnan(y)
+
+    X_num = processed[NUM_COLS].fillna(artifacts.num_median).to_numpy(dtype=np.float64)
+    X_num = scale_numeric(X_num, artifacts.scaler)
+    X_cat = processed[CAT_COLS].fillna(0).astype(int).to_numpy()
+    return (
+        X_num[has_target].astype(np.float32),
+        X_cat[has_target].astype(np.int32),
+        y[has_target].astype(np.float32),
+    )
+
+
+def prepare_client_arrays(datafile):
+    """
+    把数据文件的全局特征矩阵写入 MatrixCache（已存在则直接复用）
+
+    Returns:
+        (cache_key, 样本数)
+    """
+    from app.train.artifacts import get_feature_artifacts
+    from app.train.matrix_cache import get_matrix_cache, matrix_cache_key
+
+    cache = get_matrix_cache()
+    # 特征依赖全局产物，产物更新后缓存键随之变化
+    key = matrix_cache_key(datafile.content_hash(), variant=f'global-{get_feature_artifacts().version}')
+    cached = cache.get(key)
+    if cached is None:
+        X_num, X_cat, y = build_global_training_arrays(datafile.to_dataframe())
+        cached = cache.put(key, {'X_num': X_num, 'X_cat': X_cat, 'y': y}, {'datafile_id': datafile.id})
+    arrays, _ = cached
+    return key, int(len(arrays['y']))
+
+
+# ---------- 参数传输与聚合 ----------
+def state_to_numpy(model):
+    """state_dict -> {名称: ndarray}，跨进程传输时不依赖 torch 的共享内存机制"""
+    return {name: tensor.detach().cpu().numpy().copy() for name, tensor in model.state_dict().items()}
+
+
+def load_numpy_state(model, state):
+    import torch
+    model.load_state_dict({name: torch.from_numpy(np.asarray(value)) for name, value in state.items()})
+    return model
+
+
+def fedavg_aggregate(states, weights):
+    """
+    按权重（样本数）加权平均多个 state
+
+    浮点参数 / BatchNorm 均值方差做加权平均；
+    整型缓冲（num_batches_tracked）取最大值。
+    """
+    weights = np.asarray(weights, dtype=np.float64)
+    weights = weights / weights.sum()
+    merged = {}
+    for name in states[0]:
+        values = [state[name] for state in states]
+        if np.issubdtype(values[0].dtype, np.floating):
+            stacked = np.stack(values).astype(np.float64)
+            merged[name] = np.tensordot(weights, stacked, axes=1).astype(values[0].dtype)
+        else:
+            merged[name] = np.max(np.stack(values), axis=0)
+    return merged
+
+
+# ---------- worker 进程 ----------
+# 每个 worker 进程内按缓存键复用已切分好的本地数据
+_client_data = {}
+
+
+def _client_split(key):
+    """与 train_dl 相同的 9:1 切分，验证集在各轮之间保持不变"""
+    if key not in _client_data:
+        from sklearn.model_selection import train_test_split
+        from app.train.matrix_cache import get_matrix_cache
+
+        cached = get_matrix_cache().get(key)
+        if cached is None:
+            raise RuntimeError(f'客户端训练数据缓存不存在: {key}')
+        arrays, _ = cached
+        Xn_tr, Xn_va, Xc_tr, Xc_va, y_tr, y_va = train_test_split(
+            np.asarray(arrays['X_num']), np.asarray(arrays['X_cat']), np.asarray(arrays['y']),
+            test_size=0.1, random_state=42
+        )
+        _client_data[key] = {'train': (Xn_tr, Xc_tr, y_tr), 'val': (Xn_va, Xc_va, y_va)}
+    return _client_data[key]
+
+
+def new_model(cat_dims, state=None):
+    model = HousePriceModel(num_dim=len(NUM_COLS), cat_dims=cat_dims)
+    if state is not None:
+        load_numpy_state(model, state)
+    return model
+
+
+def _squared_error(model, X_num, X_cat, y, batch_size=4096):
+    import torch
+
+    model.eval()
+    sse = 0.0
+    with torch.no_grad():
+        for start in range(0, len(y), batch_size):
+            xn = torch.as_tensor(X_num[start:start + batch_size], dtype=torch.float32)
+            xc = torch.as_tensor(X_cat[start:start + batch_size], dtype=torch.long)
+            diff = model(xn, xc).numpy().astype(np.float64) - y[start:start + batch_size]
+            sse += float((diff ** 2).sum())
+    return sse
+
+
+def local_update(key, global_state, cat_dims, local_epochs=1, lr=1e-3, batch_size=1024, seed=0):
+    """
+    在一个客户端上从全局参数出发训练 local_epochs 轮
+
+    Returns:
+        dict: state（本地训练后的参数）、n_train、n_val、sse_before（全局模型在本地验证集上的平方误差和）
+    """
+    import torch
+    import torch.nn as nn
+    from torch.utils.data import DataLoader, TensorDataset
+
+    torch.manual_seed(seed)
+    data = _client_split(key)
+    Xn_tr, Xc_tr, y_tr = data['train']
+    Xn_va, Xc_va, y_va = data['val']
+
+    model = new_model(cat_dims, global_state)
+    sse_before = _squared_error(model, Xn_va, Xc_va, y_va)
+
+    loader = DataLoader(TensorDataset(
+        torch.tensor(Xn_tr, dtype=torch.float32),
+        torch.tensor(Xc_tr, dtype=torch.long),
+        torch.tensor(y_tr, dtype=torch.float32)
+    ), batch_size=batch_size, shuffle=True, drop_last=len(y_tr) > batch_size)
+
+    optimizer = torch.optim.AdamW(model.parameters(), lr=lr)
+    criterion = nn.MSELoss()
+    for _ in range(local_epochs):
+        model.train()
+        for xn, xc, yb in loader:
+            if len(yb) < 2:
+                # BatchNorm 训练时至少需要 2 个样本
+                continue
+            loss = criterion(model(xn, xc), yb)
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+
+    return {
+        'state': state_to_numpy(model),
+        'n_train': int(len(y_tr)),
+        'n_val': int(len(y_va)),
+        'sse_before': sse_before,
+    }
+
+
+def evaluate_global(key, global_state, cat_dims):
+    """全局模型在客户端本地验证集上的 (样本数, 平方误差和)"""
+    data = _client_split(key)
+    Xn_va, Xc_va, y_va = data['val']
+    return int(len(y_va)), _squared_error(new_model(cat_dims, global_state), Xn_va, Xc_va, y_va)
+
+
+# ---------- 编排 ----------
+def run_fedavg(client_keys, rounds=5, local_epochs=1, lr=1e-3, batch_size=1024,
+               max_workers=None, on_round_end=None):
+    """
+    FedAvg 主循环
+
+    Args:
+        client_keys: [(client_id, 缓存键)]
+        rounds: 通信轮数
+        local_epochs: 每轮各客户端的本地训练轮数
+        max_workers: 并行训练的 worker 进程数
+        on_round_end: 可选回调 (round_index, rounds, round_info)
+
+    Returns:
+        (global_model, history)
+    """
+    import torch
+    from app.jobs.runner import cpu_budget, pin_threads, threads_per_worker
+    from app.train.artifacts import get_feature_artifacts
+
+    if not client_keys:
+        raise ValueError('没有参与训练的客户端')
+    cat_dims = list(get_feature_artifacts().cat_dims)
+    max_workers = max_workers or FEDAVG_WORKERS or min(len(client_keys), cpu_budget())
+
+    torch.manual_seed(42)
+    global_state = state_to_numpy(new_model(cat_dims))
+    history = []
+
+    with ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=partial(pin_threads, threads_per_worker(max_workers)),
+    ) as pool:
+        for round_index in range(rounds):
+            futures = [
+                pool.submit(local_update, key, global_state, cat_dims,
+                            local_epochs, lr, batch_size, seed=round_index * 100003 + i)
+                for i, (_, key) in enumerate(client_keys)
+            ]
+            updates = [future.result() for future in futures]
+
+            # 聚合：按本地训练样本数加权
+            global_state = fedavg_aggregate(
+                [u['state'] for u in updates], [u['n_train'] for u in updates]
+            )
+
+            # 本轮下发的全局模型在各客户端验证集上的 RMSE（即上一轮聚合结果）
+            n_val = sum(u['n_val'] for u in updates)
+            round_info = {
+                'round': round_index + 1,
+                'val_rmse_before': float(np.sqrt(sum(u['sse_before'] for u in updates) / n_val)) if n_val else None,
+                'clients': {
+                    str(client_id): {
+                        'n_train': u['n_train'],
+                        'val_rmse_before': float(np.sqrt(u['sse_before'] / u['n_val'])) if u['n_val'] else None,
+                    }
+                    for (client_id, _), u in zip(client_keys, updates)
+                },
+            }
+            history.append(round_info)
+            print(f"FedAvg 第 {round_index + 1}/{rounds} 轮, 全局模型验证 RMSE: {round_info['val_rmse_before']}")
+            if on_round_end is not None:
+                on_round_end(round_index, rounds, round_info)
+
+        # 最终全局模型的验证误差
+        evals = [pool.submit(evaluate_global, key, global_state, cat_dims) for _, key in client_keys]
+        evals = [future.result() for future in evals]
+
+    n_val = sum(n for n, _ in evals)
+    final_rmse = float(np.sqrt(sum(sse for _, sse in evals) / n_val)) if n_val else None
+    history.append({'round': 'final', 'val_rmse': final_rmse})
+
+    model = new_model(cat_dims, global_state)
+    model.eval()
+    return model, history
@@ -0,0 +1,176 @@
+"""
+已保存模型在数据文件上的留出评估（RMSE / MAE / R²）
+
+按块读取 CSV、每块批量编码和预测，块内只计算可合并的部分和：
+    n、误差平方和、绝对误差和，以及目标值的 (count, mean, M2)（Chan 并行公式）
+按块顺序合并后得到与整表一次计算相同的指标（至浮点舍入），内存只与块大小有关。
+大文件把各块分给线程池并行计算（torch 前向和 pandas 解析的 C 部分会释放 GIL）；
+结果按 (模型版本, 数据文件内容哈希, 特征产物版本) 缓存。
+"""
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from app.train.streaming import Moments
+
+TARGET_COL = '元/平'
+
+EVAL_CHUNKSIZE = int(os.getenv('EVAL_CHUNKSIZE', '20000'))
+# 文件达到该大小时使用线程池并行评估
+EVAL_PARALLEL_THRESHOLD_BYTES = int(os.getenv('EVAL_PARALLEL_THRESHOLD_BYTES', str(32 * 1024 ** 2)))
+# 并行评估的线程数，0 表示 CPU 核数
+EVAL_WORKERS = int(os.getenv('EVAL_WORKERS', '0'))
+EVAL_CACHE_MAX_ENTRIES = int(os.getenv('EVAL_CACHE_MAX_ENTRIES', '256'))
+
+
+class RegressionMetrics:
+    """回归指标的可合并部分和"""
+
+    def __init__(self):
+        self.rows = 0        # 块内总行数
+        self.sse = 0.0       # Σ(pred - y)²
+        self.sae = 0.0       # Σ|pred - y|
+        self.target = Moments()
+
+    @classmethod
+    def from_arrays(cls, y_true, y_pred):
+        """只统计目标值和预测值都有效的行"""
+        metrics = cls()
+        y_true = np.asarray(y_true, dtype=np.float64)
+        y_pred = np.asarray(y_pred, dtype=np.float64)
+        metrics.rows = len(y_true)
+        valid = ~np.isnan(y_true) & ~np.isnan(y_pred)
+        err = y_pred[valid] - y_true[valid]
+        metrics.sse = float(np.dot(err, err))
+        metrics.sae = float(np.abs(err).sum())
+        metrics.target.add_values(y_true[valid])
+        return metrics
+
+    def merge(self, other):
+        self.rows += other.rows
+        self.sse += other.sse
+        self.sae += other.sae
+        self.target.merge(other.target.n, other.target.mean, other.target.m2)
+        return self
+
+    def to_dict(self):
+        n = self.target.n
+        return {
+            'rows': self.rows,
+            'evaluated_rows': n,
+            'rmse': float(np.sqrt(self.sse / n)) if n else None,
+            'mae': self.sae / n if n else None,
+            # 与 sklearn.metrics.r2_score 相同：1 - SSE / Σ(y - ȳ)²
+            'r2': 1.0 - self.sse / self.target.m2 if n and self.target.m2 > 0 else None,
+            'target_mean': self.target.mean if n else None,
+        }
+
+
+def score_chunk(model, chunk):
+    """一块原始数据 -> RegressionMetrics（按 preprocess_df(is_train=False) 口径编码后批量预测）"""
+    from app.train.house_encoder import encode_houses
+    from app.train.train_dp import predict_encoded
+
+    y_true = pd.to_numeric(chunk[TARGET_COL], errors='coerce') if TARGET_COL in chunk.columns \
+        else pd.Series(np.nan, index=chunk.index)
+    y_pred = predict_encoded(encode_houses(chunk), model)
+    return RegressionMetrics.from_arrays(y_true.to_numpy(dtype=np.float64), y_pred)
+
+
+def evaluate_chunks(model, chunks, workers=1):
+    """
+    逐块评估并按块顺序合并
+
+    workers > 1 时用线程池并行，同时在途的块不超过 2 * workers，内存保持有界。
+
+    Returns:
+        (RegressionMetrics, 块数)
+    """
+    total = RegressionMetrics()
+    count = 0
+    if workers <= 1:
+        for chunk in chunks:
+            total.merge(score_chunk(model, chunk))
+            count += 1
+        return total, count
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='holdout') as pool:
+        in_flight = deque()
+        for chunk in chunks:
+            in_flight.append(pool.submit(score_chunk, model, chunk))
+            count += 1
+            if len(in_flight) >= 2 * workers:
+                total.merge(in_flight.popleft().result())
+        while in_flight:
+            total.merge(in_flight.popleft().result())
+    return total, count
+
+
+# ---------- 缓存 ----------
+_results = OrderedDict()
+_content_hashes = {}
+_cache_lock = threading.Lock()
+
+
+def datafile_content_hash(datafile):
+    """
+    数据文件内容哈希；数据文件上传后内容不变，按 (id, 上传时间, 大小) 在进程内记住，
+    缓存命中时不必读取文件内容
+    """
+    key = (datafile.id, datafile.upload_time, datafile.file_size)
+    with _cache_lock:
+        content_hash = _content_hashes.get(key)
+    if content_hash is None:
+        content_hash = datafile.content_hash()
+        with _cache_lock:
+            _content_hashes[key] = content_hash
+    return content_hash
+
+
+def evaluate_model_on_datafile(model, model_info, datafile, refresh=False):
+    """
+    模型在数据文件上的 RMSE / MAE / R²（需要在应用上下文中调用）
+
+    Args:
+        model, model_info: ModelCache.get 的返回值
+        refresh: 为 True 时忽略缓存重新计算
+
+    Returns:
+        dict: 指标、行数、耗时、是否命中缓存
+    """
+    from app.train.artifacts import get_feature_artifacts
+
+    key = (
+        model_info['id'], model_info['upload_time'], model_info['model_size'],
+        datafile_content_hash(datafile), get_feature_artifacts().version,
+    )
+    if not refresh:
+        with _cache_lock:
+            cached = _results.get(key)
+            if cached is not None:
+                _results.move_to_end(key)
+                return {**cached, 'cached': True}
+
+    workers = 1
+    if datafile.file_size >= EVAL_PARALLEL_THRESHOLD_BYTES:
+        workers = EVAL_WORKERS or os.cpu_count() or 1
+
+    start = time.perf_counter()
+    metrics, chunks = evaluate_chunks(model, datafile.iter_chunks(EVAL_CHUNKSIZE), workers)
+    result = {
+        **metrics.to_dict(),
+        'chunks': chunks,
+        'workers': workers,
+        'seconds': round(time.perf_counter() - start, 3),
+    }
+
+    with _cache_lock:
+        _results[key] = result
+        while len(_results) > EVAL_CACHE_MAX_ENTRIES:
+            _results.popitem(last=False)
+    return {**result, 'cached': False}
@@ -0,0 +1,297 @@
+"""
+单套房屋的快速特征编码
+
+把一个 house_info dict 直接转换成模型输入（数值特征 / 类别 id 的 NumPy 数组），
+不构造 DataFrame、不做 merge。结果与 preprocess_df(is_train=False) + train_dp.predict
+的 DataFrame 路径一致，用于 /api/clients/evaluate 和 /api/agent/predict 的单条预测。
+
+encode_houses 是批量版本：一组房屋整体做列式处理，逐行结果与 encode_house 相同。
+"""
+import math
+import re
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from app.train.artifacts import get_feature_artifacts
+from app.train.data_load import BASE_FEATURE_COLS, CATEGORY_COLS, extract_base_features
+
+_TOTAL_FLOOR_RE = re.compile(r"共(\d+)层")
+
+# 统计特征: 层级 -> (组合键列, 数量列, 均价列)
+STAT_LEVELS = {
+    "community": ("city_community", "community_cnt", "community_mean_price"),
+    "region": ("city_region", "region_cnt", "region_mean_price"),
+    "street": ("city_region_street", "street_cnt", "street_mean_price"),
+}
+
+_RAW_NUMERIC_COLS = ["成交周期（天）", "调价（次）", "带看（次）", "关注（人）", "浏览（次）", "建成年代"]
+
+
+def _isna(x):
+    return x is None or (isinstance(x, float) and math.isnan(x)) or x is pd.NaT
+
+
+def _to_number(x):
+    """单值版 pd.to_numeric(errors="coerce") -> float"""
+    if _isna(x):
+        return np.nan
+    if isinstance(x, (int, float, np.number)):
+        return float(x)
+    try:
+        return float(pd.to_numeric(x, errors="coerce"))
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _to_float(x):
+    try:
+        return float(x)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def clean_area(x):
+    """建筑面积 "50.44㎡" -> 50.44"""
+    if _isna(x):
+        return np.nan
+    x = str(x).replace("㎡", "").replace("平米", "").replace(" ", "")
+    if x in ["暂无数据", ""]:
+        return np.nan
+    return _to_float(x)
+
+
+# 常见日期写法先走 datetime.strptime，解析不了再交给 pd.to_datetime（单值调用开销大）
+_LIST_TIME_FORMATS = ("%Y-%m-%d", "%Y/%m/%d")
+
+
+def _parse_date(x, fmt=None):
+    if isinstance(x, str):
+        for candidate in ((fmt,) if fmt else _LIST_TIME_FORMATS):
+            try:
+                return pd.Timestamp(datetime.strptime(x, candidate))
+            except ValueError:
+                pass
+        if fmt:
+            return None
+    ts = pd.to_datetime(x, errors="coerce", format=fmt)
+    return None if ts is None or ts is pd.NaT else ts
+
+
+def build_stat_index(stat_dict):
+    """stat_dict 里的三张统计表 -> {层级: (组合键 Index, 数量数组, 均价数组)}，供整列 get_indexer 查找"""
+    index = {}
+    for level, (key_col, cnt_col, mean_col) in STAT_LEVELS.items():
+        stat = stat_dict[level]
+        index[level] = (
+            pd.Index(stat[key_col]),
+            stat[cnt_col].to_numpy(dtype=np.float64),
+            stat[mean_col].to_numpy(dtype=np.float64),
+        )
+    return index
+
+
+def build_stat_lookup(stat_dict):
+    """stat_dict 里的三张统计表 -> {层级: {组合键: (数量, 均价)}}"""
+    lookup = {}
+    for level, (key_col, cnt_col, mean_col) in STAT_LEVELS.items():
+        stat = stat_dict[level]
+        lookup[level] = dict(zip(
+            stat[key_col].tolist(),
+            zip(stat[cnt_col].astype(float).tolist(), stat[mean_col].astype(float).tolist()),
+        ))
+    return lookup
+
+
+def house_features(house_info, artifacts=None):
+    """
+    house_info -> {特征名: 值}，与 preprocess_df(is_train=False) 输出的一行相同
+    （数值未填充、未标准化；类别为 _id 编号）。
+
+    DataFrame 路径缺列会直接 KeyError，这里缺失的字段按缺失值处理。
+    """
+    artifacts = artifacts or get_feature_artifacts()
+    vocabs = artifacts.vocabs
+    stat_lookup = artifacts.derived(
+        'encoders_and_stats', 'stat_lookup', lambda saved: build_stat_lookup(saved['stat_dict'])
+    )
+    get = house_info.get
+    feats = {}
+
+    # ---------- 1. 基本数值列 ----------
+    feats["建筑面积"] = clean_area(get("建筑面积"))
+    for col in _RAW_NUMERIC_COLS:
+        feats[col] = _to_number(get(col))
+
+    # ---------- 2. 楼层 ----------
+    floor = get("所在楼层")
+    if _isna(floor):
+        floor_level, total_floor = "未知", np.nan
+    else:
+        floor_level = str(floor).split(" ")[0]
+        m = _TOTAL_FLOOR_RE.search(str(floor))
+        total_floor = float(m.group(1)) if m else np.nan
+    feats["总楼层"] = total_floor
+
+    # ---------- 3. 时间 ----------
+    deal_time = _parse_date(str(get("成交时间")).replace(" 成交", ""), fmt="%Y.%m.%d")
+    list_time = _parse_date(get("挂牌时间"))
+    if deal_time is not None and list_time is not None:
+        feats["在市天数"] = float((deal_time - list_time).days)
+    else:
+        feats["在市天数"] = np.nan
+
+    # ---------- 4. 经纬度 ----------
+    lnglat = get("百度经纬")
+    if _isna(lnglat):
+        feats["lng"] = feats["lat"] = np.nan
+    else:
+        parts = str(lnglat).split(",")
+        feats["lng"] = _to_float(parts[0])
+        feats["lat"] = _to_float(parts[1]) if len(parts) > 1 else np.nan
+
+    # ---------- 5/6. 位置组合键 + 统计特征 ----------
+    city, region, street, community = (str(get(c)) for c in ["城市", "区域", "街道", "小区"])
+    keys = {
+        "community": city + "||" + community,
+        "region": city + "||" + region,
+        "street": city + "||" + region + "||" + street,
+    }
+    for level, (_, cnt_col, mean_col) in STAT_LEVELS.items():
+        feats[cnt_col], feats[mean_col] = stat_lookup[level].get(keys[level], (np.nan, np.nan))
+
+    feats["成交_年份"] = float(deal_time.year) if deal_time is not None else np.nan
+    feats["成交_月份"] = float(deal_time.month) if deal_time is not None else np.nan
+
+    # ---------- 7. 类别编码 ----------
+    for col in CATEGORY_COLS:
+        value = floor_level if col == "楼层类别" else get(col)
+        feats[col + "_id"] = vocabs[col].encode_one(str(value))
+
+    return feats
+
+
+def house_feature_frame(house_info, artifacts=None):
+    """单行特征 DataFrame（列顺序同 preprocess_df 输出），供 LightGBM 等按列名预测的模型使用"""
+    feats = house_features(house_info, artifacts)
+    columns = BASE_FEATURE_COLS + [c + "_id" for c in CATEGORY_COLS]
+    return pd.DataFrame([[feats[c] for c in columns]], columns=columns)
+
+
+def encode_house(house_info, artifacts=None):
+    """
+    house_info -> (x_num, x_cat)，可直接喂给 HousePriceModel
+
+    Returns:
+        x_num: float32 数组 (1, len(NUM_COLS))，已用 num_median 填充并标准化
+        x_cat: int64 数组 (1, len(CAT_COLS))
+    """
+    from app.train.train_dp import NUM_COLS, CAT_COLS
+
+    artifacts = artifacts or get_feature_artifacts()
+    feats = house_features(house_info, artifacts)
+    num_median = artifacts.derived(
+        'num_median', 'array', lambda median: np.asarray([median[c] for c in NUM_COLS], dtype=np.float64)
+    )
+
+    x_num = np.array([feats[c] for c in NUM_COLS], dtype=np.float64)
+    missing = np.isnan(x_num)
+    if missing.any():
+        x_num[missing] = num_median[missing]
+    x_num = scale_numeric(x_num.reshape(1, -1), artifacts.scaler)
+
+    x_cat = np.array([[feats[c] for c in CAT_COLS]], dtype=np.int64)
+    return x_num.astype(np.float32), x_cat
+
+
+def scale_numeric(x_num, scaler):
+    """与 StandardScaler.transform 相同的 (x - mean_) / scale_，省去 DataFrame/校验开销"""
+    x_num = np.array(x_num, dtype=np.float64)
+    if getattr(scaler, 'mean_', None) is not None and scaler.with_mean:
+        x_num -= scaler.mean_
+    if getattr(scaler, 'scale_', None) is not None and scaler.with_std:
+        x_num /= scaler.scale_
+    return x_num
+
+
+# encode_houses 需要的原始列（NUM_COLS 背后的全部原始字段），缺失时补空值，
+# 数值随后按 num_median 填充，与 house_features 对缺失字段的处理一致
+_REQUIRED_RAW_COLS = [
+    "建筑面积", *_RAW_NUMERIC_COLS, "所在楼层", "成交时间", "挂牌时间", "百度经纬", "城市", "区域", "街道", "小区",
+]
+
+
+class EncodedHouses:
+    """
+    一批房屋的模型输入
+
+    x_num: float32 (n, len(NUM_COLS))，已填充并标准化
+    x_cat: int64 (n, len(CAT_COLS))
+    area: float64 (n,)，建筑面积（无法解析为 NaN），用于计算总价
+    frame: 与 house_feature_frame 同列的特征 DataFrame（数值未填充），供按列名预测的模型使用
+    """
+
+    def __init__(self, x_num, x_cat, area, frame):
+        self.x_num = x_num
+        self.x_cat = x_cat
+        self.area = area
+        self.frame = frame
+
+    def __len__(self):
+        return len(self.area)
+
+
+def encode_houses(houses, artifacts=None):
+    """
+    一组房屋（dict 列表或原始 DataFrame）-> EncodedHouses
+
+    与逐条 encode_house 结果相同，但整批只做一次列式解析、一次统计特征查找和
+    一次类别编码。数值缺失按全局 num_median 填充（不使用本批次的中位数，
+    保证同一套房屋单独预测和放在批次里预测结果一致）。
+    """
+    from app.train.train_dp import NUM_COLS, CAT_COLS
+
+    artifacts = artifacts or get_feature_artifacts()
+    # 不用 from_records：全是空 dict 时它得到 0 行
+    raw_df = houses if isinstance(houses, pd.DataFrame) else pd.DataFrame(list(houses))
+    raw_df = raw_df.reset_index(drop=True)
+    for col in _REQUIRED_RAW_COLS:
+        if col not in raw_df.columns:
+            raw_df[col] = None
+
+    # 挂牌时间写法可能混杂（2020-10-27 / 2020/10/27），按取值逐个解析，避免整列推断格式时误判为缺失
+    raw_df = raw_df.copy()
+    codes, uniques = pd.factorize(raw_df["挂牌时间"], use_na_sentinel=True)
+    parsed = pd.to_datetime(pd.Series([_parse_date(x) for x in uniques] + [None], dtype=object))
+    raw_df["挂牌时间"] = parsed.to_numpy()[codes]
+    df = extract_base_features(raw_df, is_train=False)
+
+    stat_index = artifacts.derived(
+        'encoders_and_stats', 'stat_index', lambda saved: build_stat_index(saved['stat_dict'])
+    )
+    for level, (key_col, cnt_col, mean_col) in STAT_LEVELS.items():
+        keys, cnt, mean = stat_index[level]
+        idx = keys.get_indexer(df[key_col])
+        found = idx >= 0
+        df[cnt_col] = np.where(found, cnt[idx], np.nan)
+        df[mean_col] = np.where(found, mean[idx], np.nan)
+
+    vocabs = artifacts.vocabs
+    for col in CATEGORY_COLS:
+        values = df[col] if col in df.columns else pd.Series(None, index=df.index)
+        df[col + "_id"] = vocabs[col].encode(values.astype(str))
+
+    num_median = artifacts.derived(
+        'num_median', 'array', lambda median: np.asarray([median[c] for c in NUM_COLS], dtype=np.float64)
+    )
+    x_num = df[NUM_COLS].to_numpy(dtype=np.float64)
+    missing = np.isnan(x_num)
+    if missing.any():
+        x_num[missing] = np.broadcast_to(num_median, x_num.shape)[missing]
+    x_num = scale_numeric(x_num, artifacts.scaler).astype(np.float32)
+    x_cat = df[CAT_COLS].to_numpy(dtype=np.int64)
+
+    columns = BASE_FEATURE_COLS + [c + "_id" for c in CATEGORY_COLS]
+    frame = df[columns].astype({c: float for c in BASE_FEATURE_COLS})
+    return EncodedHouses(x_num, x_cat, df["建筑面积"].to_numpy(dtype=np.float64), frame)
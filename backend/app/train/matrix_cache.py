@@ -0,0 +1,201 @@
+"""
+预处理后训练矩阵的磁盘缓存
+
+同一个数据文件重复训练时，跳过 CSV 解码、preprocess_df 和标准化，直接读取
+上次生成的 X_num / X_cat / y（.npy，命中时以只读 memmap 打开）。
+
+缓存键 = 数据文件内容 sha256 + 特征流水线版本（data_load.FEATURE_PIPELINE_VERSION），
+总大小超过上限时按最近使用时间（LRU）淘汰整条目。
+"""
+import json
+import os
+import shutil
+import threading
+import uuid
+
+import numpy as np
+
+from app.train.data_load import FEATURE_PIPELINE_VERSION
+
+MATRIX_CACHE_DIR = os.getenv(
+    "MATRIX_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "cache", "matrices"),
+)
+MATRIX_CACHE_MAX_BYTES = int(os.getenv("MATRIX_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+
+_META_FILE = "meta.json"
+
+
+def matrix_cache_key(file_hash, variant="train"):
+    """缓存键：内容哈希 + 流水线版本 + 变体（train / eval 等不同的特征口径）"""
+    return f"{file_hash[:32]}-v{FEATURE_PIPELINE_VERSION}-{variant}"
+
+
+class MatrixCache:
+    """按键存取一组命名 NumPy 数组，多进程安全（先写临时目录再原子 rename）"""
+
+    def __init__(self, directory=MATRIX_CACHE_DIR, max_bytes=MATRIX_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _entry_dir(self, key):
+        return os.path.join(self.directory, key)
+
+    def _load(self, key, mmap_mode="r"):
+        entry = self._entry_dir(key)
+        with open(os.path.join(entry, _META_FILE), encoding="utf-8") as f:
+            meta = json.load(f)
+        arrays = {
+            name: np.load(os.path.join(entry, f"{name}.npy"), mmap_mode=mmap_mode)
+            for name in meta["arrays"]
+        }
+        return arrays, meta
+
+    def get(self, key, mmap_mode="r"):
+        """
+        读取缓存
+
+        Returns:
+            (arrays, meta)；未命中返回 None。arrays 为 {名称: memmap 数组}
+        """
+        meta_path = os.path.join(self._entry_dir(key), _META_FILE)
+        try:
+            arrays, meta = self._load(key, mmap_mode)
+        except (FileNotFoundError, ValueError, KeyError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        # 更新 mtime 作为 LRU 的最近使用时间
+        try:
+            os.utime(meta_path)
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return arrays, meta
+
+    def put(self, key, arrays, meta=None):
+        """写入一条缓存（已存在则覆盖），随后按大小上限淘汰，返回值同 put_streaming"""
+        specs = {name: (np.shape(array), np.asarray(array).dtype) for name, array in arrays.items()}
+
+        def fill(targets):
+            for name, array in arrays.items():
+                targets[name][...] = array
+
+        return self.put_streaming(key, specs, fill, meta)
+
+    def put_streaming(self, key, specs, fill, meta=None):
+        """
+        边计算边写入：按 specs 预先在临时目录里创建 .npy memmap，
+        由 fill(arrays) 分块写满后再原子提交，内存中不需要完整数组。
+
+        Args:
+            specs: {名称: (shape, dtype)}
+            fill: 可调用对象，参数为 {名称: 可写 memmap}
+
+        Returns:
+            (arrays, meta)，arrays 为刚写入条目的只读 memmap。单条超过 max_bytes 时也能拿到
+        """
+        meta = dict(meta or {})
+        meta["arrays"] = list(specs)
+        tmp_dir = os.path.join(self.directory, f".tmp-{key}-{uuid.uuid4().hex}")
+        os.makedirs(tmp_dir)
+        try:
+            targets = {
+                name: np.lib.format.open_memmap(
+                    os.path.join(tmp_dir, f"{name}.npy"), mode="w+", dtype=dtype, shape=tuple(shape)
+                )
+                for name, (shape, dtype) in specs.items()
+            }
+            fill(targets)
+            for array in targets.values():
+                array.flush()
+            del targets
+            with open(os.path.join(tmp_dir, _META_FILE), "w", encoding="utf-8") as f:
+                json.dump(meta, f, ensure_ascii=False)
+
+            entry = self._entry_dir(key)
+            if os.path.isdir(entry):
+                shutil.rmtree(entry, ignore_errors=True)
+            try:
+                os.rename(tmp_dir, entry)
+            except OSError:
+                # 其他进程抢先写入了同一个键，内容相同，丢弃自己的即可
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+        # 先打开再淘汰（已打开的 memmap 在文件删除后仍可读），并且不淘汰刚写入的键
+        committed = self._load(key)
+        self.evict(keep=key)
+        return committed
+
+    def _entries(self):
+        """[(最近使用时间, 大小, 目录)]"""
+        entries = []
+        for name in os.listdir(self.directory):
+            entry = os.path.join(self.directory, name)
+            meta_path = os.path.join(entry, _META_FILE)
+            if name.startswith(".") or not os.path.isfile(meta_path):
+                continue
+            try:
+                size = sum(
+                    os.path.getsize(os.path.join(entry, f)) for f in os.listdir(entry)
+                )
+                entries.append((os.path.getmtime(meta_path), size, entry))
+            except OSError:
+                continue
+        return entries
+
+    def evict(self, keep=None):
+        """总大小超过 max_bytes 时，从最久未使用的条目开始删除（跳过 keep 键）"""
+        keep_entry = self._entry_dir(keep) if keep is not None else None
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in entries:
+            if total <= self.max_bytes:
+                break
+            if entry == keep_entry:
+                continue
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+            with self._lock:
+                self.evictions += 1
+
+    def invalidate(self, key):
+        shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+
+    def stats(self):
+        entries = self._entries()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "entries": len(entries),
+                "bytes": sum(size for _, size, _ in entries),
+                "max_bytes": self.max_bytes,
+            }
+
+
+_matrix_cache = None
+_matrix_cache_lock = threading.Lock()
+
+
+def get_matrix_cache():
+    """当前进程共享的 MatrixCache 实例"""
+    global _matrix_cache
+    if _matrix_cache is None:
+        with _matrix_cache_lock:
+            if _matrix_cache is None:
+                _matrix_cache = MatrixCache()
+    return _matrix_cache
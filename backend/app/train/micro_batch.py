@@ -0,0 +1,184 @@
+"""
+单条预测请求的动态合批（micro-batching）
+
+高并发时每个请求线程各自对同一个模型做 batch=1 的前向，开销主要是逐层调度而不是计算。
+这里让同一模型的并发请求进入共享队列，攒够 max_batch_size 条或最早一条等待满
+max_wait 后合并成一次批量前向，再把结果按行分发回各个调用方。
+
+不使用后台线程：队列为空时到达的请求成为 leader，负责等待、前向和分发；
+其余请求挂起等待结果。leader 完成一批后如果队列里还有请求，把 leader 身份交给
+最早的那一条。没有并发时（队列里只有自己，且不是从上一批接手的 leader）不等待，
+单个请求的延迟与直接前向相同。
+合批器挂在模型对象上（WeakKeyDictionary），自身不引用模型，模型被 ModelCache 淘汰后随之释放。
+
+默认关闭：生产部署是 gunicorn 同步 worker，每个进程同一时刻只处理一个请求，
+不会出现同一模型的并发调用，开启只会多一层加锁。改用多线程 worker
+（gunicorn --worker-class gthread --threads N）时再设置 MICROBATCH_ENABLED=true。
+"""
+import os
+import threading
+import time
+import weakref
+
+import numpy as np
+
+MICROBATCH_ENABLED = os.getenv('MICROBATCH_ENABLED', 'false').lower() == 'true'
+MICROBATCH_MAX_SIZE = int(os.getenv('MICROBATCH_MAX_SIZE', '64'))
+MICROBATCH_MAX_WAIT_MS = float(os.getenv('MICROBATCH_MAX_WAIT_MS', '2'))
+
+
+class _Request:
+    __slots__ = ('x_num', 'x_cat', 'arrived', 'result', 'error', 'done', 'leader')
+
+    def __init__(self, x_num, x_cat):
+        self.x_num = x_num
+        self.x_cat = x_cat
+        self.arrived = time.monotonic()
+        self.result = None
+        self.error = None
+        self.done = False
+        self.leader = False
+
+
+class MicroBatcher:
+    """
+    同一模型的请求合批器
+
+    predict_fn(model, x_num, x_cat) -> 每行一个输出的数组，各行之间互不影响
+    （推理模式下的 HousePriceModel 满足这一点）。
+    """
+
+    def __init__(self, predict_fn, max_batch_size=MICROBATCH_MAX_SIZE, max_wait_ms=MICROBATCH_MAX_WAIT_MS):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._cond = threading.Condition()
+        self._pending = []
+        self._has_leader = False
+        self._last_batch = 0
+
+        self.requests = 0
+        self.batches = 0
+        self.max_seen_batch = 0
+
+    def predict(self, model, x_num, x_cat):
+        """提交一条（或几行）输入，阻塞直到所在批次完成，返回这几行的输出"""
+        request = _Request(x_num, x_cat)
+        with self._cond:
+            self._pending.append(request)
+            self.requests += 1
+            if not self._has_leader:
+                self._has_leader = True
+                request.leader = True
+            elif self._pending_rows() >= self.max_batch_size:
+                self._cond.notify_all()
+            while not request.done and not request.leader:
+                self._cond.wait()
+
+        if not request.done:
+            self._lead(model)
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def _pending_rows(self):
+        return sum(len(r.x_num) for r in self._pending)
+
+    def _take_batch(self):
+        """调用方持有锁：从队首取不超过 max_batch_size 行（至少一个请求）"""
+        batch, rows = [], 0
+        for request in self._pending:
+            if batch and rows + len(request.x_num) > self.max_batch_size:
+                break
+            batch.append(request)
+            rows += len(request.x_num)
+        del self._pending[:len(batch)]
+        return batch
+
+    def _lead(self, model):
+        with self._cond:
+            # 以队首请求的到达时间计算截止时间，保证任何请求最多额外等待 max_wait。
+            # 队列里只有自己、上一批也不是多个请求（队列清空时会重置）说明当前没有并发，直接前向，不白等
+            deadline = self._pending[0].arrived + self.max_wait
+            concurrent = self._last_batch > 1 or len(self._pending) > 1
+            while concurrent and self._pending_rows() < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = self._take_batch()
+
+        try:
+            if len(batch) == 1:
+                outputs = [self.predict_fn(model, batch[0].x_num, batch[0].x_cat)]
+            else:
+                merged = self.predict_fn(
+                    model,
+                    np.concatenate([r.x_num for r in batch]),
+                    np.concatenate([r.x_cat for r in batch]),
+                )
+                outputs = np.split(merged, np.cumsum([len(r.x_num) for r in batch])[:-1])
+            error = None
+        except Exception as e:
+            outputs, error = [None] * len(batch), e
+
+        with self._cond:
+            for request, output in zip(batch, outputs):
+                request.result = output
+                request.error = error
+                request.done = True
+            self.batches += 1
+            self._last_batch = len(batch)
+            self.max_seen_batch = max(self.max_seen_batch, len(batch))
+            if self._pending:
+                self._pending[0].leader = True
+            else:
+                # 队列已清空，下一个到达的请求按无并发处理
+                self._has_leader = False
+                self._last_batch = 0
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'requests': self.requests,
+                'batches': self.batches,
+                'avg_batch': round(self.requests / self.batches, 2) if self.batches else None,
+                'max_batch': self.max_seen_batch,
+            }
+
+
+_batchers = weakref.WeakKeyDictionary()
+_batchers_lock = threading.Lock()
+
+
+def get_micro_batcher(model, predict_fn):
+    """模型对应的合批器（不存在时创建）"""
+    with _batchers_lock:
+        batcher = _batchers.get(model)
+        if batcher is None:
+            batcher = MicroBatcher(predict_fn)
+            _batchers[model] = batcher
+        return batcher
+
+
+def micro_batch_stats():
+    """所有存活模型的合批统计汇总"""
+    with _batchers_lock:
+        batchers = list(_batchers.values())
+    requests = batches = max_batch = 0
+    for batcher in batchers:
+        stats = batcher.stats()
+        requests += stats['requests']
+        batches += stats['batches']
+        max_batch = max(max_batch, stats['max_batch'])
+    return {
+        'enabled': MICROBATCH_ENABLED,
+        'max_batch_size': MICROBATCH_MAX_SIZE,
+        'max_wait_ms': MICROBATCH_MAX_WAIT_MS,
+        'models': len(batchers),
+        'requests': requests,
+        'batches': batches,
+        'avg_batch': round(requests / batches, 2) if batches else None,
+        'max_batch': max_batch,
+    }
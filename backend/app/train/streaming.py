@@ -0,0 +1,303 @@
+"""
+大文件分块（out-of-core）预处理
+
+DataFile.to_dataframe + preprocess_df 需要把整个 CSV 及其多份中间副本放在内存里，
+几百万行的合并数据集会把 gunicorn worker 撑爆。这里按块读取 CSV，分三遍扫描：
+
+    1. 累计 城市+小区 / 城市+区域 / 城市+区域+街道 的数量与价格和，以及各类别列的取值集合
+    2. 用全量统计量生成每块的数值特征，累计中位数所需的取值直方图和标准化所需的矩
+    3. 填充、标准化、编码后把每块结果直接写进磁盘上的 memmap（MatrixCache）
+
+常驻内存只有当前块 + 按“不同取值”计的统计量，与文件行数无关。
+结果与 preprocess_df(is_train=True) + train_dp.build_training_arrays 一致
+（中位数精确，均值/方差用可合并的 Chan 公式，仅有浮点舍入差异）。
+"""
+import codecs
+import io
+import os
+
+import numpy as np
+import pandas as pd
+
+from app.train.data_load import CATEGORY_COLS, extract_base_features
+from app.train.vocab import CategoryVocab
+
+DEFAULT_CHUNKSIZE = int(os.getenv("PREPROCESS_CHUNKSIZE", "50000"))
+# 超过该大小的数据文件在训练时走分块预处理
+STREAMING_THRESHOLD_BYTES = int(os.getenv("STREAMING_THRESHOLD_BYTES", str(256 * 1024 ** 2)))
+
+# 分块读取时按文本读入的列：避免各块独立推断出不同的 dtype（如 "1" / "1.0"）
+TEXT_COLS = ["城市", "区域", "街道", "小区", "所在楼层", "百度经纬"] + [
+    c for c in CATEGORY_COLS if c != "楼层类别"
+]
+
+# 统计层级: (组合键列, 数量列, 均价列)
+_STAT_LEVELS = [
+    ("city_community", "community_cnt", "community_mean_price"),
+    ("city_region", "region_cnt", "region_mean_price"),
+    ("city_region_street", "street_cnt", "street_mean_price"),
+]
+
+
+def detect_csv_encoding(content, block_size=1 << 20):
+    """按块增量解码判断编码（utf-8 失败则按 gbk），不生成整份解码副本"""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    view = memoryview(content)
+    try:
+        for start in range(0, len(view), block_size):
+            decoder.decode(view[start:start + block_size])
+        decoder.decode(b"", final=True)
+        return "utf-8"
+    except UnicodeDecodeError:
+        return "gbk"
+
+
+def detect_stream_encoding(fileobj, block_size=1 << 20):
+    """同 detect_csv_encoding，输入为可 seek 的二进制文件对象，判断后回到原位置"""
+    start = fileobj.tell()
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    try:
+        for block in iter(lambda: fileobj.read(block_size), b""):
+            decoder.decode(block)
+        decoder.decode(b"", final=True)
+        return "utf-8"
+    except UnicodeDecodeError:
+        return "gbk"
+    finally:
+        fileobj.seek(start)
+
+
+def iter_csv_chunks(content, chunksize=None, encoding=None):
+    """
+    按块读取 CSV
+
+    Args:
+        content: CSV 文件的二进制内容，或可 seek 的二进制文件对象（如上传文件），
+                 文件对象不会被整体读入内存
+        chunksize: 每块行数
+        encoding: 文件编码，默认自动判断
+
+    Yields:
+        pandas.DataFrame
+    """
+    if isinstance(content, (bytes, bytearray, memoryview)):
+        encoding = encoding or detect_csv_encoding(content)
+        content = io.BytesIO(content)
+    else:
+        encoding = encoding or detect_stream_encoding(content)
+    reader = pd.read_csv(
+        content,
+        encoding=encoding,
+        chunksize=chunksize or DEFAULT_CHUNKSIZE,
+        dtype={c: str for c in TEXT_COLS},
+    )
+    with reader:
+        yield from reader
+
+
+class Moments:
+    """可合并的 (count, mean, M2)，Chan 等人的并行方差公式"""
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def merge(self, n, mean, m2):
+        if n == 0:
+            return
+        total = self.n + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += m2 + delta * delta * self.n * n / total
+        self.n = total
+
+    def add_values(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        if len(values):
+            mean = values.mean()
+            self.merge(len(values), mean, float(((values - mean) ** 2).sum()))
+
+    @property
+    def var(self):
+        return self.m2 / self.n if self.n else np.nan
+
+
+def _weighted_median(counts):
+    """{取值: 次数} 直方图的中位数，偶数个时取中间两数均值（同 pandas.median）"""
+    if counts is None or counts.empty:
+        return np.nan
+    counts = counts.sort_index()
+    cum = counts.to_numpy().cumsum()
+    n = cum[-1]
+    values = counts.index.to_numpy(dtype=np.float64)
+    upper = values[np.searchsorted(cum, n // 2 + 1)]
+    if n % 2:
+        return float(upper)
+    lower = values[np.searchsorted(cum, n // 2)]
+    return float((lower + upper) / 2)
+
+
+class StreamingPreprocessor:
+    """
+    分块拟合训练集的统计量 / 词表 / 中位数 / 标准化参数，再分块输出训练矩阵。
+
+    open_chunks: 无参可调用对象，每次调用返回一个新的分块迭代器（需要扫描三遍）
+    """
+
+    def __init__(self, open_chunks):
+        self.open_chunks = open_chunks
+        self.total_rows = 0
+        self.target_rows = 0
+        self.stat_tables = None
+        self.global_mean = np.nan
+        self.vocabs = None
+        self.num_median = None
+        self.num_mean = None
+        self.num_scale = None
+
+    # ---------- 第 1 遍：统计特征 + 词表 ----------
+    def _fit_stats(self):
+        acc = {key: None for key, _, _ in _STAT_LEVELS}
+        uniques = {col: set() for col in CATEGORY_COLS}
+        price_sum, price_count = 0.0, 0
+
+        for chunk in self.open_chunks():
+            df = extract_base_features(chunk, is_train=True)
+            self.total_rows += len(df)
+            price = df["price_per_m2"]
+            price_sum += float(price.sum())
+            price_count += int(price.notna().sum())
+
+            for key, _, _ in _STAT_LEVELS:
+                part = price.groupby(df[key]).agg(["count", "sum"])
+                acc[key] = part if acc[key] is None else acc[key].add(part, fill_value=0)
+
+            for col in CATEGORY_COLS:
+                if col in df.columns:
+                    uniques[col].update(df[col].astype(str).unique().tolist())
+
+        self.target_rows = price_count
+        self.global_mean = price_sum / price_count if price_count else np.nan
+        self.stat_tables = {}
+        for key, cnt_col, mean_col in _STAT_LEVELS:
+            part = acc[key]
+            if part is None:
+                part = pd.DataFrame({"count": [], "sum": []})
+            mean = (part["sum"] / part["count"]).where(part["count"] > 0)
+            self.stat_tables[key] = pd.DataFrame({
+                cnt_col: part["count"].astype(float),
+                mean_col: mean.fillna(self.global_mean),
+            })
+        # LabelEncoder 的 classes_ 即排好序的唯一值
+        self.vocabs = {col: CategoryVocab(sorted(values)) for col, values in uniques.items() if values}
+
+    def _chunk_features(self, chunk):
+        """单块 -> (数值特征 DataFrame[未填充], 类别 id 矩阵, 标签)"""
+        from app.train.train_dp import NUM_COLS, CAT_COLS
+
+        df = extract_base_features(chunk, is_train=True)
+        for key, cnt_col, mean_col in _STAT_LEVELS:
+            table = self.stat_tables[key]
+            idx = table.index.get_indexer(df[key])
+            found = idx >= 0
+            cnt = np.zeros(len(df))
+            mean = np.full(len(df), self.global_mean)
+            cnt[found] = table[cnt_col].to_numpy()[idx[found]]
+            mean[found] = table[mean_col].to_numpy()[idx[found]]
+            df[cnt_col] = cnt
+            df[mean_col] = mean
+
+        num = pd.DataFrame({col: df[col].astype(float) for col in NUM_COLS}, index=df.index)
+        cat = np.column_stack([
+            self.vocabs[col[:-len("_id")]].encode(df[col[:-len("_id")]].astype(str)) for col in CAT_COLS
+        ])
+        return num, cat, df["price_per_m2"].to_numpy(dtype=np.float64)
+
+    # ---------- 第 2 遍：中位数 + 标准化参数 ----------
+    def _fit_numeric(self):
+        from app.train.train_dp import NUM_COLS
+
+        hist = {col: None for col in NUM_COLS}
+        moments = {col: Moments() for col in NUM_COLS}
+        missing_in_target = {col: 0 for col in NUM_COLS}
+
+        for chunk in self.open_chunks():
+            num, _, y = self._chunk_features(chunk)
+            has_target = ~np.isnan(y)
+            for col in NUM_COLS:
+                values = num[col]
+                counts = values.value_counts(dropna=True)
+                hist[col] = counts if hist[col] is None else hist[col].add(counts, fill_value=0)
+                target_values = values.to_numpy()[has_target]
+                present = ~np.isnan(target_values)
+                moments[col].add_values(target_values[present])
+                missing_in_target[col] += int((~present).sum())
+
+        self.num_median = np.array([_weighted_median(hist[col]) for col in NUM_COLS])
+        self.num_mean = np.empty(len(NUM_COLS))
+        self.num_scale = np.empty(len(NUM_COLS))
+        for i, col in enumerate(NUM_COLS):
+            # 缺失值全部填成中位数：相当于再合并一组 (缺失数, 中位数, 0)
+            m = moments[col]
+            m.merge(missing_in_target[col], self.num_median[i], 0.0)
+            self.num_mean[i] = m.mean
+            scale = np.sqrt(m.var)
+            # 与 StandardScaler 一致：方差为 0 的列不缩放
+            self.num_scale[i] = scale if scale > 10 * np.finfo(np.float64).eps * max(abs(m.mean), 1.0) else 1.0
+
+    def fit(self):
+        self._fit_stats()
+        self._fit_numeric()
+        return self
+
+    # ---------- 第 3 遍：输出训练矩阵 ----------
+    def write_arrays(self, targets):
+        """把 X_num / X_cat / y 分块写入 targets（可写 memmap）"""
+        offset = 0
+        for chunk in self.open_chunks():
+            num, cat, y = self._chunk_features(chunk)
+            has_target = ~np.isnan(y)
+            n = int(has_target.sum())
+            if n == 0:
+                continue
+            x_num = num.to_numpy(dtype=np.float64)[has_target]
+            missing = np.isnan(x_num)
+            x_num[missing] = np.broadcast_to(self.num_median, x_num.shape)[missing]
+            x_num = (x_num - self.num_mean) / self.num_scale
+
+            targets["X_num"][offset:offset + n] = x_num
+            targets["X_cat"][offset:offset + n] = cat[has_target]
+            targets["y"][offset:offset + n] = y[has_target]
+            offset += n
+
+    def array_specs(self):
+        from app.train.train_dp import NUM_COLS, CAT_COLS
+        return {
+            "X_num": ((self.target_rows, len(NUM_COLS)), np.float32),
+            "X_cat": ((self.target_rows, len(CAT_COLS)), np.int32),
+            "y": ((self.target_rows,), np.float32),
+        }
+
+
+def build_training_arrays_streaming(open_chunks, cache, key, meta=None):
+    """
+    分块预处理并把训练矩阵写入 MatrixCache
+
+    Args:
+        open_chunks: 无参可调用对象，每次返回新的分块迭代器
+        cache: MatrixCache
+        key: 缓存键
+        meta: 额外写入缓存的元信息
+
+    Returns:
+        (arrays, meta)，arrays 为只读 memmap
+    """
+    pre = StreamingPreprocessor(open_chunks).fit()
+    meta = dict(meta or {})
+    meta.update({
+        "data_rows": pre.total_rows,
+        "processed_rows": pre.total_rows,
+        "streaming": True,
+    })
+    return cache.put_streaming(key, pre.array_specs(), pre.write_arrays, meta)
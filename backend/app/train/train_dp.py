@@ -1,8 +1,10 @@
-from openpyxl.styles.builtins import total
+import copy
 from sklearn.preprocessing import StandardScaler
+from app.train.artifacts import get_feature_artifacts
 from app.train.data_load import preprocess_df
 import pandas as pd
 import os
+import time
 NUM_COLS = [
     '建筑面积','成交周期（天）','调价（次）','带看（次）','关注（人）','浏览（次）',
     '建成年代','总楼层','在市天数','lng','lat',
@@ -26,9 +28,8 @@ def load_data(train_df):
 
     # 数值特征
     X_num = train_df[NUM_COLS].fillna(train_df[NUM_COLS].median())
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    path = os.path.join(current_dir, '1_scaler.pkl')
-    scaler = joblib.load(path)
+    # 共享的 scaler 会被 fit_transform 改写，训练时用副本
+    scaler = copy.deepcopy(get_feature_artifacts().scaler)
 
     X_num = scaler.fit_transform(X_num)
 
@@ -45,10 +46,7 @@ import torch
 import torch.nn as nn
 
 def get_cat_dims():
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    path = os.path.join(current_dir, 'cat_dims.pkl')
-    cat_dims = joblib.load(path)
-    return cat_dims
+    return get_feature_artifacts().cat_dims
 
 class HousePriceModel(nn.Module):
     def __init__(self, num_dim, cat_dims, embed_dim=16):
@@ -86,7 +84,10 @@ from torch.utils.data import DataLoader, TensorDataset
 from sklearn.model_selection import train_test_split
 
 
-def train_dl(X_num, X_cat, y, cat_dims,epochs=2, batch_size=1024):
+def train_dl(X_num, X_cat, y, cat_dims,epochs=2, batch_size=1024, on_epoch_end=None):
+    """
+    on_epoch_end: 可选回调 (epoch, epochs, rmse)，每轮验证后调用，用于上报训练进度
+    """
     device = 'cuda' if torch.cuda.is_available() else 'cpu'
 
     Xn_tr, Xn_va, Xc_tr, Xc_va, y_tr, y_va = train_test_split(
@@ -118,7 +119,10 @@ def train_dl(X_num, X_cat, y, cat_dims,epochs=2, batch_size=1024):
     best_rmse = 1e9
     patience, bad_epochs = 5, 0
 
+    from app.utils.metrics import TRAIN_EPOCH_SECONDS
+
     for epoch in range(epochs):
+        epoch_start = time.perf_counter()
         model.train()
         for xn, xc, yb in train_loader:
             xn, xc, yb = xn.to(device), xc.to(device), yb.to(device)
@@ -140,8 +144,11 @@ def train_dl(X_num, X_cat, y, cat_dims,epochs=2, batch_size=1024):
         preds = torch.cat(preds)
         trues = torch.cat(trues)
         rmse = torch.sqrt(((preds - trues) ** 2).mean()).item()
+        TRAIN_EPOCH_SECONDS.observe(time.perf_counter() - epoch_start)
 
         print(f'Epoch {epoch + 1}, RMSE: {rmse:.2f}')
+        if on_epoch_end is not None:
+            on_epoch_end(epoch, epochs, rmse)
 
         if rmse < best_rmse:
             best_rmse = rmse
@@ -161,10 +168,7 @@ def save_model(model, scaler, path='house_price_dl'):
     torch.save(model.state_dict(), f'{path}_model.pt')
     joblib.dump(scaler, f'{path}_scaler.pkl')
 def get_scaler():
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    path = os.path.join(current_dir, '1_scaler.pkl')
-    scaler = joblib.load(path)
-    return scaler
+    return get_feature_artifacts().scaler
 def load_model(cat_dims, num_dim=17, path='1', device='cpu'):
     model = HousePriceModel(
         num_dim=num_dim,
@@ -182,9 +186,7 @@ def predict(df, model, scaler, device='cpu'):
     """
     df: DataFrame，结构和训练时一致（不包含 price_per_m2）
     """
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    path = os.path.join(current_dir, 'num_median.pkl')
-    num_median = joblib.load(path)
+    num_median = get_feature_artifacts().num_median
     # 数值特征
     df = df.copy()
     for col in NUM_COLS:
@@ -196,26 +198,90 @@ def predict(df, model, scaler, device='cpu'):
 
     X_cat = df[CAT_COLS].fillna(0).astype(int).values
 
+    return predict_arrays(X_num, X_cat, model, device)
+
+
+def predict_arrays(X_num, X_cat, model, device='cpu'):
+    """
+    X_num: 已填充并标准化的数值特征 (n, len(NUM_COLS))
+    X_cat: 类别 id (n, len(CAT_COLS))
+    """
     with torch.no_grad():
-        xn = torch.tensor(X_num, dtype=torch.float32)
-        xc = torch.tensor(X_cat, dtype=torch.long)
+        xn = torch.as_tensor(X_num, dtype=torch.float32, device=device)
+        xc = torch.as_tensor(X_cat, dtype=torch.long, device=device)
         pred = model(xn, xc)
 
     return pred.cpu().numpy()
-def train_model(processed_df):
+
+
+def _batched_predict(model, X_num, X_cat):
+    return predict_arrays(X_num, X_cat, model)
+
+
+def predict_rows(X_num, X_cat, model):
+    """
+    少量行（通常是单套房屋）的预测
+
+    开启合批（MICROBATCH_ENABLED）时，与其他线程对同一模型的并发请求合并成一次前向。
+    """
+    from app.train.micro_batch import MICROBATCH_ENABLED, get_micro_batcher
+    if MICROBATCH_ENABLED and isinstance(model, torch.nn.Module):
+        return get_micro_batcher(model, _batched_predict).predict(model, X_num, X_cat)
+    return predict_arrays(X_num, X_cat, model)
+
+
+# 批量预测时每次前向的最大行数，限制中间张量的内存占用
+PREDICT_BATCH_SIZE = 8192
+
+
+def predict_encoded(encoded, model, batch_size=PREDICT_BATCH_SIZE):
+    """
+    encode_houses 的结果 -> 单价数组 float64 (n,)
+
+    HousePriceModel 按 batch_size 分段前向（通常整批一次）；
+    其他模型（LightGBM 等）用特征 DataFrame 调用一次 predict。
+    """
+    if not isinstance(model, torch.nn.Module):
+        return np.asarray(model.predict(encoded.frame), dtype=np.float64).reshape(-1)
+
+    model.eval()
+    n = len(encoded)
+    out = np.empty(n, dtype=np.float64)
+    for start in range(0, n, batch_size):
+        stop = min(start + batch_size, n)
+        out[start:stop] = predict_arrays(encoded.x_num[start:stop], encoded.x_cat[start:stop], model).reshape(-1)
+    return out
+def build_training_arrays(processed_df):
+    """
+    processed_df -> (X_num, X_cat, y)，紧凑 dtype，便于缓存到磁盘
+    """
+    X_num, X_cat, y, _ = load_data(processed_df)
+    return X_num.astype('float32'), X_cat.astype('int32'), y
+
+
+def train_model_from_arrays(X_num, X_cat, y, on_epoch_end=None):
     cat_dims = get_cat_dims()
-    a, b, c, d = load_data(processed_df)
-    model = train_dl(a, b, c, cat_dims)
-    return model
+    return train_dl(X_num, X_cat, y, cat_dims, on_epoch_end=on_epoch_end)
+
+
+def train_model(processed_df):
+    X_num, X_cat, y = build_training_arrays(processed_df)
+    return train_model_from_arrays(X_num, X_cat, y)
 def eval_house_by_dict(house_info,model):
-    cat_dims = get_cat_dims()
-    df = pd.DataFrame([house_info])
-    print(df)
-    df_processed = preprocess_df(df)
-    print(df_processed)
-    scaler=get_scaler()
-    unit = float(predict(df_processed, model, scaler)[0])
-    total = float(unit*float(house_info['建筑面积'][:-1]))
+    """
+    单套房屋预测，走 house_encoder 快速路径（不构造 DataFrame），
+    特征与 preprocess_df(is_train=False) + predict 的结果一致。
+    """
+    from app.train.house_encoder import encode_house, clean_area
+    from app.utils.timing import span
+    with span('preprocess'):
+        x_num, x_cat = encode_house(house_info)
+        area = clean_area(house_info.get('建筑面积'))
+    with span('forward'):
+        unit = float(predict_rows(x_num, x_cat, model)[0])
+    if np.isnan(area):
+        raise ValueError('无法解析建筑面积')
+    total = float(unit*area)
     return unit,total
 if __name__ == '__main__':
 
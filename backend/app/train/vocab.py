@@ -0,0 +1,64 @@
+"""
+类别特征词表：用哈希索引代替 LabelEncoder 推理时的逐值线性查找
+"""
+import numpy as np
+import pandas as pd
+
+
+class CategoryVocab:
+    """
+    由训练时保存的 LabelEncoder 构建的只读词表。
+
+    - 编号与 LabelEncoder.transform 完全一致（classes_ 的下标）
+    - 训练时没见过的值统一编码为 oov_id（默认 0，即 classes_[0]，与旧逻辑相同）；
+      oov_id 也可以取 len(classes)，作为独立的 OOV 桶（嵌入层有 cat_dim + 1 行），该编号不能 decode
+    - encode 对整列向量化，底层是 pandas 哈希表，每个值 O(1)
+    """
+
+    def __init__(self, classes, oov_id=0):
+        self.classes = np.asarray(classes)
+        if not 0 <= oov_id <= len(self.classes):
+            raise ValueError(f"oov_id 越界: {oov_id}")
+        self.oov_id = int(oov_id)
+        self._index = pd.Index(self.classes)
+        self._lookup = {value: i for i, value in enumerate(self.classes.tolist())}
+
+    @classmethod
+    def from_label_encoder(cls, le, oov_id=0):
+        return cls(le.classes_, oov_id=oov_id)
+
+    def __len__(self):
+        return len(self.classes)
+
+    def __contains__(self, value):
+        return value in self._lookup
+
+    def encode(self, values, return_oov=False):
+        """
+        整列编码
+
+        Args:
+            values: 类别值序列（Series / ndarray / list）
+            return_oov: 为 True 时同时返回未登录值的布尔掩码
+
+        Returns:
+            np.ndarray[int64]，或 (ids, oov_mask)
+        """
+        ids = self._index.get_indexer(values).astype(np.int64)
+        oov_mask = ids < 0
+        ids[oov_mask] = self.oov_id
+        if return_oov:
+            return ids, oov_mask
+        return ids
+
+    def encode_one(self, value):
+        """单值编码"""
+        return self._lookup.get(value, self.oov_id)
+
+    def decode(self, ids):
+        return self.classes[np.asarray(ids)]
+
+
+def build_vocabs(label_encoders):
+    """{列名: LabelEncoder} -> {列名: CategoryVocab}"""
+    return {col: CategoryVocab.from_label_encoder(le) for col, le in label_encoders.items()}
@@ -0,0 +1,296 @@
+"""
+可比成交（附近相似房源）的空间索引
+
+已上传数据文件里的每条成交按 城市 分片，每个分片在 (lat, lng) 上建一棵 BallTree（haversine 距离），
+k 近邻查询只访问目标城市的树，面积 / 户型过滤在候选集上完成，候选不够时扩大 k 重查。
+
+增量维护：
+    - 上传数据文件时只解析这一个文件，把它的行并入对应城市，只标记这些城市需要重建
+    - 删除数据文件时移除它的行
+    - 查询前用一条只查 id 的 SQL 与数据库对齐（其他 worker 进程上传/删除的文件也会被同步），
+      缺失的文件补充解析，已删除的文件移除；脏分片在下次查询时重建
+"""
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.extensions import db
+
+EARTH_RADIUS_KM = 6371.0088
+
+COMPARABLES_DEFAULT_K = int(os.getenv('COMPARABLES_DEFAULT_K', '10'))
+COMPARABLES_MAX_K = int(os.getenv('COMPARABLES_MAX_K', '100'))
+# 与数据库对齐的最短间隔（秒），避免高频查询时每次都查 datafiles 表
+COMPARABLES_SYNC_INTERVAL_SECONDS = float(os.getenv('COMPARABLES_SYNC_INTERVAL_SECONDS', '5'))
+
+# 查询结果里带出的原始字段
+RECORD_COLS = [
+    '小区', '城市', '区域', '街道', '成交时间', '元/平', '成交价格', '建筑面积',
+    '房屋户型', '所在楼层', '房屋朝向', '建成年代', '装修情况', '百度经纬',
+]
+# 同一笔成交出现在多个数据文件里时按这些字段去重
+DEDUP_COLS = ['小区', '成交时间', '成交价格', '建筑面积']
+
+
+def extract_transactions(raw_df, datafile_id=None):
+    """
+    原始成交 DataFrame -> 可索引的记录（丢弃没有城市或坐标的行）
+
+    额外列：area（建筑面积数值）、lng / lat、datafile_id
+    """
+    from app.train.data_load import clean_area_series, split_lnglat_series
+
+    records = pd.DataFrame(index=raw_df.index)
+    for col in RECORD_COLS:
+        records[col] = raw_df[col] if col in raw_df.columns else None
+    records['area'] = clean_area_series(raw_df['建筑面积']) if '建筑面积' in raw_df.columns else np.nan
+    if '百度经纬' in raw_df.columns:
+        records['lng'], records['lat'] = split_lnglat_series(raw_df['百度经纬'])
+    else:
+        records['lng'] = records['lat'] = np.nan
+    records['datafile_id'] = datafile_id
+
+    valid = records['城市'].notna() & records['lng'].between(-180, 180) & records['lat'].between(-90, 90)
+    return records[valid].reset_index(drop=True)
+
+
+def parse_query_params(params):
+    """
+    请求参数 -> ComparablesIndex.query 的关键字参数
+
+    坐标可以给 lng + lat，也可以给原始的 百度经纬 字符串 "lng,lat"；参数不合法时抛出 ValueError。
+    """
+    def number(name):
+        value = params.get(name)
+        if value is None or value == '':
+            return None
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f'{name} 必须是数字')
+        if not np.isfinite(value):
+            raise ValueError(f'{name} 必须是有限的数字')
+        return value
+
+    lng, lat = number('lng'), number('lat')
+    if (lng is None or lat is None) and params.get('百度经纬'):
+        try:
+            lng, lat = (float(part) for part in str(params['百度经纬']).split(','))
+        except ValueError:
+            raise ValueError('百度经纬 格式应为 "lng,lat"')
+    if lng is None or lat is None or not (np.isfinite(lng) and np.isfinite(lat)):
+        raise ValueError('必须提供坐标 lng / lat（或 百度经纬）')
+    if not (-180 <= lng <= 180 and -90 <= lat <= 90):
+        raise ValueError('坐标超出范围')
+
+    k = number('k')
+    k = COMPARABLES_DEFAULT_K if k is None else int(k)
+    if not 1 <= k <= COMPARABLES_MAX_K:
+        raise ValueError(f'k 必须在 1 到 {COMPARABLES_MAX_K} 之间')
+
+    max_distance_km = number('max_distance_km')
+    if max_distance_km is not None and max_distance_km <= 0:
+        raise ValueError('max_distance_km 必须大于 0')
+
+    return {
+        'lng': lng,
+        'lat': lat,
+        'city': str(params.get('city') or params.get('城市') or '').strip() or None,
+        'k': k,
+        'area_min': number('area_min'),
+        'area_max': number('area_max'),
+        'room_type': str(params.get('room_type') or '').strip() or None,
+        'max_distance_km': max_distance_km,
+    }
+
+
+class CityShard:
+    """一个城市的成交记录和 BallTree（构建后不再修改，重建时整体替换）"""
+
+    def __init__(self, records):
+        from sklearn.neighbors import BallTree
+
+        self.records = records.reset_index(drop=True)
+        coords = np.radians(self.records[['lat', 'lng']].to_numpy(dtype=np.float64))
+        self.tree = BallTree(coords, metric='haversine')
+        self.area = self.records['area'].to_numpy(dtype=np.float64)
+        self.room_type = self.records['房屋户型'].fillna('').astype(str).to_numpy()
+
+    def __len__(self):
+        return len(self.records)
+
+    def _mask(self, idx, area_min, area_max, room_type):
+        mask = np.ones(len(idx), dtype=bool)
+        if area_min is not None:
+            mask &= self.area[idx] >= area_min
+        if area_max is not None:
+            mask &= self.area[idx] <= area_max
+        if room_type:
+            mask &= np.char.startswith(self.room_type[idx].astype(str), room_type)
+        return mask
+
+    def query(self, lng, lat, k, area_min=None, area_max=None, room_type=None, max_distance_km=None):
+        """
+        k 个最近且满足过滤条件的成交 -> 记录 DataFrame（附 distance_km 列，按距离升序）
+
+        先取 4k 个近邻过滤，不够时按 4 倍扩大，直到凑满 k 条或已覆盖全部记录。
+        """
+        point = np.radians([[lat, lng]])
+        filtered = area_min is not None or area_max is not None or bool(room_type)
+        candidates = min(len(self), k * 4 if filtered else k)
+        while True:
+            dist, idx = self.tree.query(point, k=candidates)
+            dist, idx = dist[0] * EARTH_RADIUS_KM, idx[0]
+            if max_distance_km is not None:
+                within = dist <= max_distance_km
+                dist, idx = dist[within], idx[within]
+            keep = self._mask(idx, area_min, area_max, room_type)
+            rows = self.records.iloc[idx[keep]].assign(distance_km=dist[keep])
+            rows = rows.drop_duplicates(subset=DEDUP_COLS)
+            exhausted = candidates >= len(self) or (max_distance_km is not None and len(idx) < candidates)
+            if len(rows) >= k or exhausted:
+                break
+            candidates = min(len(self), candidates * 4)
+        return rows.head(k)
+
+
+class ComparablesIndex:
+    """按城市分片的可比成交索引（进程内，线程安全）"""
+
+    def __init__(self, sync_interval=COMPARABLES_SYNC_INTERVAL_SECONDS):
+        self.sync_interval = sync_interval
+        self._files = {}    # datafile_id -> {城市: 记录 DataFrame}
+        self._shards = {}   # 城市 -> CityShard
+        self._dirty = set()
+        self._lock = threading.RLock()
+        self._last_sync = None
+
+        self.queries = 0
+        self.files_indexed = 0
+        self.rebuilds = 0
+        self.index_seconds_total = 0.0
+        self.query_seconds_total = 0.0
+
+    def add_datafile(self, datafile):
+        """解析一个数据文件并并入索引（已存在时跳过）"""
+        with self._lock:
+            if datafile.id in self._files:
+                return
+        start = time.perf_counter()
+        chunks = [extract_transactions(chunk, datafile.id) for chunk in datafile.iter_chunks()]
+        records = pd.concat(chunks, ignore_index=True) if chunks else extract_transactions(pd.DataFrame())
+        by_city = {city: group for city, group in records.groupby('城市', sort=False)}
+        with self._lock:
+            self._files[datafile.id] = by_city
+            self._dirty.update(by_city)
+            self.files_indexed += 1
+            self.index_seconds_total += time.perf_counter() - start
+
+    def remove_datafile(self, datafile_id):
+        with self._lock:
+            by_city = self._files.pop(datafile_id, None)
+            if by_city:
+                self._dirty.update(by_city)
+
+    def sync(self, force=False):
+        """与数据库中的数据文件对齐（需要在应用上下文中调用）"""
+        from app.models.datafile import DataFile
+
+        now = time.monotonic()
+        if not force and self._last_sync is not None and now - self._last_sync < self.sync_interval:
+            return
+        self._last_sync = now
+        current = {row.id for row in db.session.query(DataFile.id).all()}
+        with self._lock:
+            known = set(self._files)
+        for datafile_id in known - current:
+            self.remove_datafile(datafile_id)
+        for datafile_id in sorted(current - known):
+            datafile = DataFile.query.get(datafile_id)
+            if datafile is None:
+                continue
+            try:
+                self.add_datafile(datafile)
+            except Exception as e:
+                # 无法解析的文件记为空，避免每次查询重复尝试
+                print(f"可比成交索引跳过数据文件 {datafile_id}: {e}")
+                with self._lock:
+                    self._files.setdefault(datafile_id, {})
+
+    def _shard(self, city):
+        """调用方持有 self._lock：取城市分片，脏分片先重建"""
+        if city in self._dirty:
+            self._dirty.discard(city)
+            frames = [by_city[city] for by_city in self._files.values() if city in by_city]
+            if frames:
+                self._shards[city] = CityShard(pd.concat(frames, ignore_index=True))
+                self.rebuilds += 1
+            else:
+                self._shards.pop(city, None)
+        return self._shards.get(city)
+
+    def query(self, lng, lat, city=None, k=COMPARABLES_DEFAULT_K, area_min=None, area_max=None,
+              room_type=None, max_distance_km=None):
+        """
+        最近的 k 笔可比成交（需要在应用上下文中调用）
+
+        未指定城市时在所有城市分片中查询后按距离合并。
+
+        Returns:
+            list[dict]：RECORD_COLS 字段 + datafile_id + distance_km，按距离升序
+        """
+        start = time.perf_counter()
+        self.sync()
+        with self._lock:
+            known = {c for by_city in self._files.values() for c in by_city}
+            if city and city not in known and city.endswith('市'):
+                city = city[:-1]  # "大连市" -> "大连"
+            cities = [city] if city else list(known)
+            shards = [s for s in (self._shard(c) for c in cities) if s is not None]
+
+        results = [shard.query(lng, lat, k, area_min, area_max, room_type, max_distance_km) for shard in shards]
+        results = [r for r in results if len(r)]
+        if results:
+            rows = pd.concat(results, ignore_index=True).sort_values('distance_km', kind='stable').head(k)
+        else:
+            rows = pd.DataFrame(columns=RECORD_COLS + ['datafile_id', 'distance_km'])
+        rows = rows[RECORD_COLS + ['datafile_id', 'distance_km']].astype(object)
+        rows = rows.where(rows.notna(), None)
+        rows['distance_km'] = [round(float(d), 4) for d in rows['distance_km']]
+
+        with self._lock:
+            self.queries += 1
+            self.query_seconds_total += time.perf_counter() - start
+        return rows.to_dict('records')
+
+    def stats(self):
+        with self._lock:
+            return {
+                'datafiles': len(self._files),
+                'cities': len({c for by_city in self._files.values() for c in by_city}),
+                'built_shards': len(self._shards),
+                'dirty_shards': len(self._dirty),
+                'records': int(sum(len(r) for by_city in self._files.values() for r in by_city.values())),
+                'files_indexed': self.files_indexed,
+                'rebuilds': self.rebuilds,
+                'queries': self.queries,
+                'avg_query_ms': round(self.query_seconds_total / self.queries * 1000, 3) if self.queries else None,
+                'index_seconds_total': round(self.index_seconds_total, 3),
+            }
+
+
+_comparables_index = None
+_comparables_index_lock = threading.Lock()
+
+
+def get_comparables_index():
+    """当前进程共享的 ComparablesIndex 实例"""
+    global _comparables_index
+    if _comparables_index is None:
+        with _comparables_index_lock:
+            if _comparables_index is None:
+                _comparables_index = ComparablesIndex()
+    return _comparables_index
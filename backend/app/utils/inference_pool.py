@@ -0,0 +1,108 @@
+"""
+按模型并发推理的线程池
+
+一次联邦评估要用 10~30 个模型分别预测，逐个串行时总延迟是各模型
+（查库、反序列化、编码、前向）耗时之和。这里把每个模型的工作提交到
+进程内共享的有界线程池（torch / LightGBM 计算时会释放 GIL），
+并给整个请求设一个截止时间：到期未完成的模型记为超时，
+调用方只用已完成的结果做融合，不再等待慢模型。
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextvars import copy_context
+
+from flask import current_app
+
+INFERENCE_WORKERS = int(os.getenv('INFERENCE_WORKERS', '8'))
+# 单次请求等待所有模型完成的默认时长（秒）
+INFERENCE_TIMEOUT_SECONDS = float(os.getenv('INFERENCE_TIMEOUT_SECONDS', '10'))
+
+SUCCESS = 'success'
+ERROR = 'error'
+TIMEOUT = 'timeout'
+
+
+def _run_in_app_context(app, fn, item):
+    # 每个线程推入自己的应用上下文，db.session 随上下文隔离并在结束时释放
+    with app.app_context():
+        return fn(item)
+
+
+class InferencePool:
+    """有界线程池 + 截止时间，结果按输入顺序返回"""
+
+    def __init__(self, max_workers=INFERENCE_WORKERS):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='inference')
+        self._lock = threading.Lock()
+
+        self.requests = 0
+        self.tasks = 0
+        self.errors = 0
+        self.timeouts = 0
+
+    def map(self, fn, items, timeout=None):
+        """
+        在线程池中对每个 item 调用 fn(item)（需要在应用上下文中调用）
+
+        Args:
+            timeout: 截止时间（秒），None 时使用 INFERENCE_TIMEOUT_SECONDS
+
+        Returns:
+            [(status, value)]，与 items 一一对应：
+                ('success', 返回值) / ('error', 异常) / ('timeout', None)
+        """
+        items = list(items)
+        timeout = INFERENCE_TIMEOUT_SECONDS if timeout is None else timeout
+        app = current_app._get_current_object()
+
+        # 每个任务带上提交时的 contextvars 副本（请求级的分阶段计时等）
+        futures = [
+            self._executor.submit(copy_context().run, _run_in_app_context, app, fn, item)
+            for item in items
+        ]
+        wait(futures, timeout=timeout)
+
+        outcomes = []
+        for future in futures:
+            if not future.done():
+                # 尚未开始的直接取消；已在运行的无法中断，结果被丢弃
+                future.cancel()
+                outcomes.append((TIMEOUT, None))
+            elif future.exception() is not None:
+                outcomes.append((ERROR, future.exception()))
+            else:
+                outcomes.append((SUCCESS, future.result()))
+
+        with self._lock:
+            self.requests += 1
+            self.tasks += len(items)
+            self.errors += sum(1 for status, _ in outcomes if status == ERROR)
+            self.timeouts += sum(1 for status, _ in outcomes if status == TIMEOUT)
+        return outcomes
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_workers': self.max_workers,
+                'default_timeout_seconds': INFERENCE_TIMEOUT_SECONDS,
+                'requests': self.requests,
+                'tasks': self.tasks,
+                'errors': self.errors,
+                'timeouts': self.timeouts,
+            }
+
+
+_inference_pool = None
+_inference_pool_lock = threading.Lock()
+
+
+def get_inference_pool():
+    """当前进程共享的 InferencePool 实例"""
+    global _inference_pool
+    if _inference_pool is None:
+        with _inference_pool_lock:
+            if _inference_pool is None:
+                _inference_pool = InferencePool()
+    return _inference_pool
@@ -0,0 +1,99 @@
+"""
+Prometheus 指标
+
+gunicorn 多 worker 部署时设置环境变量 PROMETHEUS_MULTIPROC_DIR（见 gunicorn.conf.py / Dockerfile）：
+每个进程（web worker 以及它们启动的任务进程）把指标写入该目录下按 pid 命名的 mmap 文件，
+/metrics 用 MultiProcessCollector 汇总目录下所有进程的数据，计数器和直方图在各 worker 之间正确累加。
+未设置时（python run.py 开发环境）使用进程内的默认 registry。
+
+环境变量必须在 import prometheus_client 之前设置，gunicorn.conf.py 在加载应用前完成这一步。
+"""
+import os
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, generate_latest
+
+PROMETHEUS_MULTIPROC_DIR = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+
+# 秒级桶：覆盖单条预测（毫秒）到批量接口（数秒）
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# 训练任务：秒到小时
+JOB_BUCKETS = (1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0, 7200.0)
+EPOCH_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    'http_request_duration_seconds', 'HTTP 请求耗时（到响应体发送完为止，含流式响应）',
+    ['blueprint', 'endpoint', 'method', 'status'], buckets=LATENCY_BUCKETS,
+)
+JOB_SECONDS = Histogram(
+    'job_duration_seconds', '后台任务执行耗时',
+    ['job_type', 'status'], buckets=JOB_BUCKETS,
+)
+TRAIN_EPOCH_SECONDS = Histogram(
+    'train_epoch_duration_seconds', 'train_dl 每轮训练（含验证）耗时',
+    buckets=EPOCH_BUCKETS,
+)
+CACHE_REQUESTS = Counter(
+    'cache_requests_total', '进程内缓存查找次数（按命中 / 未命中）',
+    ['cache', 'result'],
+)
+MODEL_LOAD_SECONDS = Histogram(
+    'model_cache_load_duration_seconds', '模型缓存未命中时读取并反序列化模型的耗时',
+    buckets=LATENCY_BUCKETS,
+)
+LLM_REQUEST_SECONDS = Histogram(
+    'llm_request_duration_seconds', '大模型 chat/completions 调用耗时',
+    ['model', 'status'], buckets=LATENCY_BUCKETS,
+)
+LLM_FIRST_TOKEN_SECONDS = Histogram(
+    'llm_time_to_first_token_seconds', '大模型流式调用从发出请求到收到第一个增量（文本或工具调用）的耗时',
+    ['model'], buckets=LATENCY_BUCKETS,
+)
+PREDICTION_STAGE_SECONDS = Histogram(
+    'prediction_stage_duration_seconds', '预测链路各阶段耗时（见 app.utils.timing）',
+    ['stage'], buckets=LATENCY_BUCKETS,
+)
+
+
+def record_cache(cache, hit):
+    CACHE_REQUESTS.labels(cache=cache, result='hit' if hit else 'miss').inc()
+
+
+def init_app(app):
+    """注册请求耗时统计（按蓝图和端点）"""
+    from flask import g, request
+
+    @app.before_request
+    def _start_timer():
+        g._metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _observe_request(response):
+        start = g.pop('_metrics_start', None)
+        if start is not None:
+            histogram = HTTP_REQUEST_SECONDS.labels(
+                blueprint=request.blueprint or '',
+                # 未匹配到路由（404）时统一记为 unmatched，避免任意 URL 产生新的标签
+                endpoint=request.endpoint or 'unmatched',
+                method=request.method,
+                status=str(response.status_code),
+            )
+            # 流式响应的响应体在 after_request 之后才生成，到响应关闭（发送完或客户端断开）时再记录
+            response.call_on_close(lambda: histogram.observe(time.perf_counter() - start))
+        return response
+
+
+def render_latest():
+    """
+    Prometheus 文本格式的当前指标
+
+    Returns:
+        (body, content_type)
+    """
+    if PROMETHEUS_MULTIPROC_DIR:
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        from prometheus_client import REGISTRY as registry
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,206 @@
+"""
+已反序列化模型的进程内 LRU 缓存
+
+预测时不再每次从数据库拉取 model_content 再 joblib.load：先用一条只查元数据的
+SQL 取出 (upload_time, model_size) 作为版本号，版本没变就直接复用内存中的模型对象。
+模型被删除或版本变化时自动丢弃旧对象；routes/model.py 更新/删除模型时也会主动失效。
+"""
+import io
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import joblib
+
+from app.extensions import db
+
+MODEL_CACHE_MAX_BYTES = int(os.getenv('MODEL_CACHE_MAX_BYTES', str(512 * 1024 ** 2)))
+MODEL_CACHE_MAX_ENTRIES = int(os.getenv('MODEL_CACHE_MAX_ENTRIES', '64'))
+
+
+def estimate_model_bytes(model, content_size):
+    """估算模型常驻内存：torch 模型按参数和缓冲区计，其余按序列化大小近似"""
+    try:
+        import torch
+        if isinstance(model, torch.nn.Module):
+            tensors = list(model.parameters()) + list(model.buffers())
+            return sum(t.numel() * t.element_size() for t in tensors)
+    except ImportError:
+        pass
+    return content_size
+
+
+class ModelCache:
+    """
+    线程安全的 LRU 模型缓存，按条目数和估算内存两个上限淘汰。
+
+    键为 model_id，条目里记录版本号 (upload_time, model_size)，
+    同一模型的新版本会替换旧版本而不是并存。
+    """
+
+    def __init__(self, max_bytes=MODEL_CACHE_MAX_BYTES, max_entries=MODEL_CACHE_MAX_ENTRIES):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # model_id -> {'version', 'model', 'bytes'}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._loading = {}  # model_id -> Lock，同一模型并发未命中时只加载一次
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.loads = 0
+        self.load_errors = 0
+        self.load_seconds_total = 0.0
+        self.load_seconds_max = 0.0
+
+    @staticmethod
+    def _fetch_info(model_id):
+        """只查元数据，不读取模型二进制"""
+        from app.models.model import MLModel
+
+        row = db.session.query(
+            MLModel.id, MLModel.model_name, MLModel.data_count,
+            MLModel.model_type, MLModel.upload_time, MLModel.model_size
+        ).filter(MLModel.id == model_id).first()
+        return row._asdict() if row is not None else None
+
+    @staticmethod
+    def _version(info):
+        upload_time = info['upload_time'].isoformat() if info['upload_time'] else ''
+        return f"{upload_time}:{info['model_size']}"
+
+    def get(self, model_id):
+        """
+        获取可直接预测的模型对象（需要在应用上下文中调用）
+
+        Returns:
+            (model, info)；模型不存在时返回 None。
+            info 为 id / model_name / data_count / model_type / upload_time / model_size
+        """
+        from app.utils.timing import span
+
+        with span('model_meta'):
+            info = self._fetch_info(model_id)
+        if info is None:
+            self.invalidate(model_id)
+            return None
+        version = self._version(info)
+
+        model = self._lookup(model_id, version)
+        if model is not None:
+            return model, info
+
+        with self._lock:
+            loading = self._loading.setdefault(model_id, threading.Lock())
+        with loading:
+            # 等待期间其他线程可能已经加载好了
+            model = self._lookup(model_id, version, count=False)
+            if model is not None:
+                return model, info
+            model = self._load(model_id, info, version)
+        return model, info
+
+    def _lookup(self, model_id, version, count=True):
+        from app.utils.metrics import record_cache
+
+        with self._lock:
+            entry = self._entries.get(model_id)
+            hit = entry is not None and entry['version'] == version
+            if hit:
+                self._entries.move_to_end(model_id)
+            if count:
+                if hit:
+                    self.hits += 1
+                else:
+                    self.misses += 1
+        if count:
+            record_cache('model', hit)
+        return entry['model'] if hit else None
+
+    def _load(self, model_id, info, version):
+        from app.models.model import MLModel
+        from app.utils.metrics import MODEL_LOAD_SECONDS
+        from app.utils.timing import span
+
+        start = time.perf_counter()
+        try:
+            with span('model_fetch'):
+                content = db.session.query(MLModel.model_content).filter(MLModel.id == model_id).scalar()
+            with span('unpickle'):
+                model = joblib.load(io.BytesIO(content))
+        except Exception:
+            with self._lock:
+                self.load_errors += 1
+            raise
+        elapsed = time.perf_counter() - start
+        MODEL_LOAD_SECONDS.observe(elapsed)
+
+        size = estimate_model_bytes(model, len(content))
+        with self._lock:
+            self.loads += 1
+            self.load_seconds_total += elapsed
+            self.load_seconds_max = max(self.load_seconds_max, elapsed)
+            old = self._entries.pop(model_id, None)
+            if old is not None:
+                self._bytes -= old['bytes']
+            if size <= self.max_bytes:
+                self._entries[model_id] = {'version': version, 'model': model, 'bytes': size}
+                self._bytes += size
+                self._evict()
+        return model
+
+    def _evict(self):
+        """调用方持有 self._lock"""
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            _, entry = self._entries.popitem(last=False)
+            self._bytes -= entry['bytes']
+            self.evictions += 1
+
+    def invalidate(self, model_id=None):
+        """丢弃指定模型（或全部模型）的缓存"""
+        with self._lock:
+            if model_id is None:
+                self.invalidations += len(self._entries)
+                self._entries.clear()
+                self._bytes = 0
+                return
+            entry = self._entries.pop(model_id, None)
+            if entry is not None:
+                self._bytes -= entry['bytes']
+                self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'loads': self.loads,
+                'load_errors': self.load_errors,
+                'avg_load_seconds': round(self.load_seconds_total / self.loads, 6) if self.loads else None,
+                'max_load_seconds': round(self.load_seconds_max, 6),
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'max_entries': self.max_entries,
+            }
+
+
+_model_cache = None
+_model_cache_lock = threading.Lock()
+
+
+def get_model_cache():
+    """当前进程共享的 ModelCache 实例"""
+    global _model_cache
+    if _model_cache is None:
+        with _model_cache_lock:
+            if _model_cache is None:
+                _model_cache = ModelCache()
+    return _model_cache
@@ -0,0 +1,184 @@
+"""
+预测结果缓存
+
+智能体经常用同一组 model_ids 反复询问同一套房屋，用户也会重复提交相同的评测表单。
+缓存键由三部分组成：
+    - 房屋：house_features 输出的特征（面积去掉 ㎡、楼层/时间解析、类别编号之后）的哈希，
+      写法不同但特征相同的房屋命中同一条目，与预测无关的字段不影响命中
+    - 模型：排序后的 (model_id, 版本) 列表，版本含上传时间 / 大小 / data_count，
+      模型内容或融合权重变化后键随之变化（多进程部署时各进程也不会读到旧结果）
+    - 特征产物版本
+条目按 TTL 过期、按 LRU 淘汰；routes/model.py 更新/删除模型时主动丢弃包含该模型的条目。
+"""
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from app.extensions import db
+
+PREDICTION_CACHE_TTL_SECONDS = float(os.getenv('PREDICTION_CACHE_TTL_SECONDS', '600'))
+PREDICTION_CACHE_MAX_ENTRIES = int(os.getenv('PREDICTION_CACHE_MAX_ENTRIES', '10000'))
+
+
+def canonical_house_hash(house_info, artifacts=None):
+    """规范化后的房屋特征 -> 哈希"""
+    from app.train.house_encoder import house_features
+
+    feats = house_features(house_info, artifacts)
+    items = []
+    for name in sorted(feats):
+        value = feats[name]
+        if hasattr(value, 'item'):
+            value = value.item()  # numpy 标量
+        if value is None or (isinstance(value, float) and math.isnan(value)):
+            value = None
+        elif isinstance(value, float) and value.is_integer():
+            value = int(value)
+        items.append([name, value])
+    payload = json.dumps(items, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def fetch_model_versions(model_ids):
+    """一条 SQL 查出多个模型的版本号 {model_id: version}，不存在的模型不在结果中"""
+    from app.models.model import MLModel
+
+    rows = db.session.query(
+        MLModel.id, MLModel.upload_time, MLModel.model_size, MLModel.data_count
+    ).filter(MLModel.id.in_(model_ids)).all()
+    return {
+        row.id: f"{row.upload_time.isoformat() if row.upload_time else ''}:{row.model_size}:{row.data_count}"
+        for row in rows
+    }
+
+
+class PredictionCache:
+    """线程安全的 TTL + LRU 缓存，值为 {model_id: 单模型预测结果}"""
+
+    def __init__(self, ttl=PREDICTION_CACHE_TTL_SECONDS, max_entries=PREDICTION_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, model_ids, value)
+        self._by_model = {}            # model_id -> {key}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def make_key(self, house_info, model_ids):
+        """
+        计算缓存键（需要在应用上下文中调用）
+
+        Returns:
+            键；房屋无法规范化（解析出错）时返回 None，调用方不使用缓存
+        """
+        from app.train.artifacts import get_feature_artifacts
+
+        try:
+            artifacts = get_feature_artifacts()
+            house_hash = canonical_house_hash(house_info, artifacts)
+        except Exception:
+            return None
+        model_ids = sorted({int(model_id) for model_id in model_ids})
+        versions = fetch_model_versions(model_ids)
+        models = tuple((model_id, versions.get(model_id)) for model_id in model_ids)
+        return house_hash, models, artifacts.version
+
+    def get(self, key):
+        from app.utils.metrics import record_cache
+
+        if key is None:
+            return None
+        value = self._get(key)
+        record_cache('prediction', value is not None)
+        return value
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] < time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, key, value):
+        if key is None:
+            return
+        model_ids = [model_id for model_id, _ in key[1]]
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, model_ids, value)
+            for model_id in model_ids:
+                self._by_model.setdefault(model_id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        """调用方持有 self._lock"""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        for model_id in entry[1]:
+            keys = self._by_model.get(model_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_model[model_id]
+        return True
+
+    def invalidate_model(self, model_id):
+        """丢弃所有包含该模型的条目"""
+        with self._lock:
+            for key in list(self._by_model.get(model_id, ())):
+                if self._remove(key):
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._by_model.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+                'expirations': self.expirations,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+            }
+
+
+_prediction_cache = None
+_prediction_cache_lock = threading.Lock()
+
+
+def get_prediction_cache():
+    """当前进程共享的 PredictionCache 实例"""
+    global _prediction_cache
+    if _prediction_cache is None:
+        with _prediction_cache_lock:
+            if _prediction_cache is None:
+                _prediction_cache = PredictionCache()
+    return _prediction_cache
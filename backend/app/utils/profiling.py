@@ -0,0 +1,228 @@
+"""
+按需的单请求性能分析
+
+配置了 PROFILE_TOKEN（管理员口令）时，请求带上请求头 X-Profile: <口令>，就对这一个请求做性能分析；
+未配置口令时不注册任何钩子，其余请求只多一次请求头 / 参数查找。口令只从请求头读取（查询参数会被
+gunicorn 访问日志记录下来），?profile=1 只是开关，仍然需要请求头里的口令。
+
+两种分析器（X-Profile-Mode / ?profile_mode=）：
+    sample（默认）  后台线程每 PROFILE_SAMPLE_INTERVAL_MS 毫秒采样一次调用栈，输出 collapsed stacks
+                   （flamegraph.pl / speedscope / inferno 可直接读取）。除请求线程外也采样 InferencePool
+                   的工作线程（空闲等待任务时跳过），按线程名分开
+    cprofile       确定性的 cProfile，输出 pstats 文件（snakeviz / gprof2dot / flameprof 可读取）
+结果保存到 PROFILE_DIR，文件路径写入响应头 X-Profile-File；
+X-Profile-Output: return（或 ?profile_output=return）时直接把分析结果作为响应体返回。
+
+流式响应（score-csv、chat-stream 等）的响应体在 after_request 之后才生成，分析到响应关闭时才结束，
+覆盖整个响应体的生成；这时结果只写文件（X-Profile-File 预先给出路径），不支持 return。
+"""
+import cProfile
+import hmac
+import io
+import marshal
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'profiles'))
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv('PROFILE_SAMPLE_INTERVAL_MS', '1'))
+# 除请求线程外一并采样的线程名前缀
+PROFILE_THREAD_PREFIXES = ('inference',)
+
+MODES = ('sample', 'cprofile')
+
+
+def _frame_label(code):
+    path = code.co_filename
+    for root in sys.path:
+        if root and path.startswith(root):
+            path = os.path.relpath(path, root)
+            break
+    return f'{code.co_name} ({path}:{code.co_firstlineno})'.replace(';', ':')
+
+
+def _is_idle_pool_thread(frame):
+    """线程池工作线程在 SimpleQueue.get（C 函数）上等待任务时，最内层 Python 帧是 _worker"""
+    return frame.f_code.co_name == '_worker' and frame.f_code.co_filename.endswith(
+        os.path.join('concurrent', 'futures', 'thread.py'))
+
+
+class SamplingProfiler:
+    """定时采样指定线程的调用栈，统计为 collapsed stacks"""
+
+    def __init__(self, thread_id, interval=PROFILE_SAMPLE_INTERVAL_MS / 1000.0,
+                 thread_prefixes=PROFILE_THREAD_PREFIXES):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.thread_prefixes = thread_prefixes
+        self.samples = 0
+        self._stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _targets(self):
+        names = {t.ident: t.name for t in threading.enumerate()}
+        targets = {self.thread_id: 'request'}
+        for ident, name in names.items():
+            if ident != self.thread_id and name.startswith(self.thread_prefixes):
+                targets[ident] = name
+        return targets
+
+    def _run(self):
+        targets = self._targets()
+        refreshed = time.monotonic()
+        while not self._stop.wait(self.interval):
+            now = time.monotonic()
+            if now - refreshed > 0.1:
+                targets, refreshed = self._targets(), now  # 线程池可能新建了工作线程
+            frames = sys._current_frames()
+            self.samples += 1
+            for ident, name in targets.items():
+                frame = frames.get(ident)
+                if frame is None or (ident != self.thread_id and _is_idle_pool_thread(frame)):
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(name)
+                self._stacks[';'.join(reversed(stack))] += 1
+
+    def collapsed(self):
+        """每行 "外层;...;内层 样本数" """
+        return ''.join(f'{stack} {count}\n' for stack, count in self._stacks.most_common())
+
+
+class RequestProfile:
+    """一次请求的分析会话"""
+
+    def __init__(self, mode):
+        self.mode = mode
+        self.started = time.perf_counter()
+        if mode == 'cprofile':
+            self._profiler = cProfile.Profile()
+            # Python 3.12 起 cProfile 全局只能有一个在运行，并发的第二个会抛出 ValueError
+            self._profiler.enable()
+        else:
+            self._profiler = SamplingProfiler(threading.get_ident())
+            self._profiler.start()
+
+    @property
+    def extension(self):
+        return 'prof' if self.mode == 'cprofile' else 'collapsed'
+
+    def finish(self):
+        """
+        停止分析
+
+        Returns:
+            (内容 bytes, 文件扩展名, 摘要 dict)
+        """
+        elapsed = time.perf_counter() - self.started
+        if self.mode == 'cprofile':
+            self._profiler.disable()
+            self._profiler.create_stats()
+            content = marshal.dumps(self._profiler.stats)  # 与 pstats.Stats.dump_stats 相同的格式
+            return content, self.extension, {'seconds': round(elapsed, 4)}
+        self._profiler.stop()
+        return self._profiler.collapsed().encode('utf-8'), self.extension, {
+            'seconds': round(elapsed, 4),
+            'samples': self._profiler.samples,
+        }
+
+
+def _option(request, header, arg, default=None):
+    return request.headers.get(header) or request.args.get(arg) or default
+
+
+def profile_path(extension, endpoint, directory=PROFILE_DIR):
+    name = f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}_{(endpoint or 'unmatched').replace('.', '-')}_{os.getpid()}"
+    return os.path.join(directory, f'{name}.{extension}')
+
+
+def save_profile(content, extension, endpoint, directory=PROFILE_DIR, path=None):
+    os.makedirs(directory, exist_ok=True)
+    path = path or profile_path(extension, endpoint, directory)
+    with open(path, 'wb') as f:
+        f.write(content)
+    return path
+
+
+def init_app(app):
+    """配置了 PROFILE_TOKEN 时注册分析钩子"""
+    token = app.config.get('PROFILE_TOKEN')
+    if not token:
+        return
+    from flask import g, jsonify, request, send_file
+
+    @app.before_request
+    def _start_profile():
+        supplied = request.headers.get('X-Profile')
+        if supplied is None and request.args.get('profile') is None:
+            return None
+        if supplied is None or not hmac.compare_digest(supplied.encode('utf-8'), token.encode('utf-8')):
+            return jsonify({'error': '无权进行性能分析（口令需放在 X-Profile 请求头中）'}), 403
+        mode = _option(request, 'X-Profile-Mode', 'profile_mode', 'sample')
+        if mode not in MODES:
+            return jsonify({'error': f'profile_mode 必须是 {" / ".join(MODES)} 之一'}), 400
+        try:
+            g._request_profile = RequestProfile(mode)
+        except ValueError as e:
+            return jsonify({'error': f'无法启动性能分析: {str(e)}'}), 409
+        return None
+
+    @app.after_request
+    def _finish_profile(response):
+        profile = g.pop('_request_profile', None)
+        if profile is None:
+            return response
+        if response.is_streamed:
+            # 响应体还没有生成，到响应关闭（发送完或客户端断开）时再停止分析
+            path = profile_path(profile.extension, request.endpoint)
+            label = f'{request.method} {request.path}'
+
+            def _finish_streamed():
+                content, extension, summary = profile.finish()
+                save_profile(content, extension, None, path=path)
+                print(f"请求分析已保存: {label} -> {path} {summary}")
+
+            response.call_on_close(_finish_streamed)
+            response.headers['X-Profile-File'] = path
+            return response
+
+        content, extension, summary = profile.finish()
+        path = save_profile(content, extension, request.endpoint)
+        print(f"请求分析已保存: {request.method} {request.path} -> {path} {summary}")
+
+        if _option(request, 'X-Profile-Output', 'profile_output') == 'return':
+            profiled_status = response.status_code
+            response = send_file(
+                io.BytesIO(content),
+                mimetype='text/plain' if extension == 'collapsed' else 'application/octet-stream',
+                as_attachment=True,
+                download_name=os.path.basename(path),
+            )
+            response.headers['X-Profiled-Status'] = str(profiled_status)
+        response.headers['X-Profile-File'] = path
+        response.headers['X-Profile-Seconds'] = str(summary['seconds'])
+        if 'samples' in summary:
+            response.headers['X-Profile-Samples'] = str(summary['samples'])
+        return response
+
+    @app.teardown_request
+    def _discard_profile(exc):
+        # 请求在 after_request 之前中断时也要停掉分析器（采样线程 / cProfile）
+        profile = g.pop('_request_profile', None)
+        if profile is not None:
+            profile.finish()
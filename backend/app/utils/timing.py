@@ -0,0 +1,194 @@
+"""
+预测链路的分阶段耗时
+
+span('阶段名') 包住一段代码，结束时：
+    - 累加到当前请求的 Timings（请求要求返回 timings 时由 collect_timings 创建，
+      通过 contextvars 传递，InferencePool 的工作线程会继承提交时的上下文）
+    - 计入进程内按阶段划分的直方图和 Prometheus 指标 prediction_stage_duration_seconds
+      （STAGE_TIMINGS_ENABLED 时）
+两者都不需要时 span 返回共享的空上下文管理器，开销只有一次 ContextVar.get 和一次判断。
+
+阶段：
+    prediction_cache  预测缓存键计算与查找
+    model_meta        查询模型元数据（版本号）
+    model_fetch       从数据库读取模型文件
+    unpickle          反序列化模型
+    artifact_load     加载特征产物文件
+    preprocess        单套房屋特征编码
+    forward           模型前向（含合批等待）
+    fuse              多模型加权融合
+"""
+import bisect
+import contextlib
+import os
+import threading
+import time
+from contextvars import ContextVar
+
+STAGE_TIMINGS_ENABLED = os.getenv('STAGE_TIMINGS_ENABLED', 'true').lower() == 'true'
+
+# 直方图桶上界（秒），最后一个桶为 +Inf
+HISTOGRAM_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_current = ContextVar('stage_timings', default=None)
+_NULL_SPAN = contextlib.nullcontext()
+
+
+class Timings:
+    """一次请求内各阶段的累计耗时（多个推理线程并行时各线程的耗时相加）"""
+
+    def __init__(self):
+        self._start = time.perf_counter()
+        self._stages = {}  # 阶段 -> [次数, 累计秒数]
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        with self._lock:
+            entry = self._stages.setdefault(stage, [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+
+    def to_dict(self):
+        with self._lock:
+            stages = {
+                stage: {'count': count, 'ms': round(seconds * 1000, 3)}
+                for stage, (count, seconds) in self._stages.items()
+            }
+        return {
+            'total_ms': round((time.perf_counter() - self._start) * 1000, 3),
+            'stages': stages,
+        }
+
+
+class _Span:
+    __slots__ = ('stage', 'timings', 'start')
+
+    def __init__(self, stage, timings):
+        self.stage = stage
+        self.timings = timings
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        if self.timings is not None:
+            self.timings.add(self.stage, elapsed)
+        if STAGE_TIMINGS_ENABLED:
+            from app.utils.metrics import PREDICTION_STAGE_SECONDS
+            get_stage_histograms().observe(self.stage, elapsed)
+            PREDICTION_STAGE_SECONDS.labels(stage=self.stage).observe(elapsed)
+        return False
+
+
+def span(stage):
+    """计时一个阶段：with span('forward'): ..."""
+    timings = _current.get()
+    if timings is None and not STAGE_TIMINGS_ENABLED:
+        return _NULL_SPAN
+    return _Span(stage, timings)
+
+
+@contextlib.contextmanager
+def collect_timings(enabled=True):
+    """
+    在 with 块内收集 span 到一个新的 Timings 并产出它；enabled 为 False 时产出 None
+
+    用法:
+        with collect_timings(want_timings) as timings:
+            ...
+        if timings is not None:
+            response['timings'] = timings.to_dict()
+    """
+    if not enabled:
+        yield None
+        return
+    timings = Timings()
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+
+def wants_timings(request, data=None):
+    """请求是否要求返回 timings：查询参数 ?timings=1 或 JSON 字段 "timings": true"""
+    flag = request.args.get('timings')
+    if flag is not None:
+        return flag.lower() in ('1', 'true', 'yes')
+    return bool(isinstance(data, dict) and data.get('timings') is True)
+
+
+class StageHistograms:
+    """各阶段耗时的累积直方图（进程内，线程安全）"""
+
+    def __init__(self, buckets=HISTOGRAM_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._stages = {}  # 阶段 -> {'counts': [...], 'sum': 秒, 'max': 秒}
+        self._lock = threading.Lock()
+
+    def observe(self, stage, seconds):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            entry = self._stages.get(stage)
+            if entry is None:
+                entry = self._stages[stage] = {'counts': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'max': 0.0}
+            entry['counts'][index] += 1
+            entry['sum'] += seconds
+            entry['max'] = max(entry['max'], seconds)
+
+    def snapshot(self):
+        """{阶段: {'counts': 各桶（非累积）计数, 'sum': 秒, 'max': 秒}} 的副本"""
+        with self._lock:
+            return {
+                stage: {'counts': list(entry['counts']), 'sum': entry['sum'], 'max': entry['max']}
+                for stage, entry in self._stages.items()
+            }
+
+    def _quantile(self, entry, q):
+        """按桶上界估计分位数，不超过观测到的最大值"""
+        counts = entry['counts']
+        target = q * sum(counts)
+        cumulative = 0
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            if cumulative >= target:
+                return min(bound, entry['max'])
+        return entry['max']
+
+    def stats(self):
+        stages = {}
+        for stage, entry in sorted(self.snapshot().items()):
+            total = sum(entry['counts'])
+            stages[stage] = {
+                'count': total,
+                'avg_ms': round(entry['sum'] / total * 1000, 3) if total else None,
+                'max_ms': round(entry['max'] * 1000, 3),
+                'p50_ms': round(self._quantile(entry, 0.5) * 1000, 3),
+                'p90_ms': round(self._quantile(entry, 0.9) * 1000, 3),
+                'p99_ms': round(self._quantile(entry, 0.99) * 1000, 3),
+            }
+        return {
+            'enabled': STAGE_TIMINGS_ENABLED,
+            'bucket_bounds_ms': [round(b * 1000, 3) for b in self.buckets],
+            'stages': stages,
+        }
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+
+
+_stage_histograms = None
+_stage_histograms_lock = threading.Lock()
+
+
+def get_stage_histograms():
+    """当前进程共享的 StageHistograms 实例"""
+    global _stage_histograms
+    if _stage_histograms is None:
+        with _stage_histograms_lock:
+            if _stage_histograms is None:
+                _stage_histograms = StageHistograms()
+    return _stage_histograms
@@ -0,0 +1,3 @@
+"""
+性能基准脚本（离线运行，不依赖 MySQL）
+"""
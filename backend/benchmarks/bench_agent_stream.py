@@ -0,0 +1,116 @@
+"""
+对话接口的首字延迟：/api/agent/chat-stream（大模型流式） vs /api/agent/chat（等完整回复）
+
+大模型换成本地桩服务（app.agent.llm_stub，固定的首块等待和逐块间隔），不访问外网。
+每个场景发 N 次对话，统计流式接口收到第一个 content 事件的时间、全部结束的时间，
+以及非流式接口的总耗时。场景：
+    plain   直接回答
+    tool    先说一句话，再调用 get_current_time（arguments 分块下发），执行后流式输出最终回复
+
+用法（在 backend 目录下）:
+    python -m benchmarks.bench_agent_stream
+    python -m benchmarks.bench_agent_stream --requests 10 --token-delay-ms 30 --first-token-delay-ms 500
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+SCENARIOS = {
+    'plain': '你好，介绍一下你自己',
+    'tool': '现在几点了？',
+}
+
+
+def _sse_events(response):
+    """Flask 测试客户端的流式响应 -> 逐个 (到达时间, 事件 dict)"""
+    buffer = b''
+    for chunk in response.response:
+        buffer += chunk
+        while b'\n\n' in buffer:
+            raw, buffer = buffer.split(b'\n\n', 1)
+            if raw.startswith(b'data:'):
+                yield time.perf_counter(), json.loads(raw[5:])
+
+
+def stream_once(client, message):
+    start = time.perf_counter()
+    response = client.post('/api/agent/chat-stream', json={'message': message}, buffered=False)
+    first_content, content, events = None, [], []
+    for arrived, event in _sse_events(response):
+        events.append(event['type'])
+        if event['type'] == 'error':
+            raise RuntimeError(event['error'])
+        if event['type'] == 'content' and event['content']:
+            first_content = first_content or arrived
+            content.append(event['content'])
+    response.close()
+    return first_content - start, time.perf_counter() - start, ''.join(content), events
+
+
+def chat_once(client, message):
+    start = time.perf_counter()
+    response = client.post('/api/agent/chat', json={'message': message})
+    body = response.get_json()
+    assert response.status_code == 200, body
+    return time.perf_counter() - start, body['response']
+
+
+def run(requests=5, chunk_chars=2, token_delay_ms=20, first_token_delay_ms=200):
+    from app.agent import llm_agent
+    from app.agent.llm_stub import start_in_thread
+
+    server = start_in_thread(chunk_chars=chunk_chars, token_delay_ms=token_delay_ms,
+                             first_token_delay_ms=first_token_delay_ms)
+    # QwenClient 默认读取模块级配置
+    llm_agent.QWEN_API_BASE, llm_agent.QWEN_API_KEY = server.base_url, 'stub'
+    try:
+        from app import create_app
+        from app.config import Config
+
+        class BenchConfig(Config):
+            SQLALCHEMY_DATABASE_URI = 'sqlite://'
+            SQLALCHEMY_ENGINE_OPTIONS = {}
+            TESTING = True
+
+        client = create_app(BenchConfig).test_client()
+        results = {}
+        for name, message in SCENARIOS.items():
+            first, total, chat_total = [], [], []
+            for _ in range(requests):
+                ttft, elapsed, _, events = stream_once(client, message)
+                first.append(ttft)
+                total.append(elapsed)
+                chat_seconds, _ = chat_once(client, message)
+                chat_total.append(chat_seconds)
+            results[name] = {
+                'stream_first_content_ms': float(np.median(first)) * 1000,
+                'stream_total_ms': float(np.median(total)) * 1000,
+                'chat_total_ms': float(np.median(chat_total)) * 1000,
+                'content_events': events.count('content'),
+                'events': list(dict.fromkeys(events)),
+            }
+    finally:
+        server.shutdown()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=5, help='每个场景的对话次数（取中位数）')
+    parser.add_argument('--chunk-chars', type=int, default=2, help='桩服务每块的字数')
+    parser.add_argument('--token-delay-ms', type=float, default=20, help='桩服务块之间的间隔（毫秒）')
+    parser.add_argument('--first-token-delay-ms', type=float, default=200, help='桩服务首块前的等待（毫秒）')
+    args = parser.parse_args()
+
+    results = run(args.requests, args.chunk_chars, args.token_delay_ms, args.first_token_delay_ms)
+    print(f"{'场景':<8}{'流式首字(ms)':>14}{'流式总耗时(ms)':>16}{'非流式总耗时(ms)':>18}{'content 事件数':>16}")
+    for name, stats in results.items():
+        print(f"{name:<8}{stats['stream_first_content_ms']:>14.1f}{stats['stream_total_ms']:>16.1f}"
+              f"{stats['chat_total_ms']:>18.1f}{stats['content_events']:>16}")
+        print(f"        事件: {' '.join(stats['events'])}")
+
+
+if __name__ == '__main__':
+    main()
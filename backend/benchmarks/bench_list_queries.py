@@ -0,0 +1,177 @@
+"""
+列表接口的数据库读取量回归基准：每个接口执行了多少条 SQL、从数据库驱动取回多少字节
+
+在临时 SQLite 库里造 N 个数据文件 / 模型 / 客户端（每个带 blob_kb 大小的二进制内容），
+依次请求列表接口并统计。列表接口只返回元数据，因此：
+    - SQL 条数应是常数（不随记录数增长，即没有 N+1）
+    - 取回字节数应远小于 blob 总量（大字段没有被 SELECT）
+任一条件不满足时以非 0 退出码结束，可用于 CI。
+
+用法（在 backend 目录下）:
+    python -m benchmarks.bench_list_queries
+    python -m benchmarks.bench_list_queries --records 100 --blob-kb 512
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+from sqlalchemy import event
+
+from app import create_app
+from app.config import Config
+from app.extensions import db
+
+# (名称, 路径)
+ENDPOINTS = [
+    ('GET /api/datafiles/', '/api/datafiles/'),
+    ('GET /api/models/', '/api/models/'),
+    ('GET /api/clients/', '/api/clients/'),
+    ('GET /api/clients/<id>', '/api/clients/1'),
+]
+
+# 每个接口允许的最大 SQL 条数
+MAX_QUERIES = 2
+# 取回字节数占 blob 总量的上限
+MAX_BLOB_FRACTION = 0.01
+
+
+class _ByteCounter:
+    """累计 DBAPI 游标 fetch 出的字节数"""
+
+    def __init__(self):
+        self.bytes = 0
+
+    def add_rows(self, rows):
+        for row in rows:
+            for value in row:
+                if isinstance(value, (bytes, bytearray, memoryview)):
+                    self.bytes += len(value)
+                elif isinstance(value, str):
+                    self.bytes += len(value.encode('utf-8'))
+                elif value is not None:
+                    self.bytes += 8
+        return rows
+
+
+def _counting_connect(path, counter):
+    class CountingCursor(sqlite3.Cursor):
+        def fetchone(self):
+            row = super().fetchone()
+            if row is not None:
+                counter.add_rows([row])
+            return row
+
+        def fetchmany(self, *args, **kwargs):
+            return counter.add_rows(super().fetchmany(*args, **kwargs))
+
+        def fetchall(self):
+            return counter.add_rows(super().fetchall())
+
+    class CountingConnection(sqlite3.Connection):
+        def cursor(self, factory=CountingCursor):
+            return super().cursor(factory)
+
+    def connect():
+        return sqlite3.connect(path, factory=CountingConnection, check_same_thread=False)
+
+    return connect
+
+
+def build_app(path, counter):
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite://'
+        SQLALCHEMY_ENGINE_OPTIONS = {'creator': _counting_connect(path, counter)}
+        TESTING = True
+
+    return create_app(BenchConfig)
+
+
+def seed(records, blob_kb):
+    """造 records 组 数据文件 + 模型 + 客户端，返回 blob 总字节数"""
+    from app.models import Client, DataFile, MLModel
+
+    blob = os.urandom(blob_kb * 1024)
+    for i in range(records):
+        datafile = DataFile(filename=f'client{i}.csv', file_content=blob, file_size=len(blob))
+        model = MLModel(model_name=f'client{i}_model', model_content=blob, model_size=len(blob),
+                        data_count=1000 + i, model_type='pytorch')
+        db.session.add_all([datafile, model])
+        db.session.flush()
+        db.session.add(Client(name=f'client{i}', datafile_id=datafile.id, model_id=model.id))
+    db.session.commit()
+    return 2 * records * len(blob)
+
+
+def run(records=50, blob_kb=256):
+    counter = _ByteCounter()
+    with tempfile.TemporaryDirectory() as tmp:
+        app = build_app(os.path.join(tmp, 'bench.db'), counter)
+        queries = []
+
+        def count_query(conn, cursor, statement, parameters, context, executemany):
+            queries.append(statement)
+
+        with app.app_context():
+            db.create_all()
+            blob_total = seed(records, blob_kb)
+            event.listen(db.engine, 'before_cursor_execute', count_query)
+
+        results = {}
+        client = app.test_client()
+        for name, path in ENDPOINTS:
+            queries.clear()
+            counter.bytes = 0
+            start = time.perf_counter()
+            response = client.get(path)
+            elapsed = time.perf_counter() - start
+            assert response.status_code == 200, (name, response.status_code, response.get_data(as_text=True))
+            results[name] = {
+                'queries': len(queries),
+                'db_bytes': counter.bytes,
+                'response_bytes': len(response.get_data()),
+                'ms': elapsed * 1000,
+            }
+
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+
+    return {'records': records, 'blob_kb': blob_kb, 'blob_total_bytes': blob_total, 'endpoints': results}
+
+
+def check(result):
+    """返回不满足预算的接口说明列表"""
+    failures = []
+    budget = result['blob_total_bytes'] * MAX_BLOB_FRACTION
+    for name, stats in result['endpoints'].items():
+        if stats['queries'] > MAX_QUERIES:
+            failures.append(f"{name}: {stats['queries']} 条 SQL（上限 {MAX_QUERIES}，疑似 N+1）")
+        if stats['db_bytes'] > budget:
+            failures.append(f"{name}: 读取 {stats['db_bytes']:,} 字节（上限 {budget:,.0f}，疑似读取了大字段）")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--records', type=int, default=50, help='数据文件/模型/客户端各多少条')
+    parser.add_argument('--blob-kb', type=int, default=256, help='每个文件/模型的大小（KB）')
+    args = parser.parse_args()
+
+    result = run(args.records, args.blob_kb)
+    print(f"记录数: {result['records']}, blob 总量: {result['blob_total_bytes']:,} 字节")
+    print(f"{'接口':<24}{'SQL 条数':>10}{'DB 字节':>14}{'响应字节':>12}{'耗时(ms)':>10}")
+    for name, stats in result['endpoints'].items():
+        print(f"{name:<24}{stats['queries']:>10}{stats['db_bytes']:>14,}"
+              f"{stats['response_bytes']:>12,}{stats['ms']:>10.1f}")
+
+    failures = check(result)
+    for failure in failures:
+        print(f"回归: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
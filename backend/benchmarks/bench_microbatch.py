@@ -0,0 +1,124 @@
+"""
+单套房屋预测的并发压测：逐请求前向（当前路径） vs 动态合批（MicroBatcher）
+
+T 个线程同时发起请求，每个请求走 encode_house + 前向，统计每个请求的延迟
+p50 / p99 以及整体吞吐。合批模式下同一模型的并发请求在 max_wait 内合并成一次前向。
+
+用法（在 backend 目录下）:
+    python -m benchmarks.bench_microbatch
+    python -m benchmarks.bench_microbatch --threads 1,8,32 --requests 200 --max-batch 64 --max-wait-ms 2
+"""
+import argparse
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_DATA = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', '..', 'clients_random', 'client0.csv'
+)
+
+
+def load_houses(path, limit=1000):
+    df = pd.read_csv(path, nrows=limit)
+    return [{k: v for k, v in row.items() if not pd.isna(v)} for row in df.to_dict('records')]
+
+
+def build_model(seed=0):
+    import torch
+    from app.train.train_dp import NUM_COLS, HousePriceModel, get_cat_dims
+
+    torch.manual_seed(seed)
+    model = HousePriceModel(num_dim=len(NUM_COLS), cat_dims=get_cat_dims())
+    model.eval()
+    return model
+
+
+def run_load(predict, houses, threads, requests):
+    """
+    threads 个线程各发 requests 个请求
+
+    Returns:
+        dict: p50_ms / p99_ms / mean_ms / throughput（请求/秒）
+    """
+    from app.train.house_encoder import encode_house
+
+    latencies = [[] for _ in range(threads)]
+    barrier = threading.Barrier(threads + 1)
+
+    def worker(index):
+        local = latencies[index]
+        barrier.wait()
+        for i in range(requests):
+            house = houses[(index * requests + i) % len(houses)]
+            start = time.perf_counter()
+            x_num, x_cat = encode_house(house)
+            predict(x_num, x_cat)
+            local.append(time.perf_counter() - start)
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for w in workers:
+        w.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - start
+
+    all_latencies = np.concatenate([np.asarray(l) for l in latencies]) * 1000
+    return {
+        'p50_ms': float(np.percentile(all_latencies, 50)),
+        'p99_ms': float(np.percentile(all_latencies, 99)),
+        'mean_ms': float(all_latencies.mean()),
+        'throughput': len(all_latencies) / elapsed,
+    }
+
+
+def run(thread_counts=(1, 8, 32), requests=200, max_batch=64, max_wait_ms=2.0, data=DEFAULT_DATA):
+    from app.train.micro_batch import MicroBatcher
+    from app.train.train_dp import predict_arrays
+
+    houses = load_houses(data)
+    model = build_model()
+    direct = lambda x_num, x_cat: predict_arrays(x_num, x_cat, model)  # noqa: E731
+
+    # 预热：加载特征产物、触发 torch 初始化
+    run_load(direct, houses, 1, 20)
+
+    results = []
+    for threads in thread_counts:
+        stats = run_load(direct, houses, threads, requests)
+        results.append({'mode': 'direct', 'threads': threads, **stats, 'avg_batch': 1.0})
+
+        batcher = MicroBatcher(lambda m, xn, xc: predict_arrays(xn, xc, m), max_batch, max_wait_ms)
+        stats = run_load(lambda x_num, x_cat: batcher.predict(model, x_num, x_cat), houses, threads, requests)
+        results.append({'mode': 'microbatch', 'threads': threads, **stats,
+                        'avg_batch': batcher.stats()['avg_batch']})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', default='1,8,32', help='并发线程数，逗号分隔')
+    parser.add_argument('--requests', type=int, default=200, help='每个线程的请求数')
+    parser.add_argument('--max-batch', type=int, default=64, help='合批的最大行数')
+    parser.add_argument('--max-wait-ms', type=float, default=2.0, help='合批的最长等待（毫秒）')
+    parser.add_argument('--data', default=DEFAULT_DATA, help='房屋样本 CSV')
+    args = parser.parse_args()
+
+    import torch
+    print(f"torch 线程数: {torch.get_num_threads()}, CPU 核数: {os.cpu_count()}, "
+          f"max_batch={args.max_batch}, max_wait={args.max_wait_ms}ms")
+    results = run([int(t) for t in args.threads.split(',')], args.requests,
+                  args.max_batch, args.max_wait_ms, args.data)
+
+    print(f"{'模式':<12}{'线程':>6}{'p50(ms)':>10}{'p99(ms)':>10}{'均值(ms)':>10}{'吞吐(req/s)':>14}{'平均批大小':>12}")
+    for r in results:
+        print(f"{r['mode']:<12}{r['threads']:>6}{r['p50_ms']:>10.2f}{r['p99_ms']:>10.2f}"
+              f"{r['mean_ms']:>10.2f}{r['throughput']:>14.1f}{r['avg_batch']:>12}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""
+preprocess_df 特征解析基准：逐行 apply（旧实现） vs 列式实现
+
+用法（在 backend 目录下）:
+    python -m benchmarks.bench_preprocess
+    python -m benchmarks.bench_preprocess --data "../clients_random/*.csv" --repeat 3
+"""
+import argparse
+import glob
+import os
+import re
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.train import data_load
+
+DEFAULT_DATA_GLOB = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', '..', 'clients_random', '*.csv'
+)
+
+
+# ---------- 旧实现：逐行 apply，仅用于对比 ----------
+def legacy_clean_area(x):
+    if pd.isna(x):
+        return np.nan
+    x = str(x).replace("㎡", "").replace("平米", "").replace(" ", "")
+    if x in ["暂无数据", ""]:
+        return np.nan
+    try:
+        return float(x)
+    except:
+        return np.nan
+
+
+def legacy_parse_floor_level(s):
+    if pd.isna(s):
+        return "未知"
+    return str(s).split(" ")[0]
+
+
+def legacy_parse_total_floor(s):
+    if pd.isna(s):
+        return np.nan
+    m = re.search(r"共(\d+)层", str(s))
+    if m:
+        return int(m.group(1))
+    return np.nan
+
+
+def legacy_split_lng(x):
+    if pd.isna(x):
+        return np.nan
+    try:
+        return float(str(x).split(",")[0])
+    except:
+        return np.nan
+
+
+def legacy_split_lat(x):
+    if pd.isna(x):
+        return np.nan
+    try:
+        return float(str(x).split(",")[1])
+    except:
+        return np.nan
+
+
+def legacy_extract(df):
+    out = pd.DataFrame(index=df.index)
+    out["建筑面积"] = df["建筑面积"].apply(legacy_clean_area).astype(float)
+    out["楼层类别"] = df["所在楼层"].apply(legacy_parse_floor_level)
+    out["总楼层"] = df["所在楼层"].apply(legacy_parse_total_floor).astype(float)
+    out["lng"] = df["百度经纬"].apply(legacy_split_lng).astype(float)
+    out["lat"] = df["百度经纬"].apply(legacy_split_lat).astype(float)
+    return out
+
+
+def columnar_extract(df):
+    out = pd.DataFrame(index=df.index)
+    out["建筑面积"] = data_load.clean_area_series(df["建筑面积"])
+    out["楼层类别"] = data_load.parse_floor_level_series(df["所在楼层"])
+    out["总楼层"] = data_load.parse_total_floor_series(df["所在楼层"])
+    out["lng"], out["lat"] = data_load.split_lnglat_series(df["百度经纬"])
+    return out
+
+
+def load_frames(pattern):
+    paths = sorted(glob.glob(pattern))
+    if not paths:
+        raise SystemExit(f"没有找到数据文件: {pattern}")
+    return pd.concat([pd.read_csv(p) for p in paths], ignore_index=True)
+
+
+def best_of(func, df, repeat):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(df)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def run(pattern=DEFAULT_DATA_GLOB, repeat=3):
+    df = load_frames(pattern)
+    rows = len(df)
+
+    legacy_s, legacy_out = best_of(legacy_extract, df, repeat)
+    columnar_s, columnar_out = best_of(columnar_extract, df, repeat)
+    pd.testing.assert_frame_equal(legacy_out, columnar_out)
+
+    full_s, _ = best_of(lambda d: data_load.preprocess_df(d, is_train=True), df, repeat)
+
+    return {
+        'rows': rows,
+        'legacy_extract_rows_per_sec': rows / legacy_s,
+        'columnar_extract_rows_per_sec': rows / columnar_s,
+        'extract_speedup': legacy_s / columnar_s,
+        'preprocess_df_rows_per_sec': rows / full_s,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data', default=DEFAULT_DATA_GLOB, help='CSV 文件 glob')
+    parser.add_argument('--repeat', type=int, default=3, help='每项重复次数，取最快一次')
+    args = parser.parse_args()
+
+    result = run(args.data, args.repeat)
+    print(f"行数: {result['rows']}")
+    print(f"逐行 apply : {result['legacy_extract_rows_per_sec']:>12,.0f} rows/s")
+    print(f"列式实现   : {result['columnar_extract_rows_per_sec']:>12,.0f} rows/s "
+          f"(x{result['extract_speedup']:.1f})")
+    print(f"preprocess_df 全流程: {result['preprocess_df_rows_per_sec']:>12,.0f} rows/s")
+
+
+if __name__ == '__main__':
+    main()
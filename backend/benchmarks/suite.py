@@ -0,0 +1,356 @@
+"""
+回归基准套件：一次跑完核心路径的性能指标，结果写成 JSON，便于在版本之间对比
+
+离线、CPU、临时 SQLite（不依赖 MySQL / GPU），数据取 clients_random/*.csv。测量项：
+    preprocess    preprocess_df 全流程 rows/s（全部数据文件，取最快一次）
+    train         train_dl 每轮训练（含验证）耗时（--train-files 个数据文件拼接）
+    predict       单套房屋 eval_house_by_dict 延迟 p50 / p99；encode_houses + predict_encoded 整批延迟
+                  （先检查 encode_houses 与逐条 encode_house 的编码结果一致，含缺字段的稀疏房屋）
+    model_load    joblib.load 反序列化模型耗时（与 ModelCache 未命中时相同）
+    evaluate      POST /api/clients/evaluate 端到端延迟（--clients 个客户端模型）：
+                  首个请求（从数据库加载模型）、模型已缓存但房屋不同、相同房屋（命中预测缓存）
+
+固定随机种子和计算线程数（--threads），让同一台机器上的多次运行可比。
+
+用法（在 backend 目录下）:
+    python -m benchmarks.suite --output bench-results.json
+    python -m benchmarks.suite --output new.json --compare bench-results.json --tolerance 0.2
+
+--compare 时逐项对比基线：*_per_sec 越大越好，*_ms / *_seconds 越小越好，
+变差超过 tolerance（相对值）的指标列为回归，并以非 0 退出码结束，可用于 CI。
+"""
+import argparse
+import glob
+import json
+import os
+import pickle
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.bench_preprocess import DEFAULT_DATA_GLOB, best_of, load_frames
+
+SECTIONS = ('preprocess', 'train', 'predict', 'model_load', 'evaluate')
+BATCH_SIZES = (1, 64, 1024)
+
+
+def _percentiles(seconds):
+    ms = np.asarray(seconds) * 1000
+    return {
+        'p50_ms': float(np.percentile(ms, 50)),
+        'p99_ms': float(np.percentile(ms, 99)),
+        'mean_ms': float(ms.mean()),
+    }
+
+
+def _houses(df, limit):
+    rows = df.head(limit).to_dict('records')
+    return [{k: v for k, v in row.items() if not pd.isna(v)} for row in rows]
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=10,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def environment():
+    import sklearn
+    import torch
+
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'git_commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'torch': torch.__version__,
+        'torch_threads': torch.get_num_threads(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'sklearn': sklearn.__version__,
+    }
+
+
+def bench_preprocess(df, repeat):
+    from app.train.data_load import preprocess_df
+
+    seconds, _ = best_of(lambda d: preprocess_df(d, is_train=True), df, repeat)
+    return {'rows': len(df), 'preprocess_df_rows_per_sec': len(df) / seconds}
+
+
+def bench_train(df, epochs):
+    """返回 (指标, 训练好的模型)，模型供后面的预测 / 反序列化 / 接口测量复用"""
+    from app.train.data_load import preprocess_df
+    from app.train.train_dp import build_training_arrays, get_cat_dims, train_dl
+
+    X_num, X_cat, y = build_training_arrays(preprocess_df(df, is_train=True))
+    epoch_seconds = []
+    last = [time.perf_counter()]
+
+    def on_epoch_end(epoch, total, rmse):
+        now = time.perf_counter()
+        epoch_seconds.append(now - last[0])
+        last[0] = now
+
+    start = time.perf_counter()
+    model = train_dl(X_num, X_cat, y, get_cat_dims(), epochs=epochs, on_epoch_end=on_epoch_end)
+    total = time.perf_counter() - start
+    # 第一轮包含 DataLoader / 优化器的初始化，单独列出；每轮耗时取其余轮次的中位数
+    steady = epoch_seconds[1:] or epoch_seconds
+    return {
+        'rows': len(y),
+        'epochs': len(epoch_seconds),
+        'first_epoch_seconds': epoch_seconds[0] if epoch_seconds else None,
+        'epoch_seconds': float(np.median(steady)) if steady else None,
+        'train_seconds': total,
+    }, model
+
+
+# 稀疏房屋只保留这些字段（其余数值字段全部缺失，按 num_median 填充）
+SPARSE_FIELDS = ('城市', '区域', '街道', '小区', '建筑面积', '所在楼层', '成交时间')
+
+
+def check_encoder_parity(houses):
+    """批量编码 encode_houses 与逐条 encode_house 结果一致（完整房屋 + 只有少数字段的稀疏房屋）"""
+    from app.train.house_encoder import encode_house, encode_houses
+
+    sparse = [{k: v for k, v in house.items() if k in SPARSE_FIELDS} for house in houses]
+    for batch in (houses, sparse, [{}]):
+        encoded = encode_houses(batch)
+        assert len(encoded) == len(batch), (len(encoded), len(batch))
+        for i, house in enumerate(batch):
+            x_num, x_cat = encode_house(house)
+            np.testing.assert_allclose(encoded.x_num[i], x_num[0], rtol=1e-6, atol=1e-6, err_msg=str(house))
+            np.testing.assert_array_equal(encoded.x_cat[i], x_cat[0], err_msg=str(house))
+    return 2 * len(houses) + 1
+
+
+def bench_predict(model, houses, repeat):
+    from app.train.house_encoder import encode_houses
+    from app.train.train_dp import eval_house_by_dict, predict_encoded
+
+    parity_houses = check_encoder_parity(houses[:100])
+    eval_house_by_dict(houses[0], model)  # 预热：特征产物加载、torch 首次前向
+    latencies = []
+    for house in houses:
+        start = time.perf_counter()
+        eval_house_by_dict(house, model)
+        latencies.append(time.perf_counter() - start)
+    result = {'encoder_parity_houses': parity_houses, 'single': _percentiles(latencies)}
+
+    for size in BATCH_SIZES:
+        batch = [houses[i % len(houses)] for i in range(size)]
+        seconds, _ = best_of(lambda b: predict_encoded(encode_houses(b), model), batch, repeat)
+        result[f'batch_{size}'] = {'ms': seconds * 1000, 'rows_per_sec': size / seconds}
+    return result
+
+
+def bench_model_load(model, repeat):
+    import io
+
+    import joblib
+
+    content = pickle.dumps(model)
+    seconds, _ = best_of(lambda c: joblib.load(io.BytesIO(c)), content, repeat)
+    return {'model_bytes': len(content), 'load_ms': seconds * 1000}
+
+
+def bench_evaluate(model, houses, num_clients, requests):
+    from app import create_app
+    from app.config import Config
+    from app.extensions import db
+    from app.models import Client, MLModel
+
+    with tempfile.TemporaryDirectory() as tmp:
+        class BenchConfig(Config):
+            SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+            SQLALCHEMY_ENGINE_OPTIONS = {}
+            TESTING = True
+
+        app = create_app(BenchConfig)
+        content = pickle.dumps(model)
+        with app.app_context():
+            db.create_all()
+            client_ids = []
+            for i in range(num_clients):
+                ml_model = MLModel(model_name=f'client{i}_model', model_content=content, model_size=len(content),
+                                   data_count=1000, model_type='pytorch')
+                db.session.add(ml_model)
+                db.session.flush()
+                record = Client(name=f'client{i}', model_id=ml_model.id)
+                db.session.add(record)
+                db.session.flush()
+                client_ids.append(record.id)
+            db.session.commit()
+
+        test_client = app.test_client()
+
+        def post(house):
+            start = time.perf_counter()
+            response = test_client.post('/api/clients/evaluate', json={'client_ids': client_ids, 'house_data': house})
+            elapsed = time.perf_counter() - start
+            body = response.get_json()
+            assert response.status_code == 200 and body['summary']['success'] == num_clients, body
+            return elapsed
+
+        cold = post(houses[0])
+        miss = [post(houses[1 + i % (len(houses) - 1)]) for i in range(requests)]
+        hit = [post(houses[0]) for _ in range(requests)]
+
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+
+    return {
+        'clients': num_clients,
+        'cold_ms': cold * 1000,
+        'warm': _percentiles(miss),
+        'cached': _percentiles(hit),
+    }
+
+
+def run(pattern=DEFAULT_DATA_GLOB, sections=SECTIONS, repeat=3, epochs=3, train_files=1,
+        predict_requests=500, clients=4, evaluate_requests=100, seed=0):
+    import torch
+
+    from app.train.train_dp import HousePriceModel, NUM_COLS, get_cat_dims
+
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+    df = load_frames(pattern)
+    paths = sorted(glob.glob(pattern))
+    train_df = pd.concat([pd.read_csv(p) for p in paths[:train_files]], ignore_index=True)
+    houses = _houses(df.sample(frac=1, random_state=seed), predict_requests)
+
+    results = {}
+    if 'preprocess' in sections:
+        results['preprocess'] = bench_preprocess(df, repeat)
+    if 'train' in sections:
+        results['train'], model = bench_train(train_df, epochs)
+    else:
+        model = HousePriceModel(num_dim=len(NUM_COLS), cat_dims=get_cat_dims())
+    model.eval()
+    if 'predict' in sections:
+        results['predict'] = bench_predict(model, houses, repeat)
+    if 'model_load' in sections:
+        results['model_load'] = bench_model_load(model, repeat)
+    if 'evaluate' in sections:
+        results['evaluate'] = bench_evaluate(model, houses, clients, evaluate_requests)
+
+    return {
+        'environment': environment(),
+        'params': {
+            'data': os.path.relpath(pattern), 'data_files': len(paths), 'repeat': repeat, 'epochs': epochs,
+            'train_files': train_files, 'predict_requests': len(houses), 'clients': clients,
+            'evaluate_requests': evaluate_requests, 'seed': seed,
+        },
+        'results': results,
+    }
+
+
+def flatten(results, prefix=''):
+    """嵌套结果 -> {'predict.single.p50_ms': 值}（只保留数值）"""
+    flat = {}
+    for key, value in results.items():
+        name = f'{prefix}{key}'
+        if isinstance(value, dict):
+            flat.update(flatten(value, f'{name}.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def _direction(metric):
+    """1：越大越好，-1：越小越好，0：不参与比较（行数、大小等规模参数）"""
+    leaf = metric.rsplit('.', 1)[-1]
+    if leaf.endswith('_per_sec'):
+        return 1
+    if leaf.endswith('_ms') or leaf.endswith('_seconds') or leaf == 'ms':
+        return -1
+    return 0
+
+
+def compare(current, baseline, tolerance=0.2):
+    """
+    Returns:
+        [(指标, 基线值, 当前值, 相对变化, 是否回归)]，相对变化为正表示变好
+    """
+    now, base = flatten(current['results']), flatten(baseline['results'])
+    rows = []
+    for metric in sorted(now.keys() & base.keys()):
+        direction = _direction(metric)
+        if not direction or not base[metric]:
+            continue
+        change = direction * (now[metric] - base[metric]) / base[metric]
+        rows.append((metric, base[metric], now[metric], change, change < -tolerance))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data', default=DEFAULT_DATA_GLOB, help='CSV 文件 glob')
+    parser.add_argument('--sections', default=','.join(SECTIONS), help=f'要跑的测量项，逗号分隔（{",".join(SECTIONS)}）')
+    parser.add_argument('--repeat', type=int, default=3, help='吞吐类测量的重复次数，取最快一次')
+    parser.add_argument('--epochs', type=int, default=3, help='训练轮数')
+    parser.add_argument('--train-files', type=int, default=1, help='训练使用的数据文件数')
+    parser.add_argument('--predict-requests', type=int, default=500, help='单套预测的请求数')
+    parser.add_argument('--clients', type=int, default=4, help='评测接口使用的客户端模型数')
+    parser.add_argument('--evaluate-requests', type=int, default=100, help='评测接口每种场景的请求数')
+    parser.add_argument('--threads', type=int, default=1, help='torch 计算线程数')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='结果 JSON 的写入路径')
+    parser.add_argument('--compare', help='基线结果 JSON，与之对比并在回归时以非 0 退出')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='允许的相对变差（0.2 即 20%%）')
+    args = parser.parse_args()
+
+    sections = [s.strip() for s in args.sections.split(',') if s.strip()]
+    unknown = set(sections) - set(SECTIONS)
+    if unknown:
+        parser.error(f"未知的测量项: {', '.join(sorted(unknown))}")
+
+    from app.jobs.runner import pin_threads
+    pin_threads(args.threads)
+
+    result = run(args.data, sections, args.repeat, args.epochs, args.train_files, args.predict_requests,
+                 args.clients, args.evaluate_requests, args.seed)
+    result['params']['threads'] = args.threads
+
+    env = result['environment']
+    print(f"commit {env['git_commit']}  python {env['python']}  torch {env['torch']}  "
+          f"CPU {env['cpu_count']}  线程 {env['torch_threads']}")
+    flat = flatten(result['results'])
+    for metric, value in flat.items():
+        print(f"{metric:<40}{value:>16,.3f}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入 {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        rows = compare(result, baseline, args.tolerance)
+        print(f"\n对比基线 {args.compare}（commit {baseline.get('environment', {}).get('git_commit')}）")
+        print(f"{'指标':<40}{'基线':>14}{'当前':>14}{'变化':>10}")
+        for metric, base, now, change, regressed in rows:
+            print(f"{metric:<40}{base:>14,.3f}{now:>14,.3f}{change:>+10.1%}{'  回归' if regressed else ''}")
+        regressions = [row for row in rows if row[4]]
+        if regressions:
+            print(f"{len(regressions)} 项指标变差超过 {args.tolerance:.1%}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,17 @@
+"""
+gunicorn 配置（gunicorn 启动时自动读取当前目录下的 gunicorn.conf.py）
+
+Prometheus 多进程模式：PROMETHEUS_MULTIPROC_DIR 必须在加载应用（import prometheus_client）之前设置，
+并在每次启动时清空，避免上次运行遗留的 worker 数据被计入；worker 退出时标记其数据为已结束。
+"""
+import os
+import shutil
+
+multiproc_dir = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/prometheus_multiproc')
+shutil.rmtree(multiproc_dir, ignore_errors=True)
+os.makedirs(multiproc_dir, exist_ok=True)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -3,7 +3,7 @@
 """
 from app import create_app
 from app.extensions import db
-from app.models import DataFile, MLModel, Client
+from app.models import DataFile, MLModel, Client, Job
 
 def init_database():
     """初始化数据库，创建所有表"""
@@ -16,6 +16,7 @@ def init_database():
         print(f"   - {DataFile.__tablename__}: 数据文件表")
         print(f"   - {MLModel.__tablename__}: 机器学习模型表")
         print(f"   - {Client.__tablename__}: 客户端表")
+        print(f"   - {Job.__tablename__}: 后台任务表")
 
 if __name__ == '__main__':
     init_database()
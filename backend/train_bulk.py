@@ -0,0 +1,86 @@
+"""
+批量训练脚本：并行训练多个客户端，并与顺序训练对比耗时
+
+用法:
+    python train_bulk.py --all --workers 4
+    python train_bulk.py --clients 1 2 3 --workers 3 --baseline
+
+--baseline 会先用 1 个任务进程（独占全部 CPU 线程）逐个训练同一批客户端，
+再按 --workers 并行训练，输出实测加速比。
+"""
+import argparse
+import os
+
+from app import create_app
+from app.jobs import JobRunner
+from app.jobs.batch import submit_training_batch, wait_for_batch, batch_summary
+from app.models import Client
+
+
+def run_batch(app, client_ids, workers, options):
+    """用 workers 个任务进程训练一批客户端，返回批次统计"""
+    runner = JobRunner(app, max_workers=workers)
+    print(f"任务进程: {workers}, 整机任务槽位: {runner.slots}")
+    try:
+        batch_id, jobs, skipped = submit_training_batch(runner, client_ids, options)
+        for item in skipped:
+            print(f"  跳过客户端 {item['client_id']}: {item['error']}")
+
+        reported = set()
+
+        def on_update(jobs):
+            for job in jobs:
+                if job.is_finished and job.id not in reported:
+                    reported.add(job.id)
+                    client_id = job.get_params().get('client_id')
+                    run_seconds = job.timings()['run_seconds']
+                    print(f"  [{len(reported)}/{len(jobs)}] 客户端 {client_id}: {job.status}"
+                          f"{f' ({run_seconds:.1f}s)' if run_seconds is not None else ''}"
+                          f"{f' - {job.error}' if job.error else ''}")
+
+        jobs = wait_for_batch(batch_id, on_update=on_update)
+    finally:
+        runner.shutdown()
+    summary = batch_summary(jobs)
+    summary['batch_id'] = batch_id
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='并行批量训练客户端')
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--clients', type=int, nargs='+', help='客户端ID列表')
+    group.add_argument('--all', action='store_true', help='训练所有已绑定数据文件的客户端')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='并行任务进程数')
+    parser.add_argument('--baseline', action='store_true', help='先顺序训练一遍作为对比')
+    parser.add_argument('--model-type', default='lightgbm', help='模型类型')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        if args.all:
+            client_ids = [c.id for c in Client.query.filter(Client.datafile_id.isnot(None)).order_by(Client.id)]
+        else:
+            client_ids = args.clients
+        if not client_ids:
+            print("没有可训练的客户端")
+            return
+        options = {'model_type': args.model_type}
+
+        sequential = None
+        if args.baseline:
+            print(f"== 顺序训练 {len(client_ids)} 个客户端 ==")
+            sequential = run_batch(app, client_ids, 1, options)
+            print(f"顺序训练耗时: {sequential.get('wall_seconds')}s")
+
+        print(f"== 并行训练 {len(client_ids)} 个客户端 ==")
+        parallel = run_batch(app, client_ids, args.workers, options)
+        print(f"并行训练耗时: {parallel.get('wall_seconds')}s, "
+              f"成功 {parallel['succeeded']}, 失败 {parallel['failed']}")
+        print(f"任务耗时之和: {parallel.get('sequential_seconds')}s, 估计加速比: {parallel.get('speedup')}x")
+        if sequential and sequential.get('wall_seconds') and parallel.get('wall_seconds'):
+            print(f"实测加速比: {sequential['wall_seconds'] / parallel['wall_seconds']:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -26,7 +26,7 @@ import {
   LoadingOutlined,
   FundProjectionScreenOutlined,
 } from '@ant-design/icons'
-import { clientAPI, dataFileAPI, modelAPI } from '../services/api'
+import { clientAPI, dataFileAPI, jobAPI, modelAPI } from '../services/api'
 
 const { TextArea } = Input
 
@@ -41,6 +41,7 @@ const ClientsPage = () => {
   const [currentClient, setCurrentClient] = useState(null)
   const [selectedClients, setSelectedClients] = useState([])
   const [trainingClients, setTrainingClients] = useState({}) // 记录正在训练的客户端
+  const [trainingProgress, setTrainingProgress] = useState({}) // 记录训练任务进度（0~100）
   const [createForm] = Form.useForm()
   const [trainForm] = Form.useForm()
   const [evaluateForm] = Form.useForm()
@@ -176,11 +177,23 @@ const ClientsPage = () => {
     trainForm.resetFields()
 
     try {
-      const response = await clientAPI.train(clientId, values)
+      // 提交后台训练任务，轮询任务状态直到结束
+      const submitted = await clientAPI.train(clientId, values)
+      const job = await jobAPI.waitFor(submitted.data.id, {
+        onProgress: (job) => {
+          setTrainingProgress(prev => ({ ...prev, [clientId]: Math.round(job.progress * 100) }))
+        }
+      })
+      const response = { data: job.result }
       console.log('训练响应:', response)
       
       // 设置完成状态
       setTrainingClients(prev => ({ ...prev, [clientId]: 'completed' }))
+      setTrainingProgress(prev => {
+        const newState = { ...prev }
+        delete newState[clientId]
+        return newState
+      })
       message.success('训练完成')
       
       // 1. 更新模型列表，添加新训练的模型
@@ -228,6 +241,11 @@ const ClientsPage = () => {
         delete newState[clientId]
         return newState
       })
+      setTrainingProgress(prev => {
+        const newState = { ...prev }
+        delete newState[clientId]
+        return newState
+      })
     }
   }
 
@@ -397,7 +415,9 @@ const ClientsPage = () => {
       return (
         <>
           <LoadingOutlined spin />
-          <span style={{ marginLeft: 8 }}>训练中...</span>
+          <span style={{ marginLeft: 8 }}>
+            训练中{trainingProgress[clientId] ? ` ${trainingProgress[clientId]}%` : '...'}
+          </span>
         </>
       )
     }
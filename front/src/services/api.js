@@ -153,7 +153,7 @@ export const clientAPI = {
     unbindModel: (id) => {
         return api.post(`/clients/${id}/unbind-model`)
     },
-    // 训练客户端
+    // 训练客户端（提交后台任务，返回任务信息）
     train: (id, data) => {
         return api.post(`/clients/${id}/train`, data)
     },
@@ -163,6 +163,33 @@ export const clientAPI = {
     }
 }
 
+// 后台任务相关API
+export const jobAPI = {
+    // 获取任务列表
+    getList: (params) => {
+        return api.get('/jobs/', { params })
+    },
+    // 获取指定任务状态
+    getById: (id) => {
+        return api.get(`/jobs/${id}`)
+    },
+    // 轮询直到任务结束，返回最终任务信息；失败时抛出错误
+    waitFor: async (id, { interval = 2000, onProgress } = {}) => {
+        for (;;) {
+            const response = await api.get(`/jobs/${id}`)
+            const job = response.data
+            onProgress?.(job)
+            if (job.status === 'succeeded') {
+                return job
+            }
+            if (job.status === 'failed') {
+                throw new Error(job.error || '任务失败')
+            }
+            await new Promise(resolve => setTimeout(resolve, interval))
+        }
+    }
+}
+
 // Agent相关API
 export const agentAPI = {
     // 普通对话